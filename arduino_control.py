@@ -0,0 +1,688 @@
+# arduino_control.py
+"""
+Gaze, blink and dwell events to actuator commands for an Arduino on a serial port.
+
+Landmarks come from the tracker daemon (or a local FaceMesh). Every frame's gaze point
+becomes a GAZE command, blink gestures become BLINK commands and dwell selections become
+DWELL commands. The firmware decides what they drive: LEDs, servos, a buzzer.
+
+Frames on the wire (little endian):
+
+    0xA5 | type (1) | seq (1) | length (1) | payload (length) | CRC-16/CCITT-FALSE (2)
+
+The CRC covers type, seq, length and payload. A receiver that sees a bad CRC or length
+drops the 0xA5 and resyncs on the next one. The device answers reliable frames with ACK
+(payload: the acknowledged seq) and bad CRCs with NAK (no seq known); GAZE is not acked,
+so the return line and the board's loop stay idle however fast gaze arrives. Reliable
+frames and the rest number their frames separately, so a gaze flood never wraps the
+reliable sequence onto a command that is still waiting for its ack. Payloads:
+
+    GAZE  0x10  x, y as uint16 (0..65535 across the screen)     newest wins, not retried
+    BLINK 0x11  gesture: 1 blink, 2 double blink, 3 long blink  retried until acked
+    DWELL 0x12  x, y as uint16, duration in ms as uint16         retried until acked
+    HELLO 0x01  protocol version (sent after every (re)connect)
+
+SerialLink owns the port. send() never blocks: commands go to a bounded queue, and a
+writer thread turns everything pending into one write() per wake-up. GAZE is coalesced
+(only the newest pending one is written) and sent after the events. The writer paces
+itself to the baud rate, keeping at most max_backlog seconds of bytes ahead of the line:
+otherwise a gaze stream faster than the line fills the OS transmit buffer and every
+command waits behind it, while paced, excess gaze is coalesced instead. Reliable commands
+are resent after ack_timeout, up to max_retries times. A read or write error closes the
+port; the writer reopens it with exponential backoff and resends unacknowledged
+commands. LoopbackDevice is a pty stand-in for the board that acks like the firmware
+(bench.py serial, --loopback).
+
+    python arduino_control.py --port /dev/ttyACM0
+    python arduino_control.py --loopback --tracker local
+"""
+
+import argparse
+import json
+import os
+import select
+import signal
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+START = 0xA5
+HEADER = struct.Struct("<BBBB")  # start, type, seq, length
+CRC = struct.Struct("<H")
+MAX_PAYLOAD = 64
+PROTOCOL_VERSION = 1
+
+# --- Message types ---
+MSG_HELLO = 0x01
+MSG_GAZE = 0x10
+MSG_BLINK = 0x11
+MSG_DWELL = 0x12
+MSG_ACK = 0x80
+MSG_NAK = 0x81
+COALESCED = {MSG_GAZE}  # Only the newest pending one is worth sending
+GESTURE_CODES = {"blink": 1, "double_blink": 2, "long_blink": 3}
+
+# Boards seen as Arduinos: Arduino/Genuino, CH340, FTDI, CP210x USB-serial bridges
+ARDUINO_VIDS = {0x2341, 0x2A03, 0x1A86, 0x0403, 0x10C4}
+
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+        table.append(crc & 0xFFFF)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def crc16(data, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), as in the firmware."""
+    table = _CRC_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def encode_frame(kind, seq, payload=b""):
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    body = HEADER.pack(START, kind, seq & 0xFF, len(payload))[1:] + payload
+    return bytes((START,)) + body + CRC.pack(crc16(body))
+
+
+def _unit(value):
+    return max(0, min(65535, int(value * 65535)))
+
+
+def gaze_payload(x, y):
+    return struct.pack("<HH", _unit(x), _unit(y))
+
+
+def blink_payload(gesture):
+    return struct.pack("<B", GESTURE_CODES[gesture])
+
+
+def dwell_payload(x, y, duration):
+    return struct.pack("<HHH", _unit(x), _unit(y), min(65535, int(duration * 1000)))
+
+
+class FrameDecoder:
+    """Incremental frame parser; feed() returns the complete, CRC-checked (type, seq, payload) frames."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.frames = 0
+        self.crc_errors = 0
+        self.skipped_bytes = 0
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        while True:
+            start = buffer.find(START)
+            if start < 0:
+                self.skipped_bytes += len(buffer)
+                buffer.clear()
+                break
+            if start:
+                self.skipped_bytes += start
+                del buffer[:start]
+            if len(buffer) < HEADER.size:
+                break
+            _, kind, seq, length = HEADER.unpack_from(buffer)
+            if length > MAX_PAYLOAD:
+                del buffer[0]  # Not a frame start after all: resync on the next 0xA5
+                self.skipped_bytes += 1
+                continue
+            end = HEADER.size + length + CRC.size
+            if len(buffer) < end:
+                break
+            body = bytes(buffer[1:HEADER.size + length])
+            if CRC.unpack_from(buffer, HEADER.size + length)[0] != crc16(body):
+                self.crc_errors += 1
+                del buffer[0]
+                continue
+            frames.append((kind, seq, body[3:]))
+            self.frames += 1
+            del buffer[:end]
+        return frames
+
+
+def find_port():
+    """Device path of the first connected Arduino-like board, or None."""
+    from serial.tools import list_ports
+    ports = list(list_ports.comports())
+    for port in ports:
+        if port.vid in ARDUINO_VIDS:
+            return port.device
+    for port in ports:
+        if "ACM" in port.device or "USB" in port.device:
+            return port.device
+    return None
+
+
+class SerialLink:
+    """
+    Non-blocking command channel to the board over a serial port, with acks and reconnects.
+
+    send() queues a command and returns at once (False if the queue was full and the
+    oldest queued command had to be dropped). on_state is called with True/False from
+    the writer thread when the port opens or is lost.
+    """
+
+    def __init__(self, port, baudrate=115200, queue_size=64, ack_timeout=0.1, max_retries=5,
+                 max_inflight=32, max_backlog=0.005, pace=True, reconnect_interval=0.25,
+                 max_reconnect_interval=4.0, on_state=None):
+        self.port_name = port
+        self.baudrate = baudrate
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.max_inflight = max_inflight  # Below 256: _next_seq always finds a number not in flight
+        self.max_backlog = max_backlog
+        self.byte_time = 10.0 / baudrate if pace and baudrate else 0.0  # 8N1: 10 bits per byte
+        self._line_free = 0.0  # When the bytes written so far will have left the wire
+        self.reconnect_interval = reconnect_interval
+        self.max_reconnect_interval = max_reconnect_interval
+        self.on_state = on_state
+        self._queue = deque()
+        self._queue_size = queue_size
+        self._latest = {}  # Coalesced kind -> newest payload
+        self._inflight = {}  # seq -> [kind, payload, first_sent, last_sent, retries]
+        self._cond = threading.Condition()
+        self._port = None
+        self._seq = 0  # Reliable frames (acked by seq)
+        self._unacked_seq = 0  # GAZE and HELLO (never acked, so their numbers only help debugging)
+        self._running = False
+        self._threads = []
+        self._decoder = FrameDecoder()
+        self._backoff = reconnect_interval
+        self._next_connect = 0.0
+        self._lost_at = None
+        self.rtt = deque(maxlen=1000)
+        self.counts = {"queued": 0, "dropped": 0, "coalesced": 0, "frames_written": 0, "writes": 0,
+                       "bytes_written": 0, "acked": 0, "naks": 0, "retransmits": 0, "lost": 0,
+                       "connects": 0, "disconnects": 0}
+        self.last_outage_s = None
+
+    # --- Producer side ---
+    def send(self, kind, payload=b""):
+        """Queue a command (coalesced kinds replace their pending predecessor)."""
+        with self._cond:
+            self.counts["queued"] += 1
+            accepted = True
+            if kind in COALESCED:
+                if kind in self._latest:
+                    self.counts["coalesced"] += 1
+                self._latest[kind] = payload
+            else:
+                if len(self._queue) >= self._queue_size:
+                    self._queue.popleft()  # Stale commands are worth less than new ones
+                    self.counts["dropped"] += 1
+                    accepted = False
+                self._queue.append((kind, payload))
+            self._cond.notify_all()
+        return accepted
+
+    def gaze(self, x, y):
+        return self.send(MSG_GAZE, gaze_payload(x, y))
+
+    def blink(self, gesture):
+        return self.send(MSG_BLINK, blink_payload(gesture))
+
+    def dwell(self, x, y, duration):
+        return self.send(MSG_DWELL, dwell_payload(x, y, duration))
+
+    @property
+    def connected(self):
+        return self._port is not None
+
+    def pending(self):
+        """Commands not yet acknowledged (queued, coalesced or in flight)."""
+        with self._cond:
+            return len(self._queue) + len(self._latest) + len(self._inflight)
+
+    def flush(self, timeout=5.0):
+        """Wait until every command was acknowledged (or given up); True if nothing is pending."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._latest or self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.05))
+        return True
+
+    # --- Lifecycle ---
+    def start(self):
+        self._running = True
+        self._threads = [threading.Thread(target=self._write_loop, name="serial-writer", daemon=True),
+                         threading.Thread(target=self._read_loop, name="serial-reader", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._close()
+
+    # --- Port handling ---
+    def _open(self):
+        import serial
+        try:
+            port = serial.Serial(self.port_name, self.baudrate, timeout=0.05, write_timeout=1.0)
+        except (serial.SerialException, OSError, ValueError):
+            now = time.monotonic()
+            self._next_connect = now + self._backoff
+            self._backoff = min(self._backoff * 2, self.max_reconnect_interval)
+            return False
+        with self._cond:
+            self._port = port
+            self._backoff = self.reconnect_interval
+            self._decoder = FrameDecoder()
+            self.counts["connects"] += 1
+            if self._lost_at is not None:
+                self.last_outage_s = time.monotonic() - self._lost_at
+                self._lost_at = None
+            # Unacknowledged commands may have been lost with the old port: resend right away
+            for entry in self._inflight.values():
+                entry[3] = float("-inf")
+            self._cond.notify_all()
+        self._write(encode_frame(MSG_HELLO, self._next_unacked_seq(), bytes((PROTOCOL_VERSION,))), 1)
+        if self.on_state:
+            self.on_state(True)
+        return True
+
+    def _close(self):
+        with self._cond:
+            port, self._port = self._port, None
+        if port is not None:
+            try:
+                port.close()
+            except OSError:
+                pass
+        return port is not None
+
+    def _lost(self):
+        if self._close():
+            self.counts["disconnects"] += 1
+            self._lost_at = time.monotonic()
+            self._next_connect = time.monotonic() + self.reconnect_interval
+            if self.on_state:
+                self.on_state(False)
+
+    def _next_seq(self):
+        """Next reliable sequence number, skipping numbers of commands still waiting for an ack."""
+        seq = (self._seq + 1) & 0xFF
+        while seq in self._inflight:
+            seq = (seq + 1) & 0xFF
+        self._seq = seq
+        return seq
+
+    def _next_unacked_seq(self):
+        self._unacked_seq = (self._unacked_seq + 1) & 0xFF
+        return self._unacked_seq
+
+    def _write(self, data, frames):
+        port = self._port
+        if port is None:
+            return False
+        try:
+            port.write(data)
+        except Exception:  # SerialException, SerialTimeoutException, OSError: the board is gone or stuck
+            self._lost()
+            return False
+        self._line_free = max(time.monotonic(), self._line_free) + len(data) * self.byte_time
+        self.counts["writes"] += 1
+        self.counts["frames_written"] += frames
+        self.counts["bytes_written"] += len(data)
+        return True
+
+    # --- Writer thread ---
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                if self._port is None:
+                    if now < self._next_connect:
+                        self._cond.wait(self._next_connect - now)
+                        continue
+                elif self._line_free - now > self.max_backlog:
+                    # The line is still busy: let commands pile up (and gaze coalesce) meanwhile
+                    self._cond.wait(self._line_free - now - self.max_backlog)
+                    continue
+                else:
+                    batch = self._take_batch(now)
+                    if not batch:
+                        self._cond.wait(self._next_timeout(now))
+                        continue
+            if self._port is None:
+                self._open()
+                continue
+            self._write(b"".join(batch), len(batch))
+
+    def _take_batch(self, now):
+        """Frames to write now (under the lock): retransmits, new commands, then the newest gaze."""
+        batch = []
+        for seq, entry in list(self._inflight.items()):
+            kind, payload, _, last_sent, retries = entry
+            if now - last_sent >= self.ack_timeout:
+                if retries >= self.max_retries:
+                    del self._inflight[seq]
+                    self.counts["lost"] += 1
+                    continue
+                if last_sent != float("-inf"):
+                    entry[4] += 1
+                    self.counts["retransmits"] += 1
+                entry[3] = now
+                batch.append(encode_frame(kind, seq, payload))
+        while self._queue and len(self._inflight) < self.max_inflight:
+            kind, payload = self._queue.popleft()
+            seq = self._next_seq()
+            self._inflight[seq] = [kind, payload, now, now, 0]
+            batch.append(encode_frame(kind, seq, payload))
+        for kind, payload in self._latest.items():
+            batch.append(encode_frame(kind, self._next_unacked_seq(), payload))
+        self._latest.clear()
+        return batch
+
+    def _next_timeout(self, now):
+        if not self._inflight:
+            return 1.0
+        due = min(entry[3] for entry in self._inflight.values()) + self.ack_timeout
+        return max(0.001, due - now)
+
+    # --- Reader thread ---
+    def _read_loop(self):
+        while self._running:
+            port = self._port
+            if port is None:
+                with self._cond:
+                    self._cond.wait(0.05)
+                continue
+            try:
+                data = port.read(max(1, port.in_waiting))
+            except Exception:  # The port closed under us (write error) or the board went away
+                if port is self._port:
+                    self._lost()
+                continue
+            if data:
+                self._handle(self._decoder.feed(data), time.monotonic())
+
+    def _handle(self, frames, now):
+        with self._cond:
+            for kind, seq, payload in frames:
+                if kind == MSG_ACK and payload:
+                    entry = self._inflight.pop(payload[0], None)
+                    if entry is not None:
+                        self.rtt.append(now - entry[3])  # From the latest transmission
+                        self.counts["acked"] += 1
+                elif kind == MSG_NAK:
+                    self.counts["naks"] += 1
+                    # The corrupted frame is unknown: resend everything outstanding now
+                    for entry in self._inflight.values():
+                        entry[3] = min(entry[3], now - self.ack_timeout)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counts, connected=self._port is not None, inflight=len(self._inflight),
+                         queued_now=len(self._queue), crc_errors=self._decoder.crc_errors,
+                         last_outage_s=self.last_outage_s)
+        if self.rtt:
+            ordered = sorted(self.rtt)
+            stats["rtt_ms_p50"] = ordered[len(ordered) // 2] * 1000
+            stats["rtt_ms_p95"] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000
+        return stats
+
+
+class LoopbackDevice:
+    """
+    Stand-in for the board on a pseudo-terminal: acks and NAKs like the firmware.
+
+    The port appears at path (a symlink to the pty), so unplug()/plug() can simulate the
+    cable being pulled and the board coming back. byte_time emulates the line rate
+    (10 bits per byte at the given baud); corrupt flips one byte in that fraction of reads.
+    """
+
+    def __init__(self, path, baudrate=None, corrupt=0.0, seed=0, acks=True):
+        import random
+        self.path = Path(path)
+        self.byte_time = 10.0 / baudrate if baudrate else 0.0
+        self.corrupt = corrupt
+        self.acks = acks  # False: a board that never answers (every reliable command times out)
+        self.random = random.Random(seed)
+        self.received = {}  # type -> unique frames (retransmits counted once)
+        self.duplicates = 0
+        self.nak_sent = 0
+        self._recent = deque(maxlen=64)  # Recent (type, seq) of reliable frames for duplicate detection
+        self._master = None
+        self._thread = None
+        self._running = False
+        self.decoder = FrameDecoder()
+
+    def plug(self):
+        import tty
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        name = os.ttyname(slave)
+        os.close(slave)  # The link opens it by name
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        if tmp.is_symlink() or tmp.exists():
+            tmp.unlink()
+        tmp.symlink_to(name)
+        os.replace(tmp, self.path)
+        self._master = master
+        self.decoder = FrameDecoder()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="loopback-device", daemon=True)
+        self._thread.start()
+        return self
+
+    def unplug(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(1.0)
+        if self._master is not None:
+            os.close(self._master)
+            self._master = None
+        if self.path.is_symlink():
+            self.path.unlink()
+
+    def _run(self):
+        master = self._master
+        line_end = 0.0  # When the bytes read so far have finished arriving at the emulated baud rate
+        while self._running:
+            waiting = time.monotonic()
+            if not select.select([master], [], [], 0.05)[0]:
+                continue
+            ready = time.monotonic()
+            try:
+                data = bytearray(os.read(master, 4096))
+            except OSError:  # Nobody has the port open yet (or any more)
+                time.sleep(0.01)
+                continue
+            if self.byte_time:
+                # A UART receives while the firmware handles earlier bytes: data that was already
+                # waiting followed the previous bytes on the wire, anything else started arriving now
+                line_end = (line_end if ready - waiting < 0.001 else ready) + len(data) * self.byte_time
+                now = time.monotonic()
+                if line_end > now:
+                    time.sleep(line_end - now)
+            if self.corrupt and self.random.random() < self.corrupt:
+                data[self.random.randrange(len(data))] ^= 0x5A
+            errors = self.decoder.crc_errors
+            replies = []
+            for kind, seq, payload in self.decoder.feed(bytes(data)):
+                if kind in COALESCED or kind == MSG_HELLO:
+                    self.received[kind] = self.received.get(kind, 0) + 1
+                    continue
+                if (kind, seq, payload) in self._recent:
+                    self.duplicates += 1  # Our ack was lost or late: ack again, act once
+                else:
+                    self._recent.append((kind, seq, payload))
+                    self.received[kind] = self.received.get(kind, 0) + 1
+                replies.append(encode_frame(MSG_ACK, seq, bytes((seq,))))
+            if self.decoder.crc_errors > errors:
+                replies.append(encode_frame(MSG_NAK, 0))
+                self.nak_sent += 1
+            if replies and self.acks:
+                try:
+                    os.write(master, b"".join(replies))
+                except OSError:
+                    pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Drive an Arduino from gaze, blink and dwell events.")
+    parser.add_argument("--port", default="auto",
+                        help="Serial port of the board ('auto': the first Arduino-like USB device).")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--loopback", action="store_true",
+                        help="Talk to an emulated board on a pseudo-terminal instead (no hardware needed).")
+    parser.add_argument("--gaze-hz", type=float, default=60.0, help="Maximum GAZE command rate.")
+    parser.add_argument("--dwell", type=float, default=1000.0, metavar="MS", help="Fixation time of a DWELL command.")
+    parser.add_argument("--camera", default="0", help="Camera index or video file path (with --tracker local).")
+    parser.add_argument("--patient-id", type=int, default=None,
+                        help="Use this patient's gaze calibration (set by server.py).")
+    parser.add_argument("--calibration", default=None, metavar="PATH",
+                        help="Screen mapping written by calibration.py (default: the patient's, if any).")
+    parser.add_argument("--tracker", choices=["auto", "shared", "local"], default="auto",
+                        help="Where landmarks come from: 'shared' attaches to the trackerd.py daemon (waiting "
+                             "for it to start), 'local' opens the camera and runs FaceMesh here, 'auto' uses "
+                             "the daemon if it is running and local otherwise.")
+    parser.add_argument("--tracker-wait", type=float, default=30.0,
+                        help="Seconds to wait for the daemon with --tracker shared.")
+    parser.add_argument("--replay", default=None, metavar="PATH",
+                        help="Take frames and landmarks from a recording (see recording.py) instead of a camera.")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Pace --replay at its recorded frame rate instead of max speed.")
+    parser.add_argument("--stats-json", default=None, metavar="PATH", help="Write link statistics here on exit.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    print(">>> Script started")
+    args = parse_args(argv)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    from blink import BlinkDetector, eye_points
+    from calibration import IRIS_LANDMARK, gaze_feature, load_calibration
+    from gaze_events import DWELL, GazeEventDetector
+    from instrumentation import report_first_frame, report_status
+    from preprocess import FramePreprocessor
+
+    device = None
+    if args.loopback:
+        import tempfile
+        device = LoopbackDevice(Path(tempfile.mkdtemp(prefix="cereblaid-")) / "tty").plug()
+        port = str(device.path)
+    else:
+        port = find_port() if args.port == "auto" else args.port
+        if port is None:
+            print("!!! ERROR: No Arduino found (pass --port).")
+            return 1
+
+    def on_state(connected):
+        print(f">>> Serial {port} {'connected' if connected else 'lost, reconnecting'}")
+        report_status(serial_connected=connected)
+
+    link = SerialLink(port, args.baud, on_state=on_state).start()
+
+    shared = None
+    if not args.replay and args.tracker != "local":
+        from trackerd import open_shared
+        shared = open_shared(wait=args.tracker_wait if args.tracker == "shared" else 0.0)
+        if shared is None and args.tracker == "shared":
+            print("!!! ERROR: Tracker daemon is not running.")
+            link.stop()
+            return 1
+    if args.replay:
+        from replay import open_replay
+        grabber, face_mesh = open_replay(args.replay, args.realtime)
+    elif shared is not None:
+        grabber, face_mesh = shared
+    else:
+        import mediapipe as mp
+        from capture import FrameGrabber
+        from facemesh import RoiFaceMesh
+        grabber = FrameGrabber(args.camera)
+        face_mesh = RoiFaceMesh(mp.solutions.face_mesh.FaceMesh(refine_landmarks=True))
+    if not grabber.open():
+        print("!!! ERROR: Could not open webcam.")
+        link.stop()
+        return 1
+
+    calibration = None if args.calibration == "none" else load_calibration(args.calibration, args.patient_id)
+    mappings = calibration.mappings if calibration is not None else {}
+    preprocessor = FramePreprocessor()
+    blink_detector = BlinkDetector()
+    detector = GazeEventDetector(dwell=args.dwell / 1000)
+    gaze_interval = 1.0 / args.gaze_hz if args.gaze_hz > 0 else 0.0
+    next_gaze = 0.0
+    frames = 0
+    grabber.start()
+    try:
+        while not stop_event.is_set():
+            captured = grabber.read(timeout=1.0)
+            if captured is None:
+                if grabber.finished:
+                    break
+                continue
+            landmarks = face_mesh.process(preprocessor.rgb(captured.image))
+            frames += 1
+            if frames == 1:
+                report_first_frame()
+            if landmarks is None:
+                blink_detector.reset()
+                detector.reset(captured.timestamp)
+                grabber.mark_done(captured)
+                continue
+            feature = "iris" if len(landmarks) > IRIS_LANDMARK else "eyes"
+            gaze = gaze_feature(landmarks, feature)
+            if feature in mappings:
+                gaze = mappings[feature].map_point(*gaze)  # None: beyond the calibration's horizon
+            if gaze is not None and captured.timestamp >= next_gaze:
+                next_gaze = captured.timestamp + gaze_interval
+                link.gaze(*gaze)
+            frame_h, frame_w = captured.image.shape[:2]
+            for gesture in blink_detector.update(eye_points(landmarks, frame_w, frame_h), captured.timestamp):
+                link.blink(gesture)
+            for event in ([] if gaze is None else detector.update(captured.timestamp, *gaze)):
+                if event.kind == DWELL:
+                    link.dwell(event.x, event.y, event.duration)
+            grabber.mark_done(captured)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        link.flush(timeout=1.0)
+        link.stop()
+        grabber.stop()
+        face_mesh.close()
+        stats = link.stats()
+        print(f">>> Serial stats: {stats}")
+        if device is not None:
+            print(f">>> Loopback device received: {device.received}")
+            device.unplug()
+        if args.stats_json:
+            with open(args.stats_json, "w") as f:
+                json.dump(dict(stats, frames=frames, capture=grabber.stats()), f, indent=2)
+        print(">>> Script stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,210 @@
+# assets.py
+"""
+Fingerprinted, precompressed static assets for server.py.
+
+build() copies every file under static/ into the build directory under a name that
+contains a hash of its content (css/doctor.css -> css/doctor.1a2b3c4d5e6f.css), writes
+gzip (and, with the brotli package installed, brotli) variants of text assets next to
+them, and renders WebP versions of the logo at several widths. The resulting manifest
+maps original paths to fingerprinted ones.
+
+Assets(app) hooks the manifest into Flask: url_for('static', filename=...) returns the
+fingerprinted URL, and fingerprinted files are served with a one-year
+"Cache-Control: immutable", a strong ETag and the smallest encoding the client accepts.
+A changed file gets a new name, so browsers never have to revalidate and repeat page
+loads make no static requests at all. Unknown names (old bookmarks, hand-written
+/static/... links) still fall through to Flask's normal static handler.
+
+Run as a script to build ahead of deployment:
+
+    python assets.py
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+from pathlib import Path, PurePosixPath
+
+from flask import request, send_file
+
+try:
+    import brotli  # Optional: gzip variants are always written
+except ImportError:
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+HASH_LENGTH = 12
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+MIN_COMPRESS_BYTES = 256  # Below this the encoding overhead outweighs the saving
+IMMUTABLE = "public, max-age=31536000, immutable"
+MANIFEST_NAME = "manifest.json"
+# Raster images also offered as responsive WebP (logo is shown at 40-220 CSS px, so 1x and 2x)
+WEBP_SOURCES = ("images/cereblaid_logo.jpg",)
+WEBP_WIDTHS = (80, 160, 240, 480)
+WEBP_QUALITY = 82
+# Encodings in order of preference, with the suffix of their precompressed file
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def default_dir():
+    return Path(os.environ.get("CEREBLAID_ASSET_DIR", Path(__file__).parent / "build" / "static"))
+
+
+def fingerprint(relative, data):
+    """Content-addressed name for relative (a POSIX path below static/)."""
+    path = PurePosixPath(relative)
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return str(path.with_name(f"{path.stem}.{digest}{path.suffix}"))
+
+
+def _write_once(path, data):
+    """Write data to path atomically unless it exists (names are content hashes, so it is the same data)."""
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _emit(out_dir, relative, data, files):
+    name = fingerprint(relative, data)
+    files[relative] = name
+    target = out_dir / name
+    _write_once(target, data)
+    if target.suffix in COMPRESSIBLE and len(data) >= MIN_COMPRESS_BYTES:
+        _write_once(target.with_name(target.name + ".gz"), gzip.compress(data, 9, mtime=0))
+        if brotli is not None:
+            _write_once(target.with_name(target.name + ".br"), brotli.compress(data, quality=11))
+
+
+def _webp_variants(data, widths):
+    """(width, WebP bytes) for each width not larger than the source image (needs Pillow)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return []
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    variants = []
+    for width in widths:
+        if width > image.width:
+            break
+        height = round(image.height * width / image.width)
+        buffer = io.BytesIO()
+        image.resize((width, height), Image.LANCZOS).save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+        variants.append((width, buffer.getvalue()))
+    return variants
+
+
+def build(static_dir, out_dir=None):
+    """
+    Fingerprint and precompress everything under static_dir into out_dir.
+
+    Returns (and writes to out_dir/manifest.json) {"files": {original: fingerprinted},
+    "srcsets": {original image: [[fingerprinted webp, width], ...]}}. Rebuilding is
+    cheap: files whose content has not changed already exist and are skipped.
+    """
+    static_dir = Path(static_dir)
+    out_dir = Path(out_dir) if out_dir else default_dir()
+    files, srcsets = {}, {}
+    for path in sorted(static_dir.rglob("*")):
+        if path.is_file() and not path.name.startswith("."):
+            _emit(out_dir, path.relative_to(static_dir).as_posix(), path.read_bytes(), files)
+
+    for relative in WEBP_SOURCES:
+        source = static_dir / relative
+        if not source.exists():
+            continue
+        stem = PurePosixPath(relative).with_suffix("")
+        srcsets[relative] = []
+        for width, data in _webp_variants(source.read_bytes(), WEBP_WIDTHS):
+            variant = f"{stem}-{width}.webp"
+            _emit(out_dir, variant, data, files)
+            srcsets[relative].append([files[variant], width])
+
+    manifest = {"files": files, "srcsets": srcsets}
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp = out_dir / f".{MANIFEST_NAME}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp, out_dir / MANIFEST_NAME)
+    return manifest
+
+
+class Assets:
+    """
+    Serves the fingerprinted build of app.static_folder.
+
+    The build runs when this is created (once, in the master, under gunicorn's
+    preload_app). With app.debug set, url_for() keeps returning the plain file names so
+    edits to static/ show up without a rebuild.
+    """
+
+    def __init__(self, app, out_dir=None):
+        self.app = app
+        self.out_dir = Path(out_dir) if out_dir else default_dir()
+        manifest = build(app.static_folder, self.out_dir)
+        self.files = manifest["files"]
+        self.srcsets = manifest["srcsets"]
+        self.encodings = {}  # Fingerprinted name -> {encoding: precompressed path}
+        self.etags = {}
+        for name in self.files.values():
+            path = self.out_dir / name
+            self.etags[name] = hashlib.sha256(path.read_bytes()).hexdigest()[:HASH_LENGTH]
+            self.encodings[name] = {encoding: path.with_name(path.name + suffix)
+                                    for encoding, suffix in ENCODINGS
+                                    if path.with_name(path.name + suffix).exists()}
+        self._send_static = app.view_functions["static"]
+        app.view_functions["static"] = self.send
+        app.url_defaults(self._url_defaults)
+        app.jinja_env.globals["image_srcset"] = self.image_srcset
+        log.info(f"Assets: {len(self.files)} files fingerprinted into {self.out_dir}"
+                 f"{'' if brotli else ' (brotli not installed: gzip only)'}")
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == "static" and not self.app.debug:
+            values["filename"] = self.files.get(values.get("filename"), values.get("filename"))
+
+    def image_srcset(self, filename):
+        """srcset of the WebP variants of a static image ('' when none were built)."""
+        if self.app.debug:
+            return ""
+        prefix = self.app.static_url_path
+        return ", ".join(f"{prefix}/{name} {width}w" for name, width in self.srcsets.get(filename, []))
+
+    def send(self, filename):
+        """View for /static/<filename>: immutable responses for fingerprinted names."""
+        encodings = self.encodings.get(filename)
+        if encodings is None:
+            return self._send_static(filename=filename)
+        path, encoding = self.out_dir / filename, None
+        for candidate, _ in ENCODINGS:
+            if candidate in encodings and request.accept_encodings[candidate]:
+                path, encoding = encodings[candidate], candidate
+                break
+        # Strong ETag per representation: the content hash, plus the encoding
+        etag = self.etags[filename] + (f"-{encoding}" if encoding else "")
+        response = send_file(path, mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                             etag=etag, conditional=True, max_age=None)
+        response.headers["Cache-Control"] = IMMUTABLE
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if encodings:
+            response.vary.add("Accept-Encoding")
+        return response
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static/ for deployment.")
+    parser.add_argument("--static", default=str(Path(__file__).parent / "static"))
+    parser.add_argument("--out", default=None, help="Build directory (default: $CEREBLAID_ASSET_DIR or build/static).")
+    args = parser.parse_args()
+    manifest = build(args.static, args.out)
+    print(json.dumps({"files": len(manifest["files"]), "brotli": brotli is not None,
+                      "webp": {k: len(v) for k, v in manifest["srcsets"].items()}}, indent=2))
@@ -0,0 +1,1235 @@
+# bench.py
+"""Offline benchmarks for the tracking pipeline (no camera or display needed)."""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def _summary(samples):
+    """Mean and tail percentiles (milliseconds) of a list of durations in seconds."""
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def _measure(step, frames, repeat):
+    """Time step() per frame, then measure its transient allocations under tracemalloc."""
+    for frame in frames[:5]:  # Warm-up (buffer allocation happens here for the reusing path)
+        step(frame)
+    durations = []
+    for _ in range(repeat):
+        for frame in frames:
+            start = time.perf_counter()
+            step(frame)
+            durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    peaks = []
+    for frame in frames:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        step(frame)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    result = _summary(durations)
+    result["alloc_bytes_per_frame"] = int(np.median(peaks))
+    return result
+
+
+# --- preprocess ---
+def bench_preprocess(args):
+    """Old flip/cvtColor/resize/fromarray path vs. FramePreprocessor buffers."""
+    import cv2
+    from PIL import Image
+    from preprocess import FramePreprocessor
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8) for _ in range(8)]
+    preview_size = (300, 300)
+
+    def baseline(frame):
+        flipped = cv2.flip(frame, 1)
+        rgb = cv2.cvtColor(flipped, cv2.COLOR_BGR2RGB)
+        if args.preview:
+            Image.fromarray(cv2.resize(flipped, preview_size))
+        return rgb
+
+    preprocessor = FramePreprocessor(preview_size=preview_size)
+    preview_image = Image.new("RGB", preview_size)
+
+    def preallocated(frame):
+        rgb = preprocessor.rgb(frame)
+        if args.preview:
+            preview_image.frombytes(preprocessor.preview())
+        return rgb
+
+    return {
+        "resolution": f"{args.width}x{args.height}",
+        "preview": args.preview,
+        "before": _measure(baseline, frames, args.repeat),
+        "after": _measure(preallocated, frames, args.repeat),
+    }
+
+
+# --- roi ---
+def bench_roi(args):
+    """FaceMesh inference time on full frames vs. RoiFaceMesh crops of a recorded video."""
+    import cv2
+    import mediapipe as mp
+    from facemesh import RoiFaceMesh
+    from preprocess import FramePreprocessor
+
+    cap = cv2.VideoCapture(args.video)
+    frames = []
+    while len(frames) < args.frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"Could not read frames from {args.video}")
+
+    results = {"video": args.video, "frames": len(frames)}
+    for name, roi in (("full_frame", False), ("roi", True)):
+        runner = RoiFaceMesh(mp.solutions.face_mesh.FaceMesh(refine_landmarks=True), roi=roi,
+                             roi_size=args.roi_size)
+        preprocessor = FramePreprocessor()
+        durations, found = [], 0
+        for frame in frames:
+            rgb = preprocessor.rgb(frame)
+            start = time.perf_counter()
+            landmarks = runner.process(rgb)
+            durations.append(time.perf_counter() - start)
+            found += landmarks is not None
+        results[name] = dict(_summary(durations), face_found=found, **runner.stats())
+        runner.close()
+    results["speedup_p50"] = results["full_frame"]["p50_ms"] / results["roi"]["p50_ms"]
+    return results
+
+
+# --- grid ---
+class _StubCanvas:
+    """Tk canvas stand-in for GridRenderer (no display needed): keeps items and counts itemconfig calls."""
+
+    def __init__(self):
+        self.items = {}
+        self.itemconfigs = 0
+
+    def create_rectangle(self, *coords, **options):
+        item = len(self.items) + 1
+        self.items[item] = options
+        return item
+
+    def itemconfig(self, item, **options):
+        self.items[item].update(options)
+        self.itemconfigs += 1
+
+    def find_all(self):
+        return tuple(self.items)
+
+
+def bench_grid(args):
+    """
+    Cost of headaway.py's retained-mode grid under --rounds x --calls random set_fill calls,
+    with the canvas item count after each round (tests/test_grid.py checks it stays fixed).
+    Uses a real Tk canvas when a display is available, else a stub canvas.
+    """
+    import random
+    import tkinter as tk
+    from headaway import BACKGROUND_COLOR, HIGHLIGHT_COLOR, TARGET_COLOR, GridRenderer
+    root = None
+    try:
+        root = tk.Tk()
+        root.withdraw()
+        canvas = tk.Canvas(root, width=500, height=500)
+        backend = "tk"
+    except tk.TclError:
+        canvas = _StubCanvas()
+        backend = "stub"
+    rng = random.Random(args.seed)
+    colours = (BACKGROUND_COLOR, HIGHLIGHT_COLOR, TARGET_COLOR)
+    size = args.grid_size
+    cells = [(row, col) for row in range(size) for col in range(size)]
+    results = {"backend": backend, "grid_size": size, "rounds": []}
+    try:
+        renderer = GridRenderer(canvas, size, 500 // size, 500 // size)
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            for _ in range(args.calls):
+                renderer.set_fill(rng.choice(cells), rng.choice(colours))
+            if root is not None:
+                root.update_idletasks()
+            elapsed = time.perf_counter() - start
+            results["rounds"].append({"items": renderer.item_count(), "us_per_call": elapsed / args.calls * 1e6})
+    finally:
+        if root is not None:
+            root.destroy()
+    if backend == "stub":
+        results["itemconfig_calls"] = canvas.itemconfigs  # The rest were no-ops (cell already that colour)
+    return results
+
+
+# --- supervisor ---
+def bench_supervisor(args):
+    """
+    Latency of --launches concurrent start() calls of one dummy script, which the
+    supervisor serialises into a single launch (tests/test_supervisor.py checks the
+    launch, adoption and restart behaviour).
+    """
+    import tempfile
+    import threading
+    from supervisor import Supervisor
+    sleeper = [sys.executable, "-c", "import time; time.sleep(60)"]
+    with tempfile.TemporaryDirectory() as tmp:
+        supervisor = Supervisor(tmp)
+        try:
+            barrier = threading.Barrier(args.launches)
+            replies = []
+
+            def launch():
+                barrier.wait()
+                start = time.perf_counter()
+                _, already_running = supervisor.start("sleeper", sleeper)
+                replies.append((already_running, time.perf_counter() - start))
+
+            threads = [threading.Thread(target=launch) for _ in range(args.launches)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            supervisor.shutdown()
+    return {"concurrent_start": {"requests": args.launches,
+                                 "launched": sum(not already_running for already_running, _ in replies),
+                                 "latency": _summary([seconds for _, seconds in replies])}}
+
+
+# --- telemetry ---
+def bench_telemetry(args):
+    """End-to-end latency from a synthetic publisher through a TelemetryHub to N viewers."""
+    import tempfile
+    import threading
+    from telemetry import TelemetryHub, TelemetryPublisher
+
+    with tempfile.TemporaryDirectory() as directory:
+        hub = TelemetryHub(directory)
+        hub.ensure_started()
+        stop = threading.Event()
+        latencies = [[] for _ in range(args.viewers)]
+
+        def viewer(i):
+            sub = hub.subscribe(max_hz=args.max_hz)
+            while not stop.is_set():
+                for _, payload in sub.get(timeout=0.1):
+                    latencies[i].append(time.time() - json.loads(payload)["t"])
+            hub.unsubscribe(sub)
+
+        threads = [threading.Thread(target=viewer, args=(i,)) for i in range(args.viewers)]
+        for t in threads:
+            t.start()
+        time.sleep(0.2)
+
+        publisher = TelemetryPublisher("bench", directory=directory)
+        interval = 1.0 / args.rate
+        send_times = []
+        next_due = time.monotonic()
+        for n in range(int(args.rate * args.duration)):
+            start = time.perf_counter()
+            publisher.gaze(0.5, 0.5, seq=n)
+            send_times.append(time.perf_counter() - start)
+            next_due += interval
+            time.sleep(max(0.0, next_due - time.monotonic()))
+        time.sleep(0.2)
+        stop.set()
+        for t in threads:
+            t.join()
+        hub.close()
+
+    return {
+        "rate_hz": args.rate,
+        "viewers": args.viewers,
+        "viewer_max_hz": args.max_hz,
+        "published": len(send_times),
+        "publisher_dropped": publisher.dropped,
+        "hub_received": hub.received,
+        "publish_cost": _summary(send_times),
+        "viewer_latency": [dict(_summary(l), received=len(l)) if l else {"received": 0} for l in latencies],
+    }
+
+
+# --- recording ---
+def bench_recording(args):
+    """SessionRecorder per-frame cost, file size vs. JSON, and memmap slice time."""
+    import tempfile
+    from calibration import IRIS_LANDMARK
+    from recording import LANDMARK_SETS, NUM_LANDMARKS, Recording, SessionRecorder
+
+    rng = np.random.default_rng(0)
+    landmarks = rng.random((NUM_LANDMARKS, 3), dtype=np.float32)
+    frames = int(args.fps * args.duration)
+    results = {"frames": frames, "fps": args.fps}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, indices in LANDMARK_SETS.items():
+            path = f"{directory}/{name}.cbr"
+            recorder = SessionRecorder(path, indices=indices, queue_size=frames + 1)
+            durations = []
+            for n in range(frames):
+                start = time.perf_counter()
+                recorder.frame(landmarks, recorder.t0 + n / args.fps, n)
+                durations.append(time.perf_counter() - start)
+            recorder.close()
+
+            rec = Recording(path)
+            start = time.perf_counter()
+            window = rec.between(rec.duration / 2, rec.duration / 2 + 60)  # One minute from the middle
+            iris = np.asarray(window["landmarks"][:, rec.column(IRIS_LANDMARK)])
+            slice_time = time.perf_counter() - start
+            json_size = len(json.dumps([{"x": float(x), "y": float(y), "z": float(z)} for x, y, z in rec.landmarks[0]]))
+            results[name] = {
+                "frame_cost": _summary(durations),
+                "bytes_per_frame": rec.dtype.itemsize,
+                "json_bytes_per_frame": json_size,
+                "file_bytes": recorder.stats()["bytes"],
+                "dropped": recorder.stats()["dropped"],
+                "slice_1min_ms": slice_time * 1000,
+                "slice_frames": len(iris),
+            }
+            del rec, window
+    return results
+
+
+# --- patients ---
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David",
+               "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah",
+               "Aarav", "Priya", "Wei", "Mei", "Hiroshi", "Yuki", "Omar", "Fatima", "Lucas", "Sofia"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+              "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore",
+              "Patel", "Sharma", "Chen", "Wang", "Tanaka", "Sato", "Haddad", "Khan", "Silva", "Rossi"]
+
+
+def bench_patients(args):
+    """Doctor patient list/search latency through the Flask app with N generated patients."""
+    import os
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["CEREBLAID_DB"] = f"{directory}/load.db"
+        os.environ.setdefault("CEREBLAID_RUN_DIR", f"{directory}/run")
+        os.environ.setdefault("CEREBLAID_LOG_DIR", f"{directory}/logs")
+        import logging
+        import server
+        from werkzeug.security import generate_password_hash
+
+        logging.getLogger().setLevel(logging.WARNING)  # server.py logs every request at INFO
+        store = server.store
+        doctor_id = store.get_user("doctor@example.com")["id"]
+        start = time.perf_counter()
+        password_hash = generate_password_hash("load-test")
+        firsts = rng.choice(FIRST_NAMES, args.patients)
+        lasts = rng.choice(LAST_NAMES, args.patients)
+        store.import_patients(
+            ({"email": f"patient{i}@load.test", "name": f"{firsts[i]} {lasts[i]} {i}",
+              "age": int(rng.integers(18, 95)), "gender": "F" if i % 2 else "M"} for i in range(args.patients)),
+            password_hash, doctor_id=doctor_id)
+        load_s = time.perf_counter() - start
+
+        client = server.app.test_client()
+        client.post("/api/login", json={"email": "doctor@example.com", "password": "doctor123"})
+
+        def timed(url, n=args.repeat):
+            durations, body = [], None
+            for _ in range(n):
+                t = time.perf_counter()
+                response = client.get(url)
+                durations.append(time.perf_counter() - t)
+                body = response.get_json()
+                assert response.status_code == 200, body
+            return durations, body
+
+        results = {"patients": store.counts()["patients"], "load_s": load_s}
+        durations, first = timed("/api/doctor/patients")
+        results["first_page"] = dict(_summary(durations), rows=len(first["patients"]),
+                                     bytes=len(json.dumps(first)))
+
+        # Walk deep into the list: every page should cost about the same as the first
+        cursor, page_times, pages = first["next_cursor"], [], 0
+        while cursor and pages < args.pages:
+            durations, page = timed(f"/api/doctor/patients?cursor={cursor}", 1)
+            page_times += durations
+            cursor, pages = page["next_cursor"], pages + 1
+        results["next_pages"] = dict(_summary(page_times), pages=pages)
+
+        for label, query in (("search_prefix", "pat"), ("search_name", "sofia"),
+                             ("search_two_words", "wei chen"), ("search_number", "4242")):
+            durations, page = timed(f"/api/doctor/patients?q={query}")
+            results[label] = dict(_summary(durations), query=query, rows=len(page["patients"]))
+        durations, _ = timed("/api/doctor/patients?scope=all&q=mar")
+        results["search_all_scope"] = _summary(durations)
+        store.close()
+    return results
+
+
+# --- analytics ---
+def bench_analytics(args):
+    """Session ingest cost with rollup triggers, and trend queries from rollups vs. raw sessions."""
+    import tempfile
+    from store import PERIODS, Store, _bucket_sql
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        store = Store(f"{directory}/analytics.db")
+        store.ensure_demo_users()
+        patient_id = store.get_user("patient@example.com")["id"]
+        start_times = np.sort(time.time() - rng.uniform(0, args.days * 86400, args.sessions))
+        accuracy = rng.uniform(20, 95, args.sessions)
+
+        ingest = []
+        for started, acc in zip(start_times.tolist(), accuracy.tolist()):
+            t = time.perf_counter()
+            store.record_session(patient_id, "grid_game", started, 120.0, hits=5, attempts=int(500 / acc),
+                                 accuracy=acc, speed=5 / 120)
+            ingest.append(time.perf_counter() - t)
+        results = {"sessions": args.sessions, "days": args.days, "ingest": _summary(ingest)}
+
+        for period in PERIODS:
+            durations = []
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                buckets = store.session_trends(patient_id, "grid_game", period, limit=args.buckets)
+                durations.append(time.perf_counter() - t)
+            # The same figures straight from the raw sessions, for comparison
+            raw = []
+            for _ in range(max(1, args.repeat // 10)):
+                t = time.perf_counter()
+                store.conn.execute(
+                    f"SELECT {_bucket_sql('started', period)} AS bucket, count(*), sum(hits), sum(attempts), "
+                    "avg(accuracy) FROM sessions WHERE patient_id = ? AND kind = 'grid_game' "
+                    "GROUP BY bucket ORDER BY bucket DESC LIMIT ?", (patient_id, args.buckets)).fetchall()
+                raw.append(time.perf_counter() - t)
+            results[period] = {"rollup": dict(_summary(durations), buckets=len(buckets)), "raw_scan": _summary(raw)}
+        store.close()
+    return results
+
+
+# --- server ---
+def _free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _Client:
+    """Keep-alive HTTP client that carries the session cookie like a browser would."""
+
+    def __init__(self, port, cookie=None):
+        import http.client
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        self.cookie = cookie
+
+    def request(self, method, path, body=None):
+        headers = {"Cookie": self.cookie} if self.cookie else {}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            body = json.dumps(body)
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        data = response.read()
+        cookie = response.getheader("Set-Cookie")
+        if cookie:
+            self.cookie = cookie.split(";", 1)[0]
+        return response.status, data
+
+    def close(self):
+        self.conn.close()
+
+
+def _start_gunicorn(port, workers, threads, env):
+    import os
+    import subprocess
+    import urllib.error
+    import urllib.request
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                             "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--threads", str(threads),
+                             "--log-level", "warning", "server:app"], cwd=root, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/check-auth", timeout=1)
+        except urllib.error.HTTPError:
+            return proc  # 401 for an anonymous client: the app is up
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not come up within 30s")
+
+
+def _check_shared_state(port, users):
+    """Register and log in users on fresh connections (so different workers are hit) and count failures."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def one(i):
+        email = f"worker-check-{port}-{i}@load.test"
+        for method, path, body in (("POST", "/api/register", {"email": email, "password": "secret1",
+                                                             "name": f"Check {i}", "role": "patient"}),
+                                   ("POST", "/api/login", {"email": email, "password": "secret1"})):
+            client = _Client(port)
+            status, _ = client.request(method, path, body)
+            client.close()
+            if status != 200:
+                return f"{path} -> {status}"
+            cookie = client.cookie
+        for _ in range(5):  # The login cookie must be accepted by whichever worker answers
+            client = _Client(port, cookie)
+            status, _ = client.request("GET", "/api/check-auth")
+            client.close()
+            if status != 200:
+                return f"/api/check-auth -> {status}"
+        return None
+
+    with ThreadPoolExecutor(8) as pool:
+        errors = [e for e in pool.map(one, range(users)) if e]
+    return {"users": users, "failures": len(errors), "errors": errors[:5]}
+
+
+def _load(port, cookie, path, clients, duration):
+    """Requests per second and latency with `clients` concurrent keep-alive connections."""
+    import threading
+
+    durations, errors = [], [0]
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def run():
+        client, local, failed = _Client(port, cookie), [], 0
+        while time.monotonic() < stop:
+            t = time.perf_counter()
+            status, _ = client.request("GET", path)
+            local.append(time.perf_counter() - t)
+            failed += status != 200
+        client.close()
+        with lock:
+            durations.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=run) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return dict(_summary(durations), requests=len(durations), rps=len(durations) / elapsed, errors=errors[0])
+
+
+def bench_server(args):
+    """
+    Throughput and cross-worker consistency of the gunicorn deployment (gunicorn.conf.py).
+
+    For each worker count the server is started against the same generated database, a
+    batch of users registers and logs in over separate connections (any worker may
+    answer each request, so a per-worker secret key or user table shows up as failures),
+    and then concurrent clients load the doctor patient list.
+    """
+    import os
+    import tempfile
+    from store import Store
+    from werkzeug.security import generate_password_hash
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, CEREBLAID_DB=f"{directory}/server.db", CEREBLAID_RUN_DIR=f"{directory}/run",
+                   CEREBLAID_LOG_DIR=f"{directory}/logs", CEREBLAID_RECORD_DIR=f"{directory}/recordings",
+                   CEREBLAID_SECRET_FILE=f"{directory}/secret_key")
+        env.pop("FLASK_SECRET_KEY", None)  # Exercise the shared key file
+        store = Store(env["CEREBLAID_DB"])
+        store.ensure_demo_users()
+        firsts = rng.choice(FIRST_NAMES, args.patients)
+        lasts = rng.choice(LAST_NAMES, args.patients)
+        store.import_patients(
+            ({"email": f"patient{i}@load.test", "name": f"{firsts[i]} {lasts[i]} {i}"} for i in range(args.patients)),
+            generate_password_hash("load-test"), doctor_id=store.get_user("doctor@example.com")["id"])
+        store.close()
+
+        results = {"cpus": os.cpu_count(), "clients": args.clients, "path": args.path, "runs": {}}
+        for workers in args.workers:
+            port = _free_port()
+            proc = _start_gunicorn(port, workers, args.threads, env)
+            try:
+                shared = _check_shared_state(port, args.users)
+                login = _Client(port)
+                login.request("POST", "/api/login", {"email": "doctor@example.com", "password": "doctor123"})
+                login.close()
+                _load(port, login.cookie, args.path, args.clients, 0.5)  # Warm-up
+                load = _load(port, login.cookie, args.path, args.clients, args.duration)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+            results["runs"][workers] = {"shared_state": shared, "load": load}
+        base = results["runs"][args.workers[0]]["load"]["rps"]
+        for run in results["runs"].values():
+            run["speedup"] = run["load"]["rps"] / base if base else None
+    results["failed"] = [workers for workers, run in results["runs"].items()
+                         if run["shared_state"]["failures"] or run["load"]["errors"]]
+    return results
+
+
+# --- tracker ---
+def bench_tracker(args):
+    """
+    trackerd.py with 1..N client processes: daemon inference cost per client count, client
+    attach time, delivered frame rate and capture-to-client latency, next to the startup
+    cost a standalone tracker pays (model load + opening the source).
+    """
+    import os
+    import signal
+    import subprocess
+    import tempfile
+    from pathlib import Path
+    from trackerd import open_shared
+
+    root = Path(__file__).parent
+    with tempfile.TemporaryDirectory() as directory:
+        source = args.video
+        if source is None:
+            source = str(Path(directory) / "synthetic.avi")
+            _synthetic_video(source, seconds=args.duration + 15)
+        env = dict(os.environ, CEREBLAID_TRACKER=f"cereblaid-bench-{os.getpid()}")
+
+        # What every standalone launch pays before its first landmarks
+        start = time.perf_counter()
+        import mediapipe as mp
+        from capture import FrameGrabber
+        from facemesh import RoiFaceMesh
+        mesh = RoiFaceMesh(mp.solutions.face_mesh.FaceMesh(refine_landmarks=True, max_num_faces=1))
+        grabber = FrameGrabber(source).start()
+        frame = grabber.read(timeout=5.0)
+        mesh.process(frame.image[:, :, ::-1].copy())
+        local_startup_ms = (time.perf_counter() - start) * 1000
+        grabber.stop()
+        mesh.close()
+
+        results = {"source": source, "local_startup_ms": local_startup_ms, "runs": {}}
+        for clients in args.clients:
+            stats_path = Path(directory) / f"daemon-{clients}.json"
+            daemon = subprocess.Popen([sys.executable, "trackerd.py", "serve", "--replay", source,
+                                       "--stats-json", str(stats_path)], cwd=root, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                shared = open_shared(env["CEREBLAID_TRACKER"], wait=30.0)  # Wait for the model load
+                if shared is None:
+                    raise RuntimeError("tracker daemon did not come up")
+                shared[0].stop()
+                probes = [subprocess.Popen([sys.executable, "trackerd.py", "probe", "--seconds", str(args.duration)],
+                                           cwd=root, env=env, stdout=subprocess.PIPE, text=True)
+                          for _ in range(clients)]
+                client_stats = [json.loads(p.communicate()[0]) for p in probes]
+            finally:
+                daemon.send_signal(signal.SIGTERM)
+                daemon.wait(timeout=30)
+            daemon_stats = json.loads(stats_path.read_text())
+            results["runs"][clients] = {
+                "daemon_fps": daemon_stats["fps"],
+                "inference": daemon_stats["stages"]["inference"],
+                "publish": daemon_stats["stages"]["publish"],
+                "attach_ms": max(s["attach_ms"] for s in client_stats),
+                "client_fps": min(s["fps"] for s in client_stats),
+                "client_dropped": sum(s["dropped"] for s in client_stats),
+                "latency_ms_p50": max(s.get("latency_ms_p50", 0.0) for s in client_stats),
+                "latency_ms_p95": max(s.get("latency_ms_p95", 0.0) for s in client_stats),
+            }
+    return results
+
+
+def bench_launch(args):
+    """
+    Time to first frame of eyetracking.py replaying a video, launched from scratch vs.
+    forked from the zygote, through the supervisor exactly as server.py launches it.
+    """
+    import tempfile
+    from pathlib import Path
+    from supervisor import Supervisor
+    from zygote import ZygoteLauncher
+
+    root = Path(__file__).parent
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        source = args.video
+        if source is None:
+            source = str(directory / "synthetic.avi")
+            _synthetic_video(source, seconds=5)
+        socket_path = directory / "zygote.sock"
+        launcher = ZygoteLauncher(socket_path, {"eyetracking.py"})
+        supervisor = Supervisor(directory / "run", launcher=launcher)
+        start = time.perf_counter()
+        supervisor.start("zygote.py", [sys.executable, str(root / "zygote.py"), "serve", "--socket", str(socket_path)],
+                         cwd=root)
+        while launcher.status() is None:
+            if time.perf_counter() - start > 60:
+                raise RuntimeError("zygote did not come up")
+            time.sleep(0.05)
+        zygote_ready_ms = (time.perf_counter() - start) * 1000
+        command = [sys.executable, str(root / "eyetracking.py"), "--replay", source, "--realtime", "--headless"]
+        results = {"zygote_ready_ms": zygote_ready_ms, "preload": launcher.status()["preloaded"], "modes": {}}
+        try:
+            for mode in ("exec", "zygote"):
+                # The launcher falls back to a plain Popen when its socket does not exist
+                launcher.socket_path = socket_path if mode == "zygote" else directory / "absent.sock"
+                samples = []
+                for _ in range(args.repeat):
+                    proc, _ = supervisor.start("eyetracking.py", command, cwd=root)
+                    deadline = time.monotonic() + 60
+                    while "first_frame_ms" not in proc.reported and proc.poll() is None \
+                            and time.monotonic() < deadline:
+                        time.sleep(0.01)
+                    supervisor.stop("eyetracking.py")
+                    if "first_frame_ms" not in proc.reported or proc.launcher != mode:
+                        raise RuntimeError(f"{mode} launch reported no first frame ({proc.launcher})")
+                    samples.append(proc.reported["first_frame_ms"])
+                results["modes"][mode] = dict(_summary([ms / 1000 for ms in samples]), samples=samples)
+        finally:
+            supervisor.shutdown()
+    results["speedup"] = results["modes"]["exec"]["p50_ms"] / results["modes"]["zygote"]["p50_ms"]
+    return results
+
+
+# --- quality ---
+def bench_quality(args):
+    """
+    Adaptive quality controller (quality.py) against its synthetic load traces: level
+    changes, time over the latency budget and the decisions taken, per trace
+    (tests/test_quality.py checks the expected behaviour).
+    """
+    from quality import TRACES, simulate
+    budget_s = args.budget / 1000
+    results = {"budget_ms": args.budget, "traces": {}}
+    for name, trace in TRACES.items():
+        run = simulate(trace, budget_s=budget_s)
+        over = [latency for _, _, latency in run["timeline"] if latency > budget_s]
+        results["traces"][name] = {
+            "seconds": sum(phase[0] for phase in trace),
+            "changes": len(run["decisions"]),
+            "seconds_over_budget": len(over),
+            "levels": [level for _, level, _ in run["timeline"]],
+            "decisions": [f"{d['time']:.1f}s {d['from']}->{d['to']}: {d['reason']}" for d in run["decisions"]],
+        }
+    return results
+
+
+# --- calibration ---
+def _synthetic_user(rng):
+    """Feature position (mirrored, normalised camera coordinates) of a user looking at screen points."""
+    head = rng.uniform([0.35, 0.35], [0.65, 0.6])  # Where the head sits in the camera frame
+    gain = rng.uniform(0.12, 0.3, 2)  # How far the feature moves across the whole screen
+    bend = rng.normal(0, 0.03, 2)  # Eye rotation is not linear in screen position
+
+    def feature(screen, noise):
+        centred = screen - 0.5
+        return head + gain * centred + bend * centred[:, ::-1] ** 2 + rng.normal(0, noise, screen.shape)
+    return feature
+
+
+def bench_calibration(args):
+    """
+    Direct landmark-to-screen mapping vs. a per-user calibration fitted from a simulated
+    routine, on synthetic users with different head positions and eye movement ranges:
+    hit rate on headaway's grid, cursor error and the per-frame mapping cost. Fails above
+    --max-cost-us per frame (tests/test_calibration.py checks that calibration beats the
+    direct mapping).
+    """
+    from calibration import SETTLE_S, DWELL_S, fit_samples, targets
+    rng = np.random.default_rng(args.seed)
+    screen = np.array([1920.0, 1080.0])
+    grid = args.grid_size
+    fps = 30.0
+    results = {"users": args.users, "grid_size": grid, "noise": args.noise, "models": {}, "failed": []}
+    modes = {"direct": []}
+    for model in ("poly2", "homography"):
+        modes[model] = []
+    for _ in range(args.users):
+        feature = _synthetic_user(rng)
+        # The routine: one window per target, samples at fps with the settle period excluded
+        points = targets(args.points)
+        samples, windows = [], []
+        for index, point in enumerate(points):
+            start = index * (SETTLE_S + DWELL_S)
+            times = start + np.arange(0, SETTLE_S + DWELL_S, 1 / fps)
+            values = feature(np.repeat(point[None], len(times), axis=0), args.noise)
+            samples += [(t, x, y, x, y) for t, (x, y) in zip(times, values)]
+            windows.append((start + SETTLE_S, start + SETTLE_S + DWELL_S))
+        looked_at = rng.uniform(0, 1, (args.samples, 2))
+        observed = feature(looked_at, args.noise)
+        mapped = {"direct": np.clip(observed, 0.0, 1.0)}
+        for model in ("poly2", "homography"):
+            calibration = fit_samples(samples, windows, points, model, tuple(screen))
+            mapped[model] = calibration.mapping("iris").map(observed)
+        target_cells = np.minimum((looked_at * grid).astype(int), grid - 1)
+        for mode, positions in mapped.items():
+            cells = np.minimum((positions * grid).astype(int), grid - 1)
+            hits = float(np.all(cells == target_cells, axis=1).mean())
+            error_px = np.hypot(*((positions - looked_at) * screen).T)
+            modes[mode].append((hits, float(np.median(error_px))))
+
+    # Per-frame mapping cost: the loops map one sample per frame, replays/analysis a batch
+    calibration = fit_samples(samples, windows, points, "poly2", tuple(screen))
+    mapping = calibration.mapping("iris")
+    sample = (float(observed[0, 0]), float(observed[0, 1]))
+    batch = observed[:1000]
+
+    def per_call(step, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            step()
+        return (time.perf_counter() - start) / repeat * 1e6
+
+    costs = {
+        "direct_us": per_call(lambda: (screen[0] * sample[0], screen[1] * sample[1]), 100_000),
+        "map_point_us": per_call(lambda: mapping.map_point(*sample), 100_000),
+        "map_1_sample_us": per_call(lambda: mapping.map(sample), 20_000),
+        "map_batch_per_sample_us": per_call(lambda: mapping.map(batch), 2_000) / len(batch),
+    }
+    for mode, runs in modes.items():
+        hits = [hit for hit, _ in runs]
+        results["models"][mode] = {"hit_rate": float(np.mean(hits)), "worst_user_hit_rate": float(min(hits)),
+                                   "median_error_px": float(np.median([error for _, error in runs]))}
+    results["cost"] = costs
+    if costs["map_point_us"] > args.max_cost_us:
+        results["failed"].append(f"map_point costs {costs['map_point_us']:.1f} us per frame")
+    return results
+
+
+# --- gaze events ---
+def _detect(times, xy, **options):
+    from gaze_events import GazeEventDetector
+    detector = GazeEventDetector(**options)
+    events = []
+    for t, (x, y) in zip(times, xy):
+        events += detector.update(t, x, y)
+    return events, detector
+
+
+def bench_gaze_events(args):
+    """
+    Per-sample cost of fixation/saccade detection (gaze_events.py) on recorded gaze, for
+    several velocity spans (ring buffer sizes: the cost should not depend on it), with the
+    events found: a synthetic session (replay.py) and any --recording. Detection quality
+    against scanpaths with known fixations is checked by tests/test_gaze_events.py.
+    """
+    import tempfile
+    from gaze_events import FIXATION_START, SACCADE
+    from replay import recorded_gaze, synthesize_recording
+    options = {"min_fixation": args.min_fixation / 1000}
+    results = {"recordings": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = {"synthetic": f"{tmp}/synthetic.cbr"}
+        synthesize_recording(sources["synthetic"], seconds=args.seconds)
+        sources.update((path, path) for path in args.recording)
+        for name, path in sources.items():
+            times, gaze = recorded_gaze(path)
+            result = {"frames": len(times)}
+            for span in (2, 8, 32):
+                start = time.perf_counter()
+                events, detector = _detect(times, gaze, velocity_span=span, **options)
+                result[f"span_{span}_us"] = (time.perf_counter() - start) / max(1, len(times)) * 1e6
+            result.update(detector.stats(), fixation_starts=sum(e.kind == FIXATION_START for e in events),
+                          saccades=sum(e.kind == SACCADE for e in events))
+            results["recordings"][name] = result
+    return results
+
+
+# --- multistream ---
+def bench_multistream(args):
+    """
+    Aggregate throughput of multistream.py with 1..N looped copies of a video, one worker
+    process per stream. Scaling efficiency is total fps / (streams x single-stream fps);
+    it fails below --min-efficiency for stream counts that fit on the available cores.
+    """
+    import tempfile
+    from multistream import MultiStreamTracker, available_cores
+    cores = available_cores()
+    results = {"cores": len(cores), "seconds": args.duration, "streams": {}, "failed": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video
+        if video is None:
+            video = f"{tmp}/synthetic.avi"
+            _synthetic_video(video, 5.0)
+        for count in args.streams:
+            tracker = MultiStreamTracker([video] * count, loop=True, pin=args.pin).start()
+            try:
+                if tracker.errors:
+                    raise RuntimeError(f"streams failed to start: {tracker.errors}")
+                warmup_end = time.monotonic() + 1.0  # The first frames include graph warm-up
+                for _ in tracker.results(timeout=10.0):
+                    if time.monotonic() >= warmup_end:
+                        break
+                before = dict(tracker.received)
+                start = time.monotonic()
+                for _ in tracker.results(timeout=10.0):
+                    if time.monotonic() - start >= args.duration:
+                        break
+                elapsed = time.monotonic() - start
+                fps = {name: (tracker.received[name] - before[name]) / elapsed for name in tracker.names}
+            finally:
+                tracker.stop()
+            latency = [value for values in tracker.latency.values() for value in values]
+            results["streams"][count] = {"total_fps": sum(fps.values()), "per_stream_fps": fps,
+                                         "cores_used": sorted(set(tracker.cores.values()), key=str),
+                                         "latency": _summary(latency)}
+    single = results["streams"].get(1, {}).get("total_fps")
+    for count, stream in results["streams"].items():
+        if single:
+            stream["efficiency"] = stream["total_fps"] / (count * single)
+            if count <= len(cores) and stream["efficiency"] < args.min_efficiency:
+                results["failed"].append(f"{count} streams: scaling efficiency {stream['efficiency']:.2f}")
+    if max(args.streams) > len(cores):
+        results["note"] = f"only {len(cores)} cores available: stream counts above that share cores"
+    return results
+
+
+# --- serial ---
+def _wait_connected(link, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not link.connected and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return link.connected
+
+
+def _serial_flood(path, args, pace, events):
+    """Reliable command latency (send to ack) while a thread sends gaze at --gaze-hz over an emulated --baud line."""
+    import threading
+    from arduino_control import MSG_GAZE, LoopbackDevice, SerialLink
+    device = LoopbackDevice(path, baudrate=args.baud).plug()
+    link = SerialLink(str(path), args.baud, pace=pace).start()
+    stop = threading.Event()
+
+    def flood():
+        n = 0
+        while not stop.is_set():
+            link.gaze((n % 100) / 100, 0.5)
+            n += 1
+            time.sleep(1.0 / args.gaze_hz)
+
+    latency = []
+    flooder = threading.Thread(target=flood, daemon=True)
+    try:
+        _wait_connected(link)
+        flooder.start()
+        start = time.monotonic()
+        for n in range(events):
+            acked = link.counts["acked"]
+            sent = time.monotonic()
+            link.dwell(0.5, 0.5, n / 1000)
+            while link.counts["acked"] == acked and time.monotonic() - sent < 2.0:
+                time.sleep(0.001)
+            latency.append(time.monotonic() - sent)
+            time.sleep(0.02)
+        seconds = time.monotonic() - start
+    finally:
+        stop.set()
+        flooder.join()
+        link.stop()
+        device.unplug()
+    stats = link.stats()
+    return {"event_latency": _summary(latency), "gaze_queued": stats["queued"] - events,
+            "gaze_delivered": device.received.get(MSG_GAZE, 0), "gaze_coalesced": stats["coalesced"],
+            "line_utilisation": stats["bytes_written"] * 10 / args.baud / seconds}
+
+
+def bench_serial(args):
+    """
+    arduino_control.py's serial link against the pty stand-in for the board: reliable
+    throughput, ack round trip and event latency under a gaze flood at the emulated baud
+    rate. Fails when the event p95 exceeds --max-latency-ms (delivery, corruption and
+    reconnects are checked by tests/test_serial_link.py).
+    """
+    import tempfile
+    from pathlib import Path
+    from arduino_control import LoopbackDevice, SerialLink
+    results = {"baud": args.baud, "failed": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "tty"
+
+        # Throughput: reliable commands as fast as the window of unacknowledged frames allows
+        # (unpaced: the pty has no line rate, so this is the host-side cost per frame)
+        device = LoopbackDevice(path).plug()
+        link = SerialLink(str(path), queue_size=args.frames, pace=False).start()
+        try:
+            _wait_connected(link)
+            start = time.monotonic()
+            for n in range(args.frames):
+                link.dwell(0.5, 0.5, n / 1000)
+            link.flush(30.0)
+            elapsed = time.monotonic() - start
+            stats = link.stats()
+            results["throughput"] = {"frames_per_s": args.frames / elapsed,
+                                     "bytes_per_s": stats["bytes_written"] / elapsed,
+                                     "frames_per_write": stats["frames_written"] / max(1, stats["writes"])}
+            # Round trip: one command at a time
+            link.rtt.clear()
+            for n in range(args.round_trips):
+                link.dwell(0.5, 0.5, n / 1000)
+                link.flush(1.0)
+            results["round_trip"] = _summary(list(link.rtt))
+        finally:
+            link.stop()
+            device.unplug()
+
+        # Event latency (send to ack) while gaze arrives faster than the line can carry it,
+        # with the writer paced to the baud rate and, for comparison (fewer events: each waits
+        # up to seconds), writing as fast as it can
+        results["gaze_flood"] = _serial_flood(path, args, True, args.events)
+        results["gaze_flood_unpaced"] = _serial_flood(path, args, False, min(args.events, 50))
+        if results["gaze_flood"]["event_latency"]["p95_ms"] > args.max_latency_ms:
+            results["failed"].append(f"event p95 {results['gaze_flood']['event_latency']['p95_ms']:.1f} ms "
+                                     f"> {args.max_latency_ms} ms under a gaze flood")
+    return results
+
+
+# --- suite ---
+SUITE_FLOOR_MS = 0.05  # Ignore regressions smaller than this (sub-50us stages are mostly noise)
+
+
+def _synthetic_video(path, seconds, fps=30.0, size=(640, 480)):
+    """Write a face-less test video; FaceMesh still runs its full-frame detector on every frame."""
+    import cv2
+    width, height = size
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    ramp = np.linspace(0, 255, width, dtype=np.float32)
+    for n in range(int(seconds * fps)):
+        row = ((ramp + n * 4) % 256).astype(np.uint8)
+        frame = np.broadcast_to(row[None, :, None], (height, width, 3)).copy()
+        cv2.circle(frame, (width // 2 + int(100 * np.sin(n / 15)), height // 2), 60, (40, 80, 200), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def _run_case(command, timeout):
+    import subprocess
+    import tempfile
+    from pathlib import Path
+
+    with tempfile.TemporaryDirectory() as directory:
+        stats_path = Path(directory) / "stats.json"
+        start = time.perf_counter()
+        proc = subprocess.run(command + ["--stats-json", str(stats_path)], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, timeout=timeout)
+        wall = time.perf_counter() - start
+        if proc.returncode != 0 or not stats_path.exists():
+            return {"error": f"exit code {proc.returncode}", "output": proc.stdout[-2000:] + proc.stderr[-2000:]}
+        stats = json.loads(stats_path.read_text())
+    stats["wall_s"] = wall
+    return stats
+
+
+def _regressions(results, baseline, tolerance):
+    """Cases/stages slower (p95), slower overall (fps) or bigger (peak RSS) than the baseline allows."""
+    found = []
+    for case, current in results.items():
+        before = baseline.get(case)
+        if not before or "error" in before or "error" in current:
+            continue
+        if current["fps"] < before["fps"] * (1 - tolerance):
+            found.append(f"{case}: fps {before['fps']:.1f} -> {current['fps']:.1f}")
+        for stage, stats in current["stages"].items():
+            old = before["stages"].get(stage)
+            if old and stats["p95_ms"] > old["p95_ms"] * (1 + tolerance) + SUITE_FLOOR_MS:
+                found.append(f"{case}: {stage} p95 {old['p95_ms']:.3f} -> {stats['p95_ms']:.3f} ms")
+        if before.get("peak_rss_bytes") and current.get("peak_rss_bytes", 0) > before["peak_rss_bytes"] * (1 + tolerance):
+            found.append(f"{case}: peak RSS {before['peak_rss_bytes']} -> {current['peak_rss_bytes']} bytes")
+    return found
+
+
+def bench_suite(args):
+    """Replay eyetracking.py and headaway.py's worker over videos/recordings; per-stage latency and RSS."""
+    import tempfile
+    from pathlib import Path
+    from replay import synthesize_recording
+
+    with tempfile.TemporaryDirectory() as directory:
+        videos, recordings = list(args.video), list(args.recording)
+        if not videos and not recordings:
+            # No assets: synthetic sessions still exercise the whole pipeline (and FaceMesh on video)
+            recordings.append(str(Path(directory) / "synthetic.cbr"))
+            synthesize_recording(recordings[0], seconds=args.seconds)
+            videos.append(str(Path(directory) / "synthetic.avi"))
+            _synthetic_video(videos[0], seconds=min(args.seconds, 10.0))
+
+        cases = {}
+        for source in videos + recordings:
+            name = Path(source).name
+            cases[f"eyetracking:{name}"] = [sys.executable, "eyetracking.py", "--headless", "--replay", source]
+            cases[f"headaway:{name}"] = [sys.executable, "replay.py", "headaway", source]
+        results = {case: _run_case(command, args.timeout) for case, command in cases.items()}
+
+    report = {"cases": results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]["cases"]
+        report["tolerance"] = args.tolerance
+        report["regressions"] = _regressions(results, baseline, args.tolerance)
+    report["failed"] = [case for case, stats in results.items() if "error" in stats]
+    return report
+
+
+BENCHMARKS = {
+    "preprocess": bench_preprocess,
+    "roi": bench_roi,
+    "grid": bench_grid,
+    "supervisor": bench_supervisor,
+    "telemetry": bench_telemetry,
+    "recording": bench_recording,
+    "suite": bench_suite,
+    "patients": bench_patients,
+    "analytics": bench_analytics,
+    "server": bench_server,
+    "tracker": bench_tracker,
+    "launch": bench_launch,
+    "quality": bench_quality,
+    "calibration": bench_calibration,
+    "gaze-events": bench_gaze_events,
+    "multistream": bench_multistream,
+    "serial": bench_serial,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = sub.add_parser("preprocess", help="Per-frame colour conversion/preview cost and allocations.")
+    p.add_argument("--width", type=int, default=1920)
+    p.add_argument("--height", type=int, default=1080)
+    p.add_argument("--repeat", type=int, default=20, help="Passes over the synthetic frames.")
+    p.add_argument("--preview", action=argparse.BooleanOptionalAction, default=True,
+                   help="Include the 300x300 preview path used by headaway.py.")
+
+    p = sub.add_parser("roi", help="Full-frame vs. ROI-cropped FaceMesh inference on a video file.")
+    p.add_argument("video", help="Video file containing a face.")
+    p.add_argument("--frames", type=int, default=300)
+    p.add_argument("--roi-size", type=int, default=256)
+
+    p = sub.add_parser("grid", help="headaway.py grid recolour cost and canvas item count under many set_fill calls.")
+    p.add_argument("--grid-size", type=int, default=5)
+    p.add_argument("--rounds", type=int, default=5)
+    p.add_argument("--calls", type=int, default=100000, help="set_fill calls per round.")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("supervisor", help="Script supervisor: latency of concurrent launches of a dummy script.")
+    p.add_argument("--launches", type=int, default=8, help="Concurrent start() calls of one script.")
+
+    p = sub.add_parser("telemetry", help="Tracker -> hub -> viewer latency with a synthetic publisher.")
+    p.add_argument("--viewers", type=int, default=4)
+    p.add_argument("--rate", type=float, default=120.0, help="Published gaze samples per second.")
+    p.add_argument("--max-hz", type=float, default=30.0, help="Per-viewer gaze downsampling (0 = none).")
+    p.add_argument("--duration", type=float, default=5.0)
+
+    p = sub.add_parser("recording", help="Session recorder write cost, size and memmap slicing.")
+    p.add_argument("--fps", type=float, default=30.0)
+    p.add_argument("--duration", type=float, default=600.0, help="Seconds of synthetic session.")
+
+    p = sub.add_parser("suite", help="Replay benchmarks of the tracking scripts (FPS, stage latency, peak RSS).")
+    p.add_argument("--video", action="append", default=[], help="Video file to replay (repeatable).")
+    p.add_argument("--recording", action="append", default=[], help=".cbr recording to replay (repeatable).")
+    p.add_argument("--seconds", type=float, default=30.0, help="Length of the synthetic session when no sources are given.")
+    p.add_argument("--baseline", default=None, help="Earlier suite --json output to compare against.")
+    p.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before flagging a regression.")
+    p.add_argument("--timeout", type=float, default=600.0, help="Per-case timeout in seconds.")
+
+    p = sub.add_parser("patients", help="Doctor patient list/search latency with generated patients.")
+    p.add_argument("--patients", type=int, default=100_000)
+    p.add_argument("--pages", type=int, default=200, help="Pages to walk with next_cursor.")
+    p.add_argument("--repeat", type=int, default=50, help="Requests per measured query.")
+
+    p = sub.add_parser("analytics", help="Session ingest and rollup-backed trend query latency.")
+    p.add_argument("--sessions", type=int, default=50_000, help="Sessions generated for one patient.")
+    p.add_argument("--days", type=int, default=3 * 365, help="Period the sessions are spread over.")
+    p.add_argument("--buckets", type=int, default=12)
+    p.add_argument("--repeat", type=int, default=200)
+
+    p = sub.add_parser("server", help="gunicorn throughput and cross-worker session/user consistency.")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare.")
+    p.add_argument("--threads", type=int, default=8, help="Threads per worker.")
+    p.add_argument("--clients", type=int, default=16, help="Concurrent keep-alive client connections.")
+    p.add_argument("--duration", type=float, default=5.0, help="Seconds of load per worker count.")
+    p.add_argument("--users", type=int, default=24, help="Users registered and logged in across workers.")
+    p.add_argument("--patients", type=int, default=2_000)
+    p.add_argument("--path", default="/api/doctor/patients?limit=50", help="Endpoint to load.")
+
+    p = sub.add_parser("tracker", help="Shared tracking daemon: inference cost and latency with 1..N clients.")
+    p.add_argument("--video", default=None, help="Video to publish (default: a synthetic one).")
+    p.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4], help="Client counts to compare.")
+    p.add_argument("--duration", type=float, default=5.0, help="Seconds each client reads for.")
+
+    p = sub.add_parser("launch", help="Script time to first frame: cold start vs. forked from the zygote.")
+    p.add_argument("--video", default=None, help="Video to replay (default: a synthetic one).")
+    p.add_argument("--repeat", type=int, default=5, help="Launches per mode.")
+
+    p = sub.add_parser("quality", help="Adaptive quality controller against synthetic CPU load traces.")
+    p.add_argument("--budget", type=float, default=100.0, help="Latency budget in milliseconds.")
+
+    p = sub.add_parser("calibration", help="Calibrated vs. direct gaze-to-screen mapping: hit rate and cost.")
+    p.add_argument("--users", type=int, default=20, help="Synthetic users (head position, eye range).")
+    p.add_argument("--points", type=int, default=9, help="Calibration targets.")
+    p.add_argument("--samples", type=int, default=2000, help="Gaze samples evaluated per user.")
+    p.add_argument("--grid-size", type=int, default=5, help="Grid the hit rate is measured on (headaway.py).")
+    p.add_argument("--noise", type=float, default=0.002, help="Landmark jitter (normalised camera units).")
+    p.add_argument("--max-cost-us", type=float, default=20.0, help="Fail above this per-frame mapping cost.")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("gaze-events", help="Per-sample cost of fixation/saccade detection on recorded gaze.")
+    p.add_argument("--recording", action="append", default=[], help="Also run on this .cbr recording (repeatable).")
+    p.add_argument("--seconds", type=float, default=120.0, help="Length of the synthetic session.")
+    p.add_argument("--min-fixation", type=float, default=100.0, help="Minimum fixation in milliseconds.")
+
+    p = sub.add_parser("multistream", help="Parallel per-camera worker processes: throughput vs. stream count.")
+    p.add_argument("--video", default=None, help="Video to loop in every stream (default: a synthetic one).")
+    p.add_argument("--streams", type=int, nargs="+", default=[1, 2, 4], help="Stream counts to compare.")
+    p.add_argument("--duration", type=float, default=5.0, help="Measured seconds per stream count.")
+    p.add_argument("--pin", action=argparse.BooleanOptionalAction, default=True, help="Pin workers to cores.")
+    p.add_argument("--min-efficiency", type=float, default=0.8,
+                   help="Fail below this scaling efficiency (stream counts up to the core count only).")
+
+    p = sub.add_parser("serial", help="arduino_control.py serial link against a pty stand-in for the board.")
+    p.add_argument("--frames", type=int, default=5000, help="Reliable commands in the throughput run.")
+    p.add_argument("--round-trips", type=int, default=200, help="Sequential commands for the ack round trip.")
+    p.add_argument("--events", type=int, default=200, help="Reliable commands in the flood run.")
+    p.add_argument("--baud", type=int, default=115200, help="Line rate emulated during the gaze flood.")
+    p.add_argument("--gaze-hz", type=float, default=2000.0,
+                   help="Gaze commands per second during the flood (115200 baud carries about 1150).")
+    p.add_argument("--max-latency-ms", type=float, default=20.0, help="Fail above this event p95 under the flood.")
+
+    for p in sub.choices.values():
+        p.add_argument("--json", dest="json_path", default=None, help="Also write results to this file.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {"benchmark": args.benchmark, "results": BENCHMARKS[args.benchmark](args)}
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            f.write(text + "\n")
+    # Non-zero exit lets CI fail the job on suite regressions or failed cases
+    return 1 if results["results"].get("regressions") or results["results"].get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# blink.py
+
+import numpy as np
+
+# --- FaceMesh eye landmarks (p1..p6 of the eye-aspect-ratio formula) ---
+# p1/p4 are the eye corners, p2/p6 and p3/p5 are opposing upper/lower lid points.
+RIGHT_EYE = [33, 160, 158, 133, 153, 144]
+LEFT_EYE = [362, 385, 387, 263, 373, 380]
+EYE_INDICES = np.array([RIGHT_EYE, LEFT_EYE])
+
+# --- Gesture names emitted by BlinkDetector.update ---
+BLINK = "blink"
+DOUBLE_BLINK = "double_blink"
+LONG_BLINK = "long_blink"
+
+
+def eye_points(landmarks, frame_w, frame_h):
+    """Extract the (2, 6, 2) eye points in pixel units from an (N, 3) landmark array."""
+    return landmarks[EYE_INDICES, :2] * np.array([frame_w, frame_h], dtype=np.float32)
+
+
+def eye_aspect_ratio(points):
+    """Vectorised EAR for an array of shape (..., 6, 2); returns shape (...)."""
+    points = np.asarray(points, dtype=np.float32)
+    vertical = (np.linalg.norm(points[..., 1, :] - points[..., 5, :], axis=-1) +
+                np.linalg.norm(points[..., 2, :] - points[..., 4, :], axis=-1))
+    horizontal = np.linalg.norm(points[..., 0, :] - points[..., 3, :], axis=-1)
+    return vertical / np.maximum(2.0 * horizontal, 1e-6)
+
+
+class BlinkDetector:
+    """
+    Frame-driven blink state machine.
+
+    Feed it eye points and a timestamp every frame; it returns the gestures that
+    completed on that frame. Debouncing is done with timestamps (refractory) instead
+    of sleeping, so the caller's loop keeps running at full rate.
+
+    - blink:        both eyes closed for min_closed..long_blink seconds
+    - double_blink: a second blink within double_window of the previous one
+    - long_blink:   eyes held closed for long_blink seconds (emitted while still closed)
+    """
+
+    def __init__(self, close_threshold=0.18, open_threshold=0.22, min_closed=0.05,
+                 long_blink=0.8, double_window=0.6, refractory=0.1):
+        self.close_threshold = close_threshold
+        self.open_threshold = open_threshold  # Hysteresis to ignore lid flutter
+        self.min_closed = min_closed
+        self.long_blink = long_blink
+        self.double_window = double_window
+        self.refractory = refractory
+        self.reset()
+
+    def reset(self):
+        """Forget any in-progress blink (e.g. when the face is lost)."""
+        self.closed_since = None
+        self.long_emitted = False
+        self.last_blink_end = None
+        self.refractory_until = float("-inf")
+        self.ear = None
+
+    def update(self, points, timestamp):
+        """Advance the state machine by one frame and return a list of gestures."""
+        self.ear = float(eye_aspect_ratio(points).mean())
+        events = []
+
+        if self.closed_since is None:
+            if self.ear < self.close_threshold and timestamp >= self.refractory_until:
+                self.closed_since = timestamp
+                self.long_emitted = False
+            return events
+
+        closed_for = timestamp - self.closed_since
+        if self.ear > self.open_threshold:
+            if not self.long_emitted and closed_for >= self.min_closed:
+                if (self.last_blink_end is not None and
+                        self.closed_since - self.last_blink_end <= self.double_window):
+                    events.append(DOUBLE_BLINK)
+                    self.last_blink_end = None  # A third blink starts a new sequence
+                else:
+                    events.append(BLINK)
+                    self.last_blink_end = timestamp
+            self.closed_since = None
+            self.refractory_until = timestamp + self.refractory
+        elif not self.long_emitted and closed_for >= self.long_blink:
+            events.append(LONG_BLINK)
+            self.long_emitted = True
+            self.last_blink_end = None
+        return events
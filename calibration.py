@@ -0,0 +1,443 @@
+# calibration.py
+"""
+Per-user gaze calibration: maps a tracked eye position to a point on the screen.
+
+Without calibration the trackers use the mirrored landmark position as the screen
+position (eyetracking.py: iris landmark 470, headaway.py: the midpoint of the inner eye
+corners 362/133), so where the user's head sits and how far their eyes actually move
+decide which part of the screen is reachable. The calibration routine shows N targets
+(a 3x3 grid by default), takes the median feature position while the user looks at each
+one and fits a ScreenMapping per feature by least squares: a quadratic polynomial
+("poly2", 6 coefficients per axis) or a homography (DLT).
+
+The fitted coefficients are the whole mapping: map() applies them to a batch of samples
+as one (N, terms) x (terms, 2) product, map_point() to a single sample with plain float
+arithmetic (what the per-frame loops use). Calibrations are cached per user in
+$CEREBLAID_CALIBRATION_DIR (default: calibration/ next to the database) and loaded by
+the trackers at startup.
+
+    python calibration.py --patient-id 2
+    python calibration.py --points 16 --model homography
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from preprocess import mirror_x
+
+MODELS = ("poly2", "homography")
+FEATURES = ("iris", "eyes")  # iris: IRIS_LANDMARK (needs refinement), eyes: midpoint of 362/133
+# Top of the iris ring on the unflipped frame: the same physical point as 475 on the
+# mirrored frame the trackers used to run FaceMesh on
+IRIS_LANDMARK = 470
+CALIBRATION_POINTS = 9
+MARGIN = 0.1  # Targets keep this fraction of the screen clear at each edge
+SETTLE_S = 0.8  # Samples ignored after a target appears (saccade + fixation)
+DWELL_S = 1.2  # Samples collected per target after settling
+MIN_SAMPLES = 5  # Targets with fewer face samples are left out of the fit
+TARGET_RADIUS = 20
+HORIZON_EPS = 1e-6  # Homography w at or below this: the sample maps to infinity or beyond the horizon
+
+
+def default_dir():
+    """Directory with the per-user calibration files (next to the database by default)."""
+    database = Path(os.environ.get("CEREBLAID_DB", Path(__file__).parent / "data" / "cereblaid.db"))
+    return Path(os.environ.get("CEREBLAID_CALIBRATION_DIR", database.parent / "calibration"))
+
+
+def user_path(patient_id=None, directory=None):
+    """Calibration file of a patient (default.json for runs without a patient)."""
+    name = f"patient-{patient_id}.json" if patient_id is not None else "default.json"
+    return Path(directory or default_dir()) / name
+
+
+def gaze_feature(landmarks, feature="iris"):
+    """Mirrored (x, y) of a feature, falling back from the iris to the eye corners without refinement."""
+    if feature == "iris" and len(landmarks) > IRIS_LANDMARK:
+        return mirror_x(landmarks[IRIS_LANDMARK, 0]), landmarks[IRIS_LANDMARK, 1]
+    return (mirror_x((landmarks[362, 0] + landmarks[133, 0]) / 2),
+            (landmarks[362, 1] + landmarks[133, 1]) / 2)
+
+
+def targets(count=CALIBRATION_POINTS, margin=MARGIN):
+    """(count, 2) normalised screen positions on a square grid (count is rounded down to a square)."""
+    side = max(2, int(count ** 0.5))
+    axis = np.linspace(margin, 1.0 - margin, side)
+    xs, ys = np.meshgrid(axis, axis)
+    return np.column_stack((xs.ravel(), ys.ravel()))
+
+
+# --- Models ---
+def _poly2_terms(points):
+    x, y = points[:, 0], points[:, 1]
+    return np.column_stack((np.ones_like(x), x, y, x * y, x * x, y * y))
+
+
+def _normalizer(points):
+    """Similarity transform moving points to zero mean and sqrt(2) mean distance (Hartley)."""
+    centre = points.mean(axis=0)
+    spread = np.sqrt(((points - centre) ** 2).sum(axis=1)).mean()
+    scale = np.sqrt(2) / spread if spread > 0 else 1.0
+    return np.array([[scale, 0, -scale * centre[0]], [0, scale, -scale * centre[1]], [0, 0, 1]])
+
+
+def _fit_homography(features, screen):
+    source, target = _normalizer(features), _normalizer(screen)
+    f = np.column_stack((features, np.ones(len(features)))) @ source.T
+    s = np.column_stack((screen, np.ones(len(screen)))) @ target.T
+    zeros = np.zeros((len(f), 3))
+    rows_x = np.hstack((-f, zeros, f * s[:, :1]))
+    rows_y = np.hstack((zeros, -f, f * s[:, 1:2]))
+    _, _, vt = np.linalg.svd(np.vstack((rows_x, rows_y)))
+    matrix = np.linalg.inv(target) @ vt[-1].reshape(3, 3) @ source
+    return matrix / matrix[2, 2]
+
+
+def _apply(model, matrix, points):
+    """
+    Unclipped screen positions of an (N, 2) batch: one matrix product (plus the homogeneous
+    divide). Rows a homography cannot map (w <= HORIZON_EPS) are NaN.
+    """
+    if model == "poly2":
+        return _poly2_terms(points) @ matrix
+    h = np.column_stack((points, np.ones(len(points)))) @ matrix.T
+    beyond = h[:, 2] <= HORIZON_EPS
+    h[beyond] = np.nan
+    return h[:, :2] / h[:, 2:]
+
+
+
+class ScreenMapping:
+    """A fitted feature -> normalised screen transform: "poly2" (6x2 matrix) or "homography" (3x3)."""
+
+    def __init__(self, model, matrix, feature="iris", rmse=None):
+        if model not in MODELS:
+            raise ValueError(f"Unknown calibration model: {model}")
+        self.model = model
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.feature = feature
+        self.rmse = rmse  # Per-axis fit residual [x, y] in normalised screen units
+        self._c = tuple(float(v) for v in self.matrix.ravel())  # Row-major, for map_point
+
+    def map(self, points):
+        """(N, 2) feature positions -> (N, 2) screen positions, clipped to [0, 1] (NaN where unmappable)."""
+        mapped = _apply(self.model, self.matrix, np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        return np.clip(mapped, 0.0, 1.0, out=mapped)
+
+    def map_point(self, x, y):
+        """
+        map() for a single sample, in plain floats (a 1-row array costs more than the
+        arithmetic). None when a homography puts the sample at or beyond its horizon.
+        """
+        c = self._c
+        if self.model == "poly2":
+            xy, xx, yy = x * y, x * x, y * y
+            sx = c[0] + c[2] * x + c[4] * y + c[6] * xy + c[8] * xx + c[10] * yy
+            sy = c[1] + c[3] * x + c[5] * y + c[7] * xy + c[9] * xx + c[11] * yy
+        else:
+            w = c[6] * x + c[7] * y + c[8]
+            if w <= HORIZON_EPS:
+                return None
+            sx = (c[0] * x + c[1] * y + c[2]) / w
+            sy = (c[3] * x + c[4] * y + c[5]) / w
+        return min(max(sx, 0.0), 1.0), min(max(sy, 0.0), 1.0)
+
+    def to_dict(self):
+        return {"model": self.model, "feature": self.feature, "matrix": self.matrix.tolist(), "rmse": self.rmse}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["model"], data["matrix"], data.get("feature", "iris"), data.get("rmse"))
+
+
+def fit(features, screen, model="poly2", feature="iris"):
+    """
+    Least-squares ScreenMapping from (N, 2) feature positions to the (N, 2) screen
+    positions that were looked at. poly2 needs 6 points, homography 4.
+    """
+    features = np.asarray(features, dtype=np.float64)
+    screen = np.asarray(screen, dtype=np.float64)
+    needed = 6 if model == "poly2" else 4
+    if len(features) < needed:
+        raise ValueError(f"{model} calibration needs at least {needed} points, got {len(features)}")
+    if model == "poly2":
+        matrix = np.linalg.lstsq(_poly2_terms(features), screen, rcond=None)[0]
+    elif model == "homography":
+        matrix = _fit_homography(features, screen)
+        w = np.column_stack((features, np.ones(len(features)))) @ matrix[2]
+        if not np.all(w > HORIZON_EPS):
+            # The horizon runs through the calibrated region: gaze near it would jump across the screen
+            raise ValueError("homography calibration puts calibration points beyond its horizon")
+    else:
+        raise ValueError(f"Unknown calibration model: {model}")
+    residual = _apply(model, matrix, features) - screen
+    return ScreenMapping(model, matrix, feature, rmse=np.sqrt((residual ** 2).mean(axis=0)).tolist())
+
+
+class Calibration:
+    """One user's fitted mappings by feature, with the screen size they were fitted on."""
+
+    def __init__(self, mappings, screen=None, created=None, points=None):
+        self.mappings = dict(mappings)
+        self.screen = tuple(screen) if screen else None
+        self.created = created if created is not None else time.time()
+        self.points = points
+
+    def mapping(self, feature):
+        return self.mappings.get(feature)
+
+    def error_px(self, feature, screen=None):
+        """Fit residual of a feature's mapping in pixels of screen (default: the calibrated screen)."""
+        width, height = screen or self.screen or (1, 1)
+        rx, ry = self.mappings[feature].rmse
+        return float(np.hypot(rx * width, ry * height))
+
+    def describe(self, screen=None):
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.created))
+        return f"{self.points} points, {created}, " + ", ".join(
+            f"{feature} {mapping.model} error {self.error_px(feature, screen):.0f} px"
+            for feature, mapping in self.mappings.items())
+
+    def to_dict(self):
+        return {"created": self.created, "screen": self.screen, "points": self.points,
+                "mappings": {feature: mapping.to_dict() for feature, mapping in self.mappings.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({feature: ScreenMapping.from_dict(mapping) for feature, mapping in data["mappings"].items()},
+                   data.get("screen"), data.get("created"), data.get("points"))
+
+
+def save_calibration(calibration, path):
+    """Write atomically, so a tracker starting meanwhile reads the old or the new calibration."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(calibration.to_dict(), indent=1))
+    os.replace(tmp, path)
+    return path
+
+
+def load_calibration(path=None, patient_id=None):
+    """The Calibration at path (default: the patient's cached one), or None if there is none."""
+    path = Path(path) if path else user_path(patient_id)
+    try:
+        return Calibration.from_dict(json.loads(path.read_text()))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"!!! Ignoring unreadable calibration {path}: {e}")
+        return None
+
+
+# --- Calibration routine ---
+def target_medians(samples, windows, columns):
+    """
+    Median of samples[:, columns] inside each (start, end) time window (samples[:, 0] are
+    sorted timestamps). Returns (medians, indices of the windows with enough samples).
+    """
+    times = samples[:, 0]
+    starts = np.searchsorted(times, [start for start, _ in windows])
+    ends = np.searchsorted(times, [end for _, end in windows])
+    medians, kept = [], []
+    for index, (lo, hi) in enumerate(zip(starts, ends)):
+        chunk = samples[lo:hi][:, columns]
+        chunk = chunk[~np.isnan(chunk).any(axis=1)]
+        if len(chunk) >= MIN_SAMPLES:
+            medians.append(np.median(chunk, axis=0))
+            kept.append(index)
+    return np.array(medians).reshape(-1, len(columns)), kept
+
+
+def fit_samples(samples, windows, screen_targets, model="poly2", screen=None):
+    """Calibration with a mapping for every feature that has enough usable targets (None if none has)."""
+    samples = np.asarray(samples, dtype=np.float64).reshape(-1, 5)
+    mappings = {}
+    for feature, columns in (("iris", [1, 2]), ("eyes", [3, 4])):
+        medians, kept = target_medians(samples, windows, columns)
+        try:
+            mappings[feature] = fit(medians, screen_targets[kept], model, feature)
+        except ValueError:
+            continue
+    if not mappings:
+        return None
+    return Calibration(mappings, screen, points=len(screen_targets))
+
+
+class FeatureSampler:
+    """Reads frames on a background thread and keeps (timestamp, iris x, y, eyes x, y) per face frame."""
+
+    def __init__(self, grabber, face_mesh):
+        from preprocess import FramePreprocessor
+        self.grabber = grabber
+        self.face_mesh = face_mesh
+        self.preprocessor = FramePreprocessor()
+        self.samples = []
+        self.frames = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="calibration-sampler", daemon=True)
+
+    def start(self):
+        self.grabber.start()
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        self.grabber.stop()
+        return np.array(self.samples, dtype=np.float64).reshape(-1, 5)
+
+    def _run(self):
+        nan = (float("nan"), float("nan"))
+        while not self._stop.is_set():
+            captured = self.grabber.read(timeout=0.5)
+            if captured is None:
+                if self.grabber.finished:
+                    return
+                continue
+            landmarks = self.face_mesh.process(self.preprocessor.rgb(captured.image))
+            self.frames += 1
+            if landmarks is not None:
+                iris = gaze_feature(landmarks, "iris") if len(landmarks) > IRIS_LANDMARK else nan
+                self.samples.append((captured.timestamp, *iris, *gaze_feature(landmarks, "eyes")))
+                self.grabber.mark_done(captured)
+
+
+class CalibrationRoutine:
+    """
+    Full-screen Tk routine: shows each target for settle + dwell seconds, then fits and
+    saves the calibration. exit_code is 0 once a calibration was saved.
+    """
+
+    def __init__(self, root, sampler, path, points=CALIBRATION_POINTS, model="poly2", settle=SETTLE_S,
+                 dwell=DWELL_S, seed=None):
+        self.root = root
+        self.root.attributes("-fullscreen", True)
+        self.root.bind("<Escape>", lambda e: self.finish(cancelled=True))
+        import tkinter as tk
+        self.canvas = tk.Canvas(root, bg="black", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.screen = (root.winfo_screenwidth(), root.winfo_screenheight())
+        self.sampler = sampler
+        self.path = path
+        self.model = model
+        self.settle = settle
+        self.dwell = dwell
+        # Shuffled so the next target's position cannot be anticipated
+        grid = targets(points)
+        self.targets = grid[np.random.default_rng(seed).permutation(len(grid))]
+        self.windows = []
+        self.index = 0
+        self.calibration = None
+        self.exit_code = 1
+        self.done = False
+        self.canvas.create_text(self.screen[0] // 2, self.screen[1] // 2, fill="white", font=("Arial", 24),
+                                text="Keep your head still and look at each dot until it disappears.",
+                                tags="message")
+        self.root.after(2500, self.next_target)
+
+    def next_target(self):
+        if self.done:
+            return
+        self.canvas.delete("message", "target")
+        if self.index == len(self.targets):
+            self.finish()
+            return
+        x = self.targets[self.index][0] * self.screen[0]
+        y = self.targets[self.index][1] * self.screen[1]
+        r = TARGET_RADIUS
+        self.canvas.create_oval(x - r, y - r, x + r, y + r, outline="white", width=2, tags="target")
+        self.canvas.create_oval(x - 4, y - 4, x + 4, y + 4, fill="red", outline="", tags="target")
+        start = time.monotonic()  # The capture clock (FrameGrabber timestamps are time.monotonic())
+        self.windows.append((start + self.settle, start + self.settle + self.dwell))
+        self.index += 1
+        self.root.after(int((self.settle + self.dwell) * 1000), self.next_target)
+
+    def finish(self, cancelled=False):
+        if self.done:
+            return
+        self.done = True
+        samples = self.sampler.stop()
+        self.canvas.delete("message", "target")
+        if cancelled:
+            message = "Calibration cancelled."
+        else:
+            self.calibration = fit_samples(samples, self.windows, self.targets[:len(self.windows)],
+                                           self.model, self.screen)
+            if self.calibration is None:
+                message = "Calibration failed: the face was not visible long enough or the fit was unusable. Please try again."
+            else:
+                save_calibration(self.calibration, self.path)
+                self.exit_code = 0
+                feature = "iris" if "iris" in self.calibration.mappings else "eyes"
+                message = f"Calibration saved (error {self.calibration.error_px(feature):.0f} px)."
+                print(f">>> Calibration saved to {self.path} from {len(samples)} samples: "
+                      f"{self.calibration.describe()}")
+        print(f">>> {message}")
+        self.canvas.create_text(self.screen[0] // 2, self.screen[1] // 2, fill="white", font=("Arial", 24),
+                                text=message, tags="message")
+        self.root.after(2000, self.root.destroy)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="On-screen gaze calibration for the tracking scripts.")
+    parser.add_argument("--camera", default="0", help="Camera index or video file path (default: 0).")
+    parser.add_argument("--patient-id", type=int, default=None,
+                        help="Save as this patient's calibration (set by server.py).")
+    parser.add_argument("--output", default=None, metavar="PATH",
+                        help="Calibration file (default: the patient's file in $CEREBLAID_CALIBRATION_DIR).")
+    parser.add_argument("--points", type=int, default=CALIBRATION_POINTS,
+                        help="Number of targets (rounded down to a square grid).")
+    parser.add_argument("--model", choices=MODELS, default="poly2", help="Screen mapping to fit.")
+    parser.add_argument("--settle", type=float, default=SETTLE_S, help="Seconds before a target is sampled.")
+    parser.add_argument("--dwell", type=float, default=DWELL_S, help="Seconds each target is sampled for.")
+    parser.add_argument("--tracker", choices=["auto", "shared", "local"], default="auto",
+                        help="Where landmarks come from: 'shared' attaches to the trackerd.py daemon (waiting "
+                             "for it to start), 'local' opens the camera and runs FaceMesh here, 'auto' uses "
+                             "the daemon if it is running and local otherwise.")
+    parser.add_argument("--tracker-wait", type=float, default=30.0,
+                        help="Seconds to wait for the daemon with --tracker shared.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    shared = None
+    if args.tracker != "local":
+        from trackerd import open_shared
+        shared = open_shared(wait=args.tracker_wait if args.tracker == "shared" else 0.0)
+        if shared is None and args.tracker == "shared":
+            print("!!! ERROR: Tracker daemon is not running.")
+            return 1
+    if shared is not None:
+        grabber, face_mesh = shared
+    else:
+        import mediapipe as mp
+        from capture import FrameGrabber
+        from facemesh import RoiFaceMesh
+        grabber = FrameGrabber(args.camera)
+        face_mesh = RoiFaceMesh(mp.solutions.face_mesh.FaceMesh(refine_landmarks=True))
+    if not grabber.open():
+        print("!!! ERROR: Could not open webcam.")
+        return 1
+
+    import tkinter as tk
+    path = Path(args.output) if args.output else user_path(args.patient_id)
+    root = tk.Tk()
+    routine = CalibrationRoutine(root, FeatureSampler(grabber, face_mesh).start(), path, args.points,
+                                 args.model, args.settle, args.dwell)
+    root.mainloop()
+    face_mesh.close()
+    return routine.exit_code
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+# capture.py
+
+import threading
+import time
+from collections import deque, namedtuple
+
+# image: the BGR frame, timestamp: time.monotonic() right after capture, index: capture sequence number
+Frame = namedtuple("Frame", ["image", "timestamp", "index"])
+
+
+def _call_until_none(func):
+    # iter(func, None) would compare numpy frames with ==, so stop on identity instead
+    while True:
+        image = func()
+        if image is None:
+            return
+        yield image
+
+
+class FrameGrabber:
+    """
+    Reads frames on a background thread so inference always works on fresh frames.
+
+    source can be a camera index, a video file path, a callable returning the next
+    frame (None when exhausted) or any iterable of frames (e.g. a synthetic generator).
+
+    With drop_stale=True (cameras) the buffer keeps the newest buffer_size frames and
+    read() returns the newest one, dropping anything older. With drop_stale=False (file
+    replay) the buffer is a bounded FIFO and capture waits for the consumer instead.
+    """
+
+    def __init__(self, source=0, buffer_size=1, drop_stale=True, width=None, height=None,
+                 fps=None, realtime=False, latency_window=300):
+        self.source = source
+        self.drop_stale = drop_stale
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.realtime = realtime  # Pace file/generator sources at fps instead of max speed
+        self._buffer = deque(maxlen=max(1, buffer_size))
+        self._cond = threading.Condition()
+        self._cap = None
+        self._iter = None
+        self._thread = None
+        self.running = False
+        self.eof = False
+        self.captured = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.latency = deque(maxlen=latency_window)
+
+    # --- Source handling ---
+    def open(self):
+        """Open the underlying source. Returns False if it cannot be opened."""
+        if self._cap is not None or self._iter is not None:
+            return True
+        source = self.source
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        if isinstance(source, (int, str)):
+            import cv2
+            self._cap = cv2.VideoCapture(source)
+            if not self._cap.isOpened():
+                self._cap = None
+                return False
+            if isinstance(source, int):
+                # Keep the driver queue short; the grabber thread does the buffering
+                self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            if self.width:
+                self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            if self.height:
+                self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            if self.fps:
+                self._cap.set(cv2.CAP_PROP_FPS, self.fps)
+            elif self.realtime:
+                self.fps = self._cap.get(cv2.CAP_PROP_FPS) or None
+        elif callable(source):
+            self._iter = _call_until_none(source)
+        else:
+            self._iter = iter(source)
+        return True
+
+    def _read_source(self):
+        if self._cap is not None:
+            return self._cap.read()
+        try:
+            return True, next(self._iter)
+        except StopIteration:
+            return False, None
+
+    # --- Thread lifecycle ---
+    def start(self):
+        """Open the source and start the capture thread."""
+        if self.running:
+            return self
+        if not self.open():
+            raise RuntimeError(f"Could not open video source {self.source!r}")
+        self.running = True
+        self.eof = False
+        self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """Stop the capture thread and release the source."""
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self._iter = None
+
+    release = stop
+
+    def _run(self):
+        interval = 1.0 / self.fps if self.realtime and self.fps else 0.0
+        next_due = time.monotonic()
+        while self.running:
+            ok, image = self._read_source()
+            timestamp = time.monotonic()
+            if not ok or image is None:
+                break
+            with self._cond:
+                if self.drop_stale:
+                    if len(self._buffer) == self._buffer.maxlen:
+                        self.dropped += 1
+                else:
+                    self._cond.wait_for(lambda: len(self._buffer) < self._buffer.maxlen or not self.running)
+                    if not self.running:
+                        break
+                self._buffer.append(Frame(image, timestamp, self.captured))
+                self.captured += 1
+                self._cond.notify_all()
+            if interval:
+                next_due += interval
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_due = time.monotonic()
+        with self._cond:
+            self.eof = True
+            self._cond.notify_all()
+
+    # --- Consumer side ---
+    def read(self, timeout=None):
+        """
+        Return the next Frame, or None if none arrived within timeout (timeout=0 polls).
+        Once the source is exhausted and the buffer drained, eof is True and read returns None.
+        """
+        with self._cond:
+            if not self._buffer and timeout != 0:
+                self._cond.wait_for(lambda: self._buffer or self.eof or not self.running, timeout)
+            if not self._buffer:
+                return None
+            if self.drop_stale:
+                frame = self._buffer.pop()
+                self.dropped += len(self._buffer)
+                self._buffer.clear()
+            else:
+                frame = self._buffer.popleft()
+            self.delivered += 1
+            self._cond.notify_all()
+            return frame
+
+    @property
+    def finished(self):
+        """True once the source is exhausted and every buffered frame was read."""
+        with self._cond:
+            return self.eof and not self._buffer
+
+    def mark_done(self, frame, now=None):
+        """Record capture-to-decision latency for a frame whose result was acted on."""
+        now = time.monotonic() if now is None else now
+        self.latency.append(now - frame.timestamp)
+
+    def stats(self):
+        """Capture counters plus capture-to-decision latency percentiles in milliseconds."""
+        with self._cond:
+            samples = sorted(self.latency)
+            stats = {
+                "captured": self.captured,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+            }
+        if samples:
+            n = len(samples)
+            stats["latency_ms_p50"] = samples[n // 2] * 1000
+            stats["latency_ms_p95"] = samples[min(n - 1, int(n * 0.95))] * 1000
+            stats["latency_ms_max"] = samples[-1] * 1000
+        return stats
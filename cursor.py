@@ -0,0 +1,155 @@
+# cursor.py
+
+import threading
+import time
+
+
+# --- Backends ---
+class NullBackend:
+    """Backend that discards every cursor action (headless runs, benchmarks)."""
+
+    def size(self):
+        return 1920, 1080
+
+    def move(self, x, y):
+        pass
+
+    def click(self, button='left'):
+        pass
+
+
+class RecordingBackend(NullBackend):
+    """Backend that keeps a timestamped log of every action it receives."""
+
+    def __init__(self):
+        self.actions = []
+
+    def move(self, x, y):
+        self.actions.append((time.monotonic(), 'move', x, y))
+
+    def click(self, button='left'):
+        self.actions.append((time.monotonic(), 'click', button, None))
+
+
+class PyAutoGUIBackend:
+    """Backend that drives the real OS cursor through pyautogui."""
+
+    def __init__(self):
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    def size(self):
+        return self._pyautogui.size()
+
+    def move(self, x, y):
+        # _pause=False skips pyautogui's global PAUSE sleep; pacing is done by the dispatcher
+        self._pyautogui.moveTo(x, y, _pause=False)
+
+    def click(self, button='left'):
+        self._pyautogui.click(button=button, _pause=False)
+
+
+# --- Dispatcher ---
+class CursorDispatcher:
+    """
+    Sends cursor actions to a backend from a dedicated thread.
+
+    move_to() only records the latest target and returns immediately. Targets that
+    arrive faster than rate_hz overwrite each other (coalesced), so the backend sees
+    at most one move per refresh interval. Clicks are never coalesced and are sent
+    after any pending move.
+    """
+
+    def __init__(self, backend, rate_hz=60.0):
+        self.backend = backend
+        self.interval = 1.0 / rate_hz if rate_hz > 0 else 0.0
+        self._cond = threading.Condition()
+        self._pending_move = None
+        self._pending_clicks = []
+        self._running = False
+        self._thread = None
+        self.dispatched = 0
+        self.coalesced = 0
+        self.clicks = 0
+        self.errors = 0
+
+    def start(self):
+        """Start the dispatcher thread (no-op if already running)."""
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="cursor-dispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """Flush pending actions and stop the dispatcher thread."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def move_to(self, x, y):
+        """Set the latest cursor target. Never blocks on the backend."""
+        with self._cond:
+            if self._pending_move is not None:
+                self.coalesced += 1
+            self._pending_move = (x, y)
+            self._cond.notify()
+
+    def click(self, button='left'):
+        """Queue a click at the current cursor position."""
+        with self._cond:
+            self._pending_clicks.append(button)
+            self._cond.notify()
+
+    def stats(self):
+        """Return dispatched vs. coalesced move counts."""
+        with self._cond:
+            return {
+                "dispatched": self.dispatched,
+                "coalesced": self.coalesced,
+                "clicks": self.clicks,
+                "errors": self.errors,
+            }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        next_slot = 0.0
+        while True:
+            with self._cond:
+                while self._running and self._pending_move is None and not self._pending_clicks:
+                    self._cond.wait()
+                if not self._running and self._pending_move is None and not self._pending_clicks:
+                    return
+                # Rate limit: let further targets coalesce until the next refresh slot
+                delay = next_slot - time.monotonic()
+                if delay > 0 and self._running:
+                    self._cond.wait(delay)
+                    continue
+                move, self._pending_move = self._pending_move, None
+                clicks, self._pending_clicks = self._pending_clicks, []
+
+            try:
+                if move is not None:
+                    self.backend.move(*move)
+                for button in clicks:
+                    self.backend.click(button)
+            except Exception as e:
+                # A backend failure (e.g. pyautogui's fail-safe corner) must not kill the thread
+                self.errors += 1
+                print(f"!!! Cursor backend error: {e}")
+
+            with self._cond:
+                if move is not None:
+                    self.dispatched += 1
+                self.clicks += len(clicks)
+            next_slot = time.monotonic() + self.interval
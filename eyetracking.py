@@ -1,57 +1,322 @@
 print(">>> Script started")
 
-import cv2
-cap = cv2.VideoCapture(0)
-if not cap.isOpened():
-    print("!!! ERROR: Could not open webcam.")
-    exit()
-
-print(">>> Webcam opened successfully")
-import cv2
-import mediapipe as mp
-import pyautogui
-
-cam = cv2.VideoCapture(0)
-face_mesh = mp.solutions.face_mesh.FaceMesh(refine_landmarks=True)
-screen_w, screen_h = pyautogui.size()
-
-while True:
-    _, frame = cam.read()
-    frame = cv2.flip(frame, 1)
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    output = face_mesh.process(rgb_frame)
-    landmark_points = output.multi_face_landmarks
-    frame_h, frame_w, _ = frame.shape
-
-    if landmark_points:
-        landmarks = landmark_points[0].landmark
-
-        # Move cursor
-        for id, landmark in enumerate(landmarks[474:478]):
-            x = int(landmark.x * frame_w)
-            y = int(landmark.y * frame_h)
-            cv2.circle(frame, (x, y), 3, (0, 255, 0))
-            if id == 1:
-                screen_x = screen_w * landmark.x
-                screen_y = screen_h * landmark.y
-                pyautogui.moveTo(screen_x, screen_y)
-
-        # Blink detection
-        left = [landmarks[145], landmarks[159]]
-        for landmark in left:
-            x = int(landmark.x * frame_w)
-            y = int(landmark.y * frame_h)
-            cv2.circle(frame, (x, y), 3, (0, 255, 255))
-        if (left[0].y - left[1].y) < 0.004:
-            pyautogui.click()
-            pyautogui.sleep(1)
-
-    cv2.imshow('Eye Controlled Mouse', frame)
-
-    # Check if 'q' is pressed
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-# Release the camera and close the window properly
-cam.release()
-cv2.destroyAllWindows()
+import argparse
+import json
+import signal
+import threading
+import time
+from capture import FrameGrabber
+
+STAGES = ("capture", "preprocess", "inference", "mapping", "output", "render")
+
+
+def parse_args(argv=None):
+    """Parse command line options (server.py launches this script with --headless)."""
+    parser = argparse.ArgumentParser(description="Eye-controlled mouse using MediaPipe FaceMesh.")
+    parser.add_argument('--headless', action='store_true',
+                        help="Skip all drawing and preview window calls (background service mode).")
+    parser.add_argument('--camera', default='0',
+                        help="Camera index or video file path (default: 0).")
+    parser.add_argument('--width', type=int, default=None, help="Requested capture width in pixels.")
+    parser.add_argument('--height', type=int, default=None, help="Requested capture height in pixels.")
+    parser.add_argument('--fps', type=float, default=30.0,
+                        help="Target loop rate; the loop idles instead of spinning faster (0 = unlimited).")
+    parser.add_argument('--refine-landmarks', action=argparse.BooleanOptionalAction, default=True,
+                        help="Use FaceMesh iris refinement (required for cursor control).")
+    parser.add_argument('--roi', action=argparse.BooleanOptionalAction, default=True,
+                        help="Run inference on a crop around the tracked face instead of the full frame.")
+    parser.add_argument('--roi-size', type=int, default=256,
+                        help="Side length the face crop is resized to before inference.")
+    parser.add_argument('--record', default=None, metavar='PATH',
+                        help="Record landmarks and blink events to this file "
+                             "(default: a new file in $CEREBLAID_RECORD_DIR, if set).")
+    parser.add_argument('--record-landmarks', choices=['eyes', 'all'], default='eyes',
+                        help="Record only the eye/iris landmarks the tracker uses, or the full mesh.")
+    parser.add_argument('--patient-id', type=int, default=None,
+                        help="Save a summary of the run as a session of this patient (set by server.py).")
+    parser.add_argument('--replay', default=None, metavar='PATH',
+                        help="Play a video file or .cbr recording instead of the camera (every frame, "
+                             "in order). Implies --cursor null.")
+    parser.add_argument('--realtime', action='store_true',
+                        help="Pace --replay at its recorded frame rate instead of max speed.")
+    parser.add_argument('--tracker', choices=['auto', 'shared', 'local'], default='auto',
+                        help="Where landmarks come from: 'shared' attaches to the trackerd.py daemon (waiting "
+                             "for it to start), 'local' opens the camera and runs FaceMesh here, 'auto' "
+                             "uses the daemon if it is running and local otherwise.")
+    parser.add_argument('--tracker-wait', type=float, default=30.0,
+                        help="Seconds to wait for the daemon with --tracker shared.")
+    parser.add_argument('--cursor', choices=['pyautogui', 'null'], default=None,
+                        help="Cursor backend; 'null' discards cursor actions (default: pyautogui, "
+                             "or null when replaying).")
+    parser.add_argument('--calibration', default=None, metavar='PATH',
+                        help="Screen mapping written by calibration.py (default: the patient's cached "
+                             "calibration, if any; 'none' maps the iris position to the screen directly).")
+    parser.add_argument('--gaze-events', action=argparse.BooleanOptionalAction, default=True,
+                        help="Move the cursor once per fixation (smoothed, jitter-free) instead of every frame.")
+    parser.add_argument('--dwell-click', type=float, default=None, metavar='MS',
+                        help="Also left-click when a fixation lasts this long (with --gaze-events).")
+    parser.add_argument('--adaptive', action=argparse.BooleanOptionalAction, default=True,
+                        help="Lower processing resolution, frame rate, ROI size and finally iris refinement "
+                             "while the latency budget is missed (camera with local inference only).")
+    parser.add_argument('--latency-budget', type=float, default=100.0, metavar='MS',
+                        help="Capture-to-cursor latency (90th percentile) the adaptive quality holds.")
+    parser.add_argument('--stats-json', default=None, metavar='PATH',
+                        help="Write FPS, per-stage latency percentiles and peak RSS here on exit.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # SIGTERM (sent by the server when stopping the tracker) ends the loop and runs cleanup
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    # Frames are read on a background thread; the loop always processes the newest one.
+    # Replays instead deliver every frame in order, and recordings also supply the landmarks.
+    # With the tracker daemon running, frames and landmarks both come from its shared memory.
+    source_mesh = None
+    shared = None
+    if not args.replay and args.tracker != 'local':
+        from trackerd import open_shared
+        shared = open_shared(wait=args.tracker_wait if args.tracker == 'shared' else 0.0)
+        if shared is None and args.tracker == 'shared':
+            print("!!! ERROR: Tracker daemon is not running.")
+            return 1
+    if args.replay:
+        from replay import open_replay
+        grabber, source_mesh = open_replay(args.replay, args.realtime)
+    elif shared is not None:
+        grabber, source_mesh = shared
+    else:
+        grabber = FrameGrabber(args.camera, width=args.width, height=args.height, fps=args.fps or None)
+    if not grabber.open():
+        print("!!! ERROR: Could not open webcam.")
+        return 1
+
+    if args.replay:
+        print(f">>> Replaying {args.replay}")
+    elif shared is not None:
+        print(f">>> Attached to tracker daemon in {grabber.attach_ms:.1f} ms")
+    else:
+        print(">>> Webcam opened successfully")
+    from cursor import CursorDispatcher, NullBackend, PyAutoGUIBackend
+    from blink import BlinkDetector, eye_points, BLINK, DOUBLE_BLINK, LONG_BLINK
+    from preprocess import FramePreprocessor, mirror_x
+    from telemetry import TelemetryPublisher
+    from recording import open_recorder
+    from instrumentation import StageTimer, peak_rss_bytes, report_first_frame, report_status, script_metrics
+    from calibration import IRIS_LANDMARK, gaze_feature, load_calibration
+    from gaze_events import DWELL, FIXATION_START, GazeEventBus, GazeEventDetector, event_fields
+
+    if source_mesh is not None:
+        face_mesh = source_mesh
+    else:
+        import mediapipe as mp
+        from facemesh import RoiFaceMesh
+        face_mesh = RoiFaceMesh(mp.solutions.face_mesh.FaceMesh(refine_landmarks=args.refine_landmarks),
+                                roi=args.roi, roi_size=args.roi_size)
+
+    # Adaptive quality: only where this process runs inference on a live camera (replays
+    # stay deterministic, and the tracker daemon's inference is not ours to change)
+    quality = None
+    scale = 1.0
+    refine = args.refine_landmarks
+    if args.adaptive and source_mesh is None and not args.replay:
+        from quality import QualityController, ladder
+        quality = QualityController(budget_s=args.latency_budget / 1000,
+                                    levels=ladder(args.roi_size, args.refine_landmarks))
+
+    # Cursor output runs on its own thread so a slow moveTo never stalls capture/inference
+    cursor_backend = args.cursor or ('null' if args.replay else 'pyautogui')
+    backend = PyAutoGUIBackend() if cursor_backend == 'pyautogui' else NullBackend()
+    screen_w, screen_h = backend.size()
+    cursor = CursorDispatcher(backend).start()
+
+    # Per-user screen mapping by gaze feature (the eye corners one is used when refinement is off).
+    # Replays only use a calibration when given one explicitly.
+    screen_mappings = {}
+    if args.calibration != 'none' and (args.calibration or not args.replay):
+        calibration = load_calibration(args.calibration, args.patient_id)
+        if calibration is not None:
+            screen_mappings = calibration.mappings
+            print(f">>> Using calibration: {calibration.describe((screen_w, screen_h))}")
+        else:
+            print(">>> No calibration found, mapping the iris position to the screen directly")
+
+    # Blink gestures -> mouse buttons. A double blink adds a second left click (double-click).
+    blink_detector = BlinkDetector()
+    BLINK_ACTIONS = {BLINK: 'left', DOUBLE_BLINK: 'left', LONG_BLINK: 'right'}
+
+    # Live gaze/blink samples for the web dashboard (dropped when nobody is listening)
+    telemetry = TelemetryPublisher("eyetracking.py")
+
+    # Session recording is written on its own thread; None when not recording
+    recorder = None
+    if args.record or not args.replay:  # Replays are only recorded when asked for explicitly
+        recorder = open_recorder(args.record, args.record_landmarks, "eyetracking.py")
+    if recorder is not None:
+        print(f">>> Recording session to {recorder.path}")
+
+    # Fixations/saccades from the gaze stream; the cursor, dwell clicks, telemetry and the
+    # recording subscribe to the events they need instead of handling every frame
+    detector = GazeEventDetector(dwell=args.dwell_click / 1000 if args.dwell_click else 1.0)
+    bus = GazeEventBus()
+    if args.gaze_events:
+        bus.subscribe(lambda event: cursor.move_to(screen_w * event.x, screen_h * event.y), FIXATION_START)
+        if args.dwell_click:
+            bus.subscribe(lambda event: cursor.click('left'), DWELL)
+    bus.subscribe(lambda event: telemetry.event(event.kind, **event_fields(event)))
+    if recorder is not None:
+        bus.subscribe(lambda event: recorder.event(event.kind, event.t, **event_fields(event)))
+
+    # Colour conversion reuses one buffer; the image is not flipped, landmark x is mirrored instead
+    preprocessor = FramePreprocessor()
+    draw = not args.headless
+    if draw:
+        import cv2  # Only the preview window needs OpenCV here (capture/preprocess import it themselves)
+    # Replays are paced by the grabber (--realtime) or run flat out
+    frame_interval = 1.0 / args.fps if args.fps > 0 and not args.replay else 0.0
+    # Per-stage timings cost a perf_counter call per stage; only collected for --stats-json
+    # (exact samples) or when launched by the server (histograms for its /metrics)
+    metrics = script_metrics("eyetracking.py")
+    timer = StageTimer(STAGES, enabled=args.stats_json is not None or metrics.enabled, metrics=metrics,
+                       keep_samples=args.stats_json is not None, script="eyetracking.py")
+    quality_gauge = metrics.gauge("cereblaid_tracker_quality_level", "Adaptive quality level (0 = full).",
+                                  script="eyetracking.py")
+    print(f">>> Running {'headless' if args.headless else 'with preview'}, "
+          f"target {args.fps or 'unlimited'} fps, refine_landmarks={args.refine_landmarks}")
+
+    # Session summary (saved for --patient-id)
+    session_start = time.time()
+    frames = face_frames = blinks = 0
+
+    grabber.start()
+    try:
+        while not stop_event.is_set():
+            loop_start = time.monotonic()
+            timer.start()
+            captured = grabber.read(timeout=1.0)
+            if captured is None:
+                if grabber.finished:
+                    if args.replay:
+                        print(">>> Replay finished")
+                    else:
+                        print("!!! ERROR: Camera stopped delivering frames.")
+                    break
+                continue
+            timer.lap("capture")
+            if quality is not None and quality.skip_frame():
+                continue  # Dropped by the quality level; the next frame is processed instead
+            rgb_frame = preprocessor.rgb(captured.image, scale=scale)
+            # Landmarks are normalised, so pixel geometry uses the camera frame whatever the scale
+            frame_h, frame_w = captured.image.shape[:2]
+            timer.lap("preprocess")
+            landmarks = face_mesh.process(rgb_frame)
+            timer.lap("inference")
+            frames += 1
+            if frames == 1:
+                report_first_frame()
+
+            gaze = None
+            gestures = ()
+            if landmarks is not None:
+                # Landmarks 468-477 are the irises; only present with refine_landmarks. Without
+                # refinement the midpoint of the inner eye corners is a coarse fallback.
+                feature = "iris" if len(landmarks) > IRIS_LANDMARK else "eyes"
+                gaze = gaze_feature(landmarks, feature)
+                mapping = screen_mappings.get(feature)
+                if mapping is not None:
+                    gaze = mapping.map_point(*gaze)  # None: beyond the calibration's horizon
+                # Blink detection (non-blocking: the refractory period is timestamp based)
+                gestures = blink_detector.update(eye_points(landmarks, frame_w, frame_h), captured.timestamp)
+                face_frames += 1
+                blinks += len(gestures)
+                events = [] if gaze is None else detector.update(captured.timestamp, *gaze)
+            else:
+                blink_detector.reset()
+                events = detector.reset(captured.timestamp)
+            timer.lap("mapping")
+
+            if gaze is not None:
+                if not args.gaze_events:
+                    cursor.move_to(screen_w * gaze[0], screen_h * gaze[1])
+                telemetry.gaze(*gaze)
+            bus.publish(events)
+            for gesture in gestures:
+                cursor.click(BLINK_ACTIONS[gesture])
+                telemetry.event("blink", gesture=gesture)
+                if recorder is not None:
+                    recorder.event("blink", captured.timestamp, gesture=gesture)
+            if recorder is not None:
+                recorder.frame(landmarks, captured.timestamp, captured.index)
+            if landmarks is not None:
+                grabber.mark_done(captured)
+            if quality is not None:
+                level = quality.update(time.monotonic() - captured.timestamp)
+                if level is not None:
+                    if level.scale != scale:
+                        face_mesh.rescale(level.scale / scale)  # The ROI box is in processed-frame pixels
+                    scale = level.scale
+                    face_mesh.set_roi_size(level.roi_size)
+                    if level.refine != refine:
+                        refine = level.refine  # Rebuilds the graph; only the last level changes this
+                        face_mesh.set_model(mp.solutions.face_mesh.FaceMesh(refine_landmarks=refine))
+                    quality_gauge.set(quality.index)
+                    report_status(quality_level=quality.index)
+            timer.lap("output")
+
+            if draw:
+                frame = preprocessor.display(captured.image)
+                if landmarks is not None:
+                    for x, y, _ in landmarks[469:473]:
+                        cv2.circle(frame, (int(mirror_x(x) * frame_w), int(y * frame_h)), 3, (0, 255, 0))
+                    for x, y, _ in landmarks[[145, 159]]:
+                        cv2.circle(frame, (int(mirror_x(x) * frame_w), int(y * frame_h)), 3, (0, 255, 255))
+                cv2.imshow('Eye Controlled Mouse', frame)
+                # Check if 'q' is pressed
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            timer.lap("render")
+            timer.frame_done()
+            if not draw and frame_interval:
+                # Headless: idle for the rest of the frame budget instead of spinning
+                stop_event.wait(max(0.0, frame_interval - (time.monotonic() - loop_start)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Release the camera and close the window properly
+        cursor.stop()
+        telemetry.close()
+        if recorder is not None:
+            recorder.close()
+            print(f">>> Recording stats: {recorder.stats()}")
+        stats = cursor.stats()
+        print(f">>> Cursor moves dispatched: {stats['dispatched']}, coalesced: {stats['coalesced']}")
+        print(f">>> Capture stats: {grabber.stats()}")
+        print(f">>> Inference stats: {face_mesh.stats()}")
+        print(f">>> Gaze events: {detector.stats()}")
+        if args.patient_id is not None:
+            from store import save_session
+            session_id = save_session(args.patient_id, "tracking", session_start, time.time() - session_start,
+                                      frames=frames, face_frames=face_frames, blinks=blinks,
+                                      recording=str(recorder.path) if recorder is not None else None)
+            if session_id is not None:
+                print(f">>> Saved session {session_id} for patient {args.patient_id}")
+        if args.stats_json:
+            stats = dict(timer.summary(), script="eyetracking.py", source=args.replay or args.camera,
+                         capture=grabber.stats(), inference=face_mesh.stats(), peak_rss_bytes=peak_rss_bytes(),
+                         gaze_events=detector.stats(),
+                         quality=quality.decisions if quality is not None else None)
+            with open(args.stats_json, "w") as f:
+                json.dump(stats, f, indent=2)
+        grabber.stop()
+        face_mesh.close()
+        if draw:
+            cv2.destroyAllWindows()
+        print(">>> Script stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+# facemesh.py
+
+import cv2
+import numpy as np
+
+
+def landmarks_to_array(face_landmarks):
+    """Convert a FaceMesh NormalizedLandmarkList to an (N, 3) float32 array of x, y, z."""
+    return np.array([(p.x, p.y, p.z) for p in face_landmarks.landmark], dtype=np.float32)
+
+
+class RoiFaceMesh:
+    """
+    Runs FaceMesh on a padded crop around the last known face instead of the whole frame.
+
+    The crop is square, resized to a fixed roi_size (so the model always sees the same
+    input shape) and only moved when the face drifts near its edge or changes scale, which
+    keeps MediaPipe's internal frame-to-frame tracking valid. When no face is found in the
+    crop the face counts as lost and the same frame is searched again at full view,
+    downscaled to search_size. Landmarks are always returned as an (N, 3) float32 array
+    normalised to the full frame, or None when no face was found.
+
+    With roi=False every frame is a full-frame search at the native resolution.
+    """
+
+    def __init__(self, face_mesh, roi=True, padding=0.6, roi_size=256, search_size=640):
+        self.face_mesh = face_mesh
+        self.roi = roi
+        self.padding = padding  # Extra crop size around the face box, as a fraction of its side
+        self.roi_size = roi_size
+        self.search_size = search_size
+        self.box = None  # Current crop (x0, y0, side) in full-frame pixels
+        self._crop = np.empty((roi_size, roi_size, 3), dtype=np.uint8)
+        self._crop_readonly = self._readonly(self._crop)
+        self._search = None
+        self._search_readonly = None
+        self.frames = 0
+        self.roi_frames = 0
+        self.full_searches = 0
+        self.reacquisitions = 0
+
+    @staticmethod
+    def _readonly(array):
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    def process(self, rgb):
+        """Run inference on an RGB frame; returns full-frame landmarks or None."""
+        self.frames += 1
+        frame_h, frame_w = rgb.shape[:2]
+        if self.roi and self.box is not None:
+            landmarks = self._process_roi(rgb, frame_w, frame_h)
+            if landmarks is not None:
+                self.roi_frames += 1
+                self._update_box(landmarks, frame_w, frame_h)
+                return landmarks
+            # Tracking lost: fall through to a full-frame search on this same frame
+            self.reacquisitions += 1
+            self.box = None
+
+        self.full_searches += 1
+        landmarks = self._process_full(rgb, frame_w, frame_h)
+        if landmarks is not None and self.roi:
+            self._update_box(landmarks, frame_w, frame_h)
+        return landmarks
+
+    def _process_full(self, rgb, frame_w, frame_h):
+        scale = self.search_size / max(frame_w, frame_h) if self.roi else 1.0
+        if scale < 1.0:
+            size = (int(frame_w * scale), int(frame_h * scale))
+            if self._search is None or self._search.shape[:2] != (size[1], size[0]):
+                self._search = np.empty((size[1], size[0], 3), dtype=np.uint8)
+                self._search_readonly = self._readonly(self._search)
+            cv2.resize(rgb, size, dst=self._search, interpolation=cv2.INTER_AREA)
+            image = self._search_readonly
+        else:
+            image = rgb
+        results = self.face_mesh.process(image)
+        if not results.multi_face_landmarks:
+            return None
+        # Normalised coordinates are resolution independent, so no remapping is needed
+        return landmarks_to_array(results.multi_face_landmarks[0])
+
+    def _process_roi(self, rgb, frame_w, frame_h):
+        # The box comes from an earlier frame, which may have had another size: keep it
+        # inside this one, and search the full frame when the crop would be cut short
+        x0, y0, side = self.box
+        x0 = max(0, min(x0, frame_w - side))
+        y0 = max(0, min(y0, frame_h - side))
+        crop = rgb[y0:y0 + side, x0:x0 + side]
+        if crop.shape[0] < side or crop.shape[1] < side:
+            return None
+        self.box = (x0, y0, side)
+        cv2.resize(crop, (self.roi_size, self.roi_size), dst=self._crop, interpolation=cv2.INTER_AREA)
+        results = self.face_mesh.process(self._crop_readonly)
+        if not results.multi_face_landmarks:
+            return None
+        landmarks = landmarks_to_array(results.multi_face_landmarks[0])
+        # Crop-normalised -> full-frame-normalised (z shares x's scale in FaceMesh)
+        landmarks[:, 0] = (x0 + landmarks[:, 0] * side) / frame_w
+        landmarks[:, 1] = (y0 + landmarks[:, 1] * side) / frame_h
+        landmarks[:, 2] *= side / frame_w
+        return landmarks
+
+    def _update_box(self, landmarks, frame_w, frame_h):
+        xs = landmarks[:, 0] * frame_w
+        ys = landmarks[:, 1] * frame_h
+        fx0, fx1, fy0, fy1 = xs.min(), xs.max(), ys.min(), ys.max()
+        face_side = max(fx1 - fx0, fy1 - fy0)
+        side = int(face_side * (1.0 + 2 * self.padding))
+        if side >= min(frame_w, frame_h):
+            self.box = None  # Face fills the frame; cropping would not help
+            return
+
+        if self.box is not None:
+            x0, y0, old_side = self.box
+            margin = old_side * 0.1
+            inside = (fx0 - x0 > margin and x0 + old_side - fx1 > margin and
+                      fy0 - y0 > margin and y0 + old_side - fy1 > margin)
+            if inside and 0.7 < side / old_side < 1.4:
+                return  # Keep the crop stable while the face stays well inside it
+
+        cx, cy = (fx0 + fx1) / 2, (fy0 + fy1) / 2
+        x0 = int(min(max(cx - side / 2, 0), frame_w - side))
+        y0 = int(min(max(cy - side / 2, 0), frame_h - side))
+        self.box = (x0, y0, side)
+
+    def set_roi_size(self, roi_size):
+        """Change the crop side used for inference from the next frame on."""
+        if roi_size != self.roi_size:
+            self.roi_size = roi_size
+            self._crop = np.empty((roi_size, roi_size, 3), dtype=np.uint8)
+            self._crop_readonly = self._readonly(self._crop)
+
+    def rescale(self, factor):
+        """Follow a change of the input frame size (new / old side) so the crop stays on the face."""
+        if self.box is not None and factor != 1.0:
+            x0, y0, side = self.box
+            self.box = (int(x0 * factor), int(y0 * factor), max(1, int(side * factor)))
+
+    def set_model(self, face_mesh):
+        """Swap in another FaceMesh (e.g. with different options); the face is searched for again."""
+        self.face_mesh.close()
+        self.face_mesh = face_mesh
+        self.box = None
+
+    def stats(self):
+        """Counts of ROI vs. full-frame inference and how often the face had to be re-acquired."""
+        return {
+            "frames": self.frames,
+            "roi_frames": self.roi_frames,
+            "full_searches": self.full_searches,
+            "reacquisitions": self.reacquisitions,
+            "reacquire_rate": self.reacquisitions / self.frames if self.frames else 0.0,
+        }
+
+    def close(self):
+        self.face_mesh.close()
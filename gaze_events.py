@@ -0,0 +1,209 @@
+# gaze_events.py
+"""
+Online gaze events: turns the per-frame gaze position into fixations and saccades.
+
+GazeEventDetector smooths each sample with a One-Euro filter, then classifies it in
+constant time. The velocity test (I-VT) compares the newest sample with the one
+velocity_span samples back in a fixed-size ring buffer. The dispersion test (I-DT) keeps
+running sums of the current fixation, so a sample only has to be compared with their
+centroid. The detector returns events instead of samples:
+
+- fixation_start: gaze stayed within dispersion of one point for min_fixation seconds
+- dwell:          the same fixation lasted dwell seconds (once per fixation: dwell-select)
+- fixation_end:   the fixation was left (saccade, drift out of the radius, face lost)
+- saccade:        gaze speed went over velocity_threshold (once per movement)
+
+Consumers subscribe to the kinds they need on a GazeEventBus, so the cursor, the grid
+game and telemetry run once per event instead of once per frame. Positions are in the
+caller's gaze units: normalised screen coordinates once a calibration is loaded (see
+calibration.py), normalised camera coordinates otherwise.
+"""
+
+import math
+from collections import namedtuple
+
+# --- Event kinds emitted by GazeEventDetector.update ---
+FIXATION_START = "fixation_start"
+FIXATION_END = "fixation_end"
+DWELL = "dwell"
+SACCADE = "saccade"
+EVENT_KINDS = (FIXATION_START, FIXATION_END, DWELL, SACCADE)
+
+# x, y: fixation centroid (saccade: the smoothed sample where it started), duration: of
+# the fixation up to t (0 for saccades)
+GazeEvent = namedtuple("GazeEvent", ["kind", "t", "x", "y", "duration"])
+
+
+def event_fields(event):
+    """Telemetry/recording fields of an event (rounded like telemetry gaze samples)."""
+    return {"x": round(float(event.x), 4), "y": round(float(event.y), 4), "duration": round(event.duration, 3)}
+
+
+class OneEuroFilter:
+    """
+    One-Euro filter for 2-D samples (Casiez et al., CHI 2012): a low-pass filter whose
+    cutoff rises with speed, so a still gaze is smoothed hard and a saccade is not delayed.
+    min_cutoff (Hz) sets the smoothing at rest, beta how fast the cutoff follows speed.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=10.0, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.t = None
+        self.x = self.y = 0.0
+        self.dx = self.dy = 0.0
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, t, x, y):
+        if self.t is None or t <= self.t:
+            self.t, self.x, self.y = t, x, y
+            return x, y
+        dt = t - self.t
+        a = self._alpha(self.d_cutoff, dt)
+        self.dx += a * ((x - self.x) / dt - self.dx)
+        self.dy += a * ((y - self.y) / dt - self.dy)
+        a = self._alpha(self.min_cutoff + self.beta * math.hypot(self.dx, self.dy), dt)
+        self.x += a * (x - self.x)
+        self.y += a * (y - self.y)
+        self.t = t
+        return self.x, self.y
+
+
+class GazeEventDetector:
+    """
+    Streaming I-VT + I-DT fixation/saccade classifier with constant cost per sample.
+
+    Feed it every gaze sample with update(t, x, y); it returns the events that sample
+    completed (usually none). Call reset(t) when the face is lost: an open fixation ends.
+    velocity_threshold is in gaze units per second, dispersion in gaze units. The velocity
+    is measured over velocity_span samples: longer spans tolerate more jitter but report
+    fixations later.
+    """
+
+    def __init__(self, velocity_threshold=1.0, dispersion=0.04, min_fixation=0.1, dwell=1.0,
+                 velocity_span=1, smoothing=True):
+        self.velocity_threshold = velocity_threshold
+        self.dispersion = dispersion
+        self.min_fixation = min_fixation
+        self.dwell = dwell
+        self.velocity_span = velocity_span
+        self.filter = OneEuroFilter() if smoothing else None
+        # Ring buffer of the last velocity_span + 1 smoothed samples
+        self._size = velocity_span + 1
+        self._t = [0.0] * self._size
+        self._x = [0.0] * self._size
+        self._y = [0.0] * self._size
+        self.samples = 0
+        self.events = 0
+        self.reset()
+
+    def reset(self, t=None):
+        """Forget the gaze history; returns the fixation_end of an open fixation (if any)."""
+        events = []
+        if t is not None and self.fixating:
+            events.append(self._end(t))
+        if self.filter is not None:
+            self.filter.reset()
+        self._filled = 0
+        self._head = -1
+        self._start = None  # Fixation (candidate) start time; None while moving
+        self._sx = self._sy = 0.0
+        self._n = 0
+        self._last_t = None
+        self.fixating = False
+        self._dwelt = False
+        self._moving = False
+        self.velocity = 0.0
+        self.events += len(events)
+        return events
+
+    @property
+    def centroid(self):
+        return (self._sx / self._n, self._sy / self._n) if self._n else None
+
+    def _end(self, t):
+        x, y = self.centroid
+        self.fixating = False
+        return GazeEvent(FIXATION_END, t, x, y, self._last_t - self._start)
+
+    def update(self, t, x, y):
+        """Classify one sample; returns a (usually empty) list of GazeEvents."""
+        if self.filter is not None:
+            x, y = self.filter(t, x, y)
+        self.samples += 1
+        size = self._size
+        head = self._head = (self._head + 1) % size
+        self._t[head], self._x[head], self._y[head] = t, x, y
+        if self._filled < size:
+            self._filled += 1
+        events = []
+
+        # I-VT: speed over the last velocity_span samples
+        if self._filled == size:
+            tail = (head + 1) % size
+            dt = t - self._t[tail]
+            self.velocity = math.hypot(x - self._x[tail], y - self._y[tail]) / dt if dt > 0 else 0.0
+        if self.velocity > self.velocity_threshold:
+            if self.fixating:
+                events.append(self._end(t))
+            if not self._moving:
+                events.append(GazeEvent(SACCADE, t, x, y, 0.0))
+                self._moving = True
+            self._start = None
+            self._n = 0
+            self.events += len(events)
+            return events
+        self._moving = False
+
+        # I-DT: the sample extends the current fixation if it lies within dispersion of its centroid
+        if self._n and math.hypot(x - self._sx / self._n, y - self._sy / self._n) <= self.dispersion:
+            self._sx += x
+            self._sy += y
+            self._n += 1
+        else:
+            if self.fixating:
+                events.append(self._end(t))
+            self._start = t
+            self._sx, self._sy, self._n = x, y, 1
+            self._dwelt = False
+        self._last_t = t
+
+        held = t - self._start
+        if not self.fixating and held >= self.min_fixation:
+            self.fixating = True
+            events.append(GazeEvent(FIXATION_START, t, *self.centroid, held))
+        if self.fixating and not self._dwelt and held >= self.dwell:
+            self._dwelt = True
+            events.append(GazeEvent(DWELL, t, *self.centroid, held))
+        self.events += len(events)
+        return events
+
+    def stats(self):
+        return {"samples": self.samples, "events": self.events,
+                "events_per_sample": self.events / self.samples if self.samples else 0.0}
+
+
+class GazeEventBus:
+    """Calls the subscribers of each event's kind (subscribers without kinds get every event)."""
+
+    def __init__(self):
+        self._subscribers = {kind: [] for kind in EVENT_KINDS}
+
+    def subscribe(self, callback, *kinds):
+        for kind in kinds or EVENT_KINDS:
+            self._subscribers[kind].append(callback)
+        return callback
+
+    def publish(self, events, *args):
+        """Dispatch events in order; extra args (e.g. the captured frame) are passed to every callback."""
+        for event in events:
+            for callback in self._subscribers[event.kind]:
+                callback(event, *args)
@@ -0,0 +1,52 @@
+# gunicorn.conf.py
+"""
+Production settings for server.py:
+
+    gunicorn -c gunicorn.conf.py server:app
+
+Workers share everything that has to be consistent between them: users, patients and
+sessions results live in the SQLite database (CEREBLAID_DB), session cookies are signed
+with a key every worker loads from the same file (or FLASK_SECRET_KEY), and launched
+scripts are found through the supervisor's PID files in CEREBLAID_RUN_DIR. Any request
+can therefore go to any worker.
+
+Tuning is done through environment variables: CEREBLAID_BIND (or PORT),
+CEREBLAID_WORKERS, CEREBLAID_THREADS and CEREBLAID_SSE_MAX_STREAMS.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("CEREBLAID_BIND", f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+
+# One process per core for the CPU-bound part of a request (JSON, templates, password
+# hashing); threads cover the time requests spend waiting on SQLite or a held-open
+# stream. Each live telemetry or log stream occupies one thread while it is open, so
+# server.py allows at most CEREBLAID_SSE_MAX_STREAMS of them per worker (default: half
+# the threads) and ends each after a few minutes; the browser then reconnects.
+workers = int(os.environ.get("CEREBLAID_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("CEREBLAID_THREADS", 8))
+
+# Import server.py (schema check, demo users, secret key) once in the master, then fork.
+# The app holds no database connection, socket or thread at import time, so forking is safe.
+preload_app = True
+
+# gthread workers heartbeat from their main loop, so long-lived streams do not trip this
+timeout = 30
+graceful_timeout = 10
+keepalive = 5
+
+# Workers are not recycled (no max_requests): a worker owns the stdout/stderr pipes of
+# the scripts it launched, and replacing it would cut those scripts off from their logs.
+max_requests = 0
+
+accesslog = os.environ.get("CEREBLAID_ACCESS_LOG")  # e.g. "-" for stdout
+loglevel = os.environ.get("CEREBLAID_LOG_LEVEL", "info")
+
+
+def worker_exit(server, worker):
+    """Remove this worker's telemetry socket so trackers stop sending to it."""
+    import server as cereblaid
+
+    cereblaid.telemetry_hub.close()
@@ -1,15 +1,32 @@
-import cv2
-import mediapipe as mp
+import argparse
+import json
+import queue
+import threading
 import tkinter as tk
 from tkinter import messagebox
 from PIL import Image, ImageTk
 import random
 import time
-
-# Mediapipe setup
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1, min_detection_confidence=0.5,
-                                  min_tracking_confidence=0.5)
+from capture import FrameGrabber
+from preprocess import FramePreprocessor
+from telemetry import TelemetryPublisher
+from recording import open_recorder
+from instrumentation import StageTimer, report_first_frame, script_metrics
+from calibration import gaze_feature, load_calibration
+from gaze_events import FIXATION_START, GazeEventBus, GazeEventDetector, event_fields
+
+# Landmark source used by the inference worker: the tracker daemon's landmarks
+# (SharedFaceMesh), a recording's (RecordedFaceMesh) or local_face_mesh(). Set in __main__
+# (or by replay.py) before the game starts.
+face_mesh = None
+
+
+def local_face_mesh():
+    """Mediapipe FaceMesh in this process (inference runs on a crop around the tracked face, see RoiFaceMesh)."""
+    import mediapipe as mp
+    from facemesh import RoiFaceMesh
+    return RoiFaceMesh(mp.solutions.face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1, refine_landmarks=True,
+                                                       min_detection_confidence=0.5, min_tracking_confidence=0.5))
 
 # Game settings
 GRID_SIZE = 5  # 5x5 grid
@@ -17,15 +34,161 @@ TARGET_COLOR = "red"
 BACKGROUND_COLOR = "white"
 HIGHLIGHT_COLOR = "blue"
 TOTAL_TARGETS = 5  # Total number of targets to hit before ending the game
+PREVIEW_SIZE = (300, 300)  # Floating camera window size
+UI_FPS = 60  # Tk update rate, independent of camera/inference rate
+PREVIEW_FPS = 15  # Camera preview refresh rate (0 = no preview window)
+WORKER_STAGES = ("capture", "preprocess", "inference", "mapping", "output", "render")
+
+class GridRenderer:
+    """Retained-mode grid: one canvas rectangle per cell, recoloured with itemconfig."""
+
+    def __init__(self, canvas, grid_size, cell_width, cell_height):
+        self.canvas = canvas
+        self.items = {}
+        self.fills = {}
+        for row in range(grid_size):
+            for col in range(grid_size):
+                x0 = col * cell_width
+                y0 = row * cell_height
+                x1 = x0 + cell_width
+                y1 = y0 + cell_height
+                self.items[(row, col)] = canvas.create_rectangle(
+                    x0, y0, x1, y1, fill=BACKGROUND_COLOR, outline="black", tags=f"cell-{row}-{col}")
+                self.fills[(row, col)] = BACKGROUND_COLOR
+
+    def set_fill(self, cell, fill):
+        """Recolour a cell; a no-op (no Tk call) if it already has that colour."""
+        if self.fills[cell] != fill:
+            self.canvas.itemconfig(self.items[cell], fill=fill)
+            self.fills[cell] = fill
+
+    def item_count(self):
+        """Number of items on the canvas (stays at grid_size**2 for the whole session)."""
+        return len(self.canvas.find_all())
+
+
+class InferenceWorker:
+    """
+    Runs preprocessing, FaceMesh, gaze-to-cell mapping and fixation detection off the Tk thread.
+
+    Results are posted to a bounded queue as ("fixation", frame, (row, col)), ("preview",
+    image) and ("eof", None) messages; when the UI falls behind the oldest message is
+    dropped. Only fixation starts reach the game: a steady look at a cell is one attempt,
+    however many frames it lasts. mapping is the user's calibrated ScreenMapping for the
+    eye corners (None: direct mapping).
+    """
+
+    def __init__(self, grabber, grid_size, preview_fps=PREVIEW_FPS, queue_size=32, recorder=None,
+                 timer=None, mapping=None):
+        self.grabber = grabber
+        self.mapping = mapping
+        self.recorder = recorder
+        self.timer = timer or StageTimer(WORKER_STAGES, enabled=False)
+        self.grid_size = grid_size
+        self.preview_interval = 1.0 / preview_fps if preview_fps > 0 else None
+        self.preprocessor = FramePreprocessor(preview_size=PREVIEW_SIZE if self.preview_interval else None)
+        self.results = queue.Queue(maxsize=queue_size)
+        self.telemetry = TelemetryPublisher("headaway.py")  # Used only from the worker thread
+        self.detector = GazeEventDetector()
+        self.bus = GazeEventBus()
+        self.bus.subscribe(self._on_fixation, FIXATION_START)
+        self.bus.subscribe(lambda event, captured: self.telemetry.event(event.kind, **event_fields(event)))
+        if recorder is not None:
+            self.bus.subscribe(lambda event, captured: recorder.event(event.kind, event.t, **event_fields(event)))
+        self._posted = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="inference-worker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        self.telemetry.close()
+
+    def _post(self, message):
+        while True:
+            try:
+                self.results.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.results.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _on_fixation(self, event, captured):
+        row, col = int(event.y * self.grid_size), int(event.x * self.grid_size)
+        if 0 <= col < self.grid_size and 0 <= row < self.grid_size:
+            self._post(("fixation", captured, (row, col)))
+            self._posted = True  # The UI marks this frame done once the cell is highlighted
+
+    def _run(self):
+        next_preview = 0.0
+        timer = self.timer
+        first_frame = True
+        while not self._stop.is_set():
+            timer.start()
+            captured = self.grabber.read(timeout=0.5)
+            if captured is None:
+                if self.grabber.finished:
+                    self._post(("eof", None))
+                    return
+                continue
+            timer.lap("capture")
+
+            # No flip: FaceMesh sees the raw frame and the gaze x coordinate is mirrored below
+            rgb_frame = self.preprocessor.rgb(captured.image)
+            timer.lap("preprocess")
+            landmarks = face_mesh.process(rgb_frame)
+            timer.lap("inference")
+            if first_frame:
+                first_frame = False
+                report_first_frame()
+
+            gaze = None
+            if landmarks is not None:
+                # Eye control logic: midpoint of the inner eye corners (362/133)
+                gaze = gaze_feature(landmarks, "eyes")
+                if self.mapping is not None:
+                    gaze = self.mapping.map_point(*gaze)  # None: beyond the calibration's horizon
+                events = [] if gaze is None else self.detector.update(captured.timestamp, *gaze)
+            else:
+                events = self.detector.reset(captured.timestamp)
+            timer.lap("mapping")
+
+            if self.recorder is not None:
+                self.recorder.frame(landmarks, captured.timestamp, captured.index)
+            if gaze is not None:
+                gaze_x, gaze_y = gaze
+                cell = [int(gaze_y * self.grid_size), int(gaze_x * self.grid_size)]
+                self.telemetry.gaze(gaze_x, gaze_y, cell=cell)
+            self._posted = False
+            self.bus.publish(events, captured)
+            if landmarks is not None and not self._posted:
+                self.grabber.mark_done(captured)
+            timer.lap("output")
+
+            # The preview has its own, lower rate; the copy is small (preview size only)
+            if self.preview_interval and captured.timestamp >= next_preview:
+                next_preview = captured.timestamp + self.preview_interval
+                self._post(("preview", self.preprocessor.preview().copy()))
+            timer.lap("render")
+            timer.frame_done()
+
 
 class EyeControlGridGame:
-    def __init__(self, root):
+    def __init__(self, root, grid_size=GRID_SIZE, camera=0, ui_fps=UI_FPS, preview_fps=PREVIEW_FPS,
+                 recorder=None, grabber=None, stats_json=None, patient_id=None, calibration=None):
         self.root = root
         self.root.attributes("-fullscreen", True)  # Full-screen mode
         self.root.bind("<Escape>", lambda e: self.quit_game())  # Exit on Esc
 
         # Game variables
-        self.grid_size = GRID_SIZE
+        self.grid_size = grid_size
         self.target_position = (0, 0)
         self.highlighted_position = None
 
@@ -33,32 +196,60 @@ class EyeControlGridGame:
         self.canvas = tk.Canvas(self.root, bg=BACKGROUND_COLOR)
         self.canvas.pack(fill=tk.BOTH, expand=True)
 
-        # Create floating camera feed
-        self.camera_window = tk.Toplevel(self.root)
-        self.camera_window.geometry("300x300+10+10")  # Small floating window
-        self.camera_window.overrideredirect(True)  # No title bar
-        self.camera_window.attributes("-topmost", True)  # Stay on top
-        self.camera_window.bind("<B1-Motion>", self.drag_window)  # Dragging feature
+        # Create floating camera feed (skipped entirely when the preview is disabled)
+        self.camera_window = None
+        if preview_fps > 0:
+            self.camera_window = tk.Toplevel(self.root)
+            self.camera_window.geometry("300x300+10+10")  # Small floating window
+            self.camera_window.overrideredirect(True)  # No title bar
+            self.camera_window.attributes("-topmost", True)  # Stay on top
+            self.camera_window.bind("<B1-Motion>", self.drag_window)  # Dragging feature
+
+            self.video_frame = tk.Label(self.camera_window)
+            self.video_frame.pack(fill=tk.BOTH, expand=True)
 
-        self.video_frame = tk.Label(self.camera_window)
-        self.video_frame.pack(fill=tk.BOTH, expand=True)
+            # Preview images are created once and updated in place
+            self.preview_image = Image.new("RGB", PREVIEW_SIZE)
+            self.preview_photo = ImageTk.PhotoImage(image=self.preview_image)
+            self.video_frame.configure(image=self.preview_photo)
 
         # Create grid and place initial target
         self.create_grid()
         self.place_target()
 
-        # Initialize camera
-        self.cap = cv2.VideoCapture(0)
+        # Initialize camera (frames are read on a background thread, newest frame wins)
+        # and run inference on its own thread; results come back through worker.results
+        # Landmark frames are recorded by the worker, game events from the Tk thread
+        self.recorder = recorder
+        # Stage timings are only collected when they will be written out (--stats-json) or
+        # exported for the server's /metrics (launched by the server)
+        self.stats_json = stats_json
+        metrics = script_metrics("headaway.py")
+        timing = stats_json is not None or metrics.enabled
+        self.ui_timer = StageTimer(["ui_tick"], enabled=timing, metrics=metrics,
+                                   keep_samples=stats_json is not None, script="headaway.py", loop="ui")
+        self.grabber = (grabber or FrameGrabber(camera)).start()
+        worker_timer = StageTimer(WORKER_STAGES, enabled=timing, metrics=metrics,
+                                  keep_samples=stats_json is not None, script="headaway.py", loop="worker")
+        mapping = calibration.mapping("eyes") if calibration is not None else None
+        self.worker = InferenceWorker(self.grabber, self.grid_size, preview_fps, recorder=recorder,
+                                      timer=worker_timer, mapping=mapping).start()
+        self.telemetry = TelemetryPublisher("headaway.py")  # Game events, Tk thread only
+        self.running = True
 
         # Create metrics label
         self.metrics_label = tk.Label(self.root, text="", font=("Arial", 14), bg="white", anchor="e")
         self.metrics_label.place(relx=0.8, rely=0.02)  # Top-right corner
 
-        # Metrics variables
+        # Metrics variables (saved as a patient session on exit when patient_id is set)
+        self.patient_id = patient_id
         self.start_time = time.time()
         self.total_attempts = 0
         self.successful_hits = 0
 
+        # UI ticks are paced against monotonic timestamps rather than a fixed after() delay
+        self.ui_interval = 1.0 / ui_fps
+        self.next_tick = time.monotonic()
         self.update_camera()
 
     def drag_window(self, event):
@@ -68,57 +259,51 @@ class EyeControlGridGame:
         self.camera_window.geometry(f"+{x}+{y}")
 
     def create_grid(self):
-        """Draw grid cells."""
+        """Create the grid cells once; later updates only recolour them."""
         self.cell_width = self.canvas.winfo_screenwidth() // self.grid_size
         self.cell_height = self.canvas.winfo_screenheight() // self.grid_size
+        self.renderer = GridRenderer(self.canvas, self.grid_size, self.cell_width, self.cell_height)
 
-        for row in range(self.grid_size):
-            for col in range(self.grid_size):
-                x0 = col * self.cell_width
-                y0 = row * self.cell_height
-                x1 = x0 + self.cell_width
-                y1 = y0 + self.cell_height
-                self.canvas.create_rectangle(x0, y0, x1, y1, outline="black", tags=f"cell-{row}-{col}")
+    def cell_fill(self, cell):
+        """Colour of a cell: the gaze highlight is drawn over the target."""
+        if cell == self.highlighted_position:
+            return HIGHLIGHT_COLOR
+        if cell == self.target_position:
+            return TARGET_COLOR
+        return BACKGROUND_COLOR
 
     def place_target(self):
         """Place target at a random position."""
+        previous = self.target_position
         row = random.randint(0, self.grid_size - 1)
         col = random.randint(0, self.grid_size - 1)
         self.target_position = (row, col)
 
-        x0 = col * self.cell_width
-        y0 = row * self.cell_height
-        x1 = x0 + self.cell_width
-        y1 = y0 + self.cell_height
-
-        self.canvas.create_rectangle(x0, y0, x1, y1, fill=TARGET_COLOR, outline="black", tags="target")
+        self.renderer.set_fill(previous, self.cell_fill(previous))
+        self.renderer.set_fill(self.target_position, self.cell_fill(self.target_position))
 
     def highlight_cell(self, row, col):
-        """Highlight a cell based on eye movement."""
-        if self.highlighted_position:
-            # Remove highlight from previous cell
-            prev_row, prev_col = self.highlighted_position
-            x0 = prev_col * self.cell_width
-            y0 = prev_row * self.cell_height
-            x1 = x0 + self.cell_width
-            y1 = y0 + self.cell_height
-            self.canvas.create_rectangle(x0, y0, x1, y1, fill=BACKGROUND_COLOR, outline="black", tags=f"cell-{prev_row}-{prev_col}")
-
-        # Highlight the new cell
-        x0 = col * self.cell_width
-        y0 = row * self.cell_height
-        x1 = x0 + self.cell_width
-        y1 = y0 + self.cell_height
-        self.canvas.create_rectangle(x0, y0, x1, y1, fill=HIGHLIGHT_COLOR, outline="black", tags=f"cell-{row}-{col}")
+        """Highlight the cell of a new fixation; every fixation is one attempt."""
+        previous = self.highlighted_position
         self.highlighted_position = (row, col)
+        if previous != self.highlighted_position:
+            # Only the two cells whose state changed are touched
+            if previous:
+                self.renderer.set_fill(previous, self.cell_fill(previous))
+            self.renderer.set_fill(self.highlighted_position, HIGHLIGHT_COLOR)
 
         # Check if the highlighted cell matches the target
         self.total_attempts += 1
         if (row, col) == self.target_position:
             self.successful_hits += 1
-            self.canvas.delete("target")
+            self.telemetry.event("hit", cell=[row, col], hits=self.successful_hits,
+                                 attempts=self.total_attempts)
+            if self.recorder is not None:
+                self.recorder.event("hit", cell=[row, col], hits=self.successful_hits,
+                                    attempts=self.total_attempts)
             if self.successful_hits >= TOTAL_TARGETS:
                 self.end_game()
+                return
             else:
                 self.place_target()
 
@@ -134,40 +319,40 @@ class EyeControlGridGame:
         self.metrics_label.config(text=metrics_text)
 
     def update_camera(self):
-        """Capture video feed and process eye movements."""
-        success, frame = self.cap.read()
-        if not success:
-            print("Failed to grab frame.")
-            self.quit_game()
+        """Apply inference results posted by the worker and refresh the preview (UI tick)."""
+        if not self.running:
             return
-
-        frame = cv2.flip(frame, 1)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = face_mesh.process(rgb_frame)
-
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                landmarks = face_landmarks.landmark
-
-                # Eye control logic
-                img_height, img_width, _ = frame.shape
-                left_eye = landmarks[362]  # Left eye center
-                right_eye = landmarks[133]  # Right eye center
-                eye_x = int((left_eye.x + right_eye.x) / 2 * self.grid_size)
-                eye_y = int((left_eye.y + right_eye.y) / 2 * self.grid_size)
-
-                if 0 <= eye_x < self.grid_size and 0 <= eye_y < self.grid_size:
-                    self.highlight_cell(eye_y, eye_x)
+        self.ui_timer.start()
+        preview = None
+        while True:
+            try:
+                kind, *payload = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "fixation":
+                captured, (row, col) = payload
+                self.highlight_cell(row, col)
+                self.grabber.mark_done(captured)
+                if not self.running:  # The game ended on this hit
+                    return
+            elif kind == "preview":
+                preview = payload[0]  # Only the newest preview is shown
+            elif kind == "eof":
+                print("Failed to grab frame.")
+                self.quit_game()
+                return
 
         # Display the camera feed
-        resized_frame = cv2.resize(frame, (300, 300))
-        img = Image.fromarray(resized_frame)
-        imgtk = ImageTk.PhotoImage(image=img)
-        self.video_frame.imgtk = imgtk
-        self.video_frame.configure(image=imgtk)
+        if preview is not None:
+            self.preview_image.frombytes(preview)
+            self.preview_photo.paste(self.preview_image)
+        self.ui_timer.lap("ui_tick")
+        self.ui_timer.frame_done()
 
-        # Schedule next camera update
-        self.video_frame.after(10, self.update_camera)
+        # Schedule the next tick on the ui_interval grid; drop missed ticks instead of bunching up
+        now = time.monotonic()
+        self.next_tick = max(self.next_tick + self.ui_interval, now)
+        self.root.after(int((self.next_tick - now) * 1000), self.update_camera)
 
     def end_game(self):
         """End the game and show final performance."""
@@ -181,15 +366,124 @@ class EyeControlGridGame:
                          f"Accuracy: {accuracy:.2f}%\n"
                          f"Total Time: {elapsed_time:.2f} sec\n"
                          f"Speed: {speed:.2f} hits/sec")
+        self.telemetry.event("game_end", hits=self.successful_hits, attempts=self.total_attempts,
+                             accuracy=round(accuracy, 2), elapsed=round(elapsed_time, 2), speed=round(speed, 4))
+        if self.recorder is not None:
+            self.recorder.event("game_end", hits=self.successful_hits, attempts=self.total_attempts,
+                                accuracy=round(accuracy, 2), elapsed=round(elapsed_time, 2))
         messagebox.showinfo("Performance Summary", final_message)
         self.quit_game()
 
     def quit_game(self):
         """Cleanup resources and close the application."""
-        self.cap.release()
+        if not self.running:
+            return
+        self.running = False
+        self.worker.stop()
+        print(f"Capture stats: {self.grabber.stats()}")
+        print(f"Inference stats: {face_mesh.stats()}")
+        print(f"Gaze events: {self.worker.detector.stats()}")
+        print(f"Canvas items: {self.renderer.item_count()}")
+        if self.patient_id is not None:
+            self.save_session()
+        if self.stats_json:
+            self.write_stats(self.stats_json)
+        self.grabber.stop()
+        self.telemetry.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"Recording stats: {self.recorder.stats()}")
         self.root.destroy()
 
+    def save_session(self):
+        """Store this game's results for the patient (finished or abandoned)."""
+        from store import save_session
+        elapsed_time = time.time() - self.start_time
+        accuracy = (self.successful_hits / self.total_attempts) * 100 if self.total_attempts > 0 else None
+        session_id = save_session(
+            self.patient_id, "grid_game", self.start_time, elapsed_time,
+            hits=self.successful_hits, attempts=self.total_attempts, accuracy=accuracy,
+            speed=self.successful_hits / elapsed_time if elapsed_time > 0 else 0,
+            recording=str(self.recorder.path) if self.recorder is not None else None,
+            details={"completed": self.successful_hits >= TOTAL_TARGETS, "grid_size": self.grid_size},
+        )
+        if session_id is not None:
+            print(f"Saved session {session_id} for patient {self.patient_id}")
+
+    def write_stats(self, path):
+        """Write worker stage and UI tick timings (replay benchmarks) as JSON."""
+        from instrumentation import peak_rss_bytes
+        stats = dict(self.worker.timer.summary(), ui=self.ui_timer.summary(), script="headaway.py",
+                     gaze_events=self.worker.detector.stats(),
+                     capture=self.grabber.stats(), inference=face_mesh.stats(), peak_rss_bytes=peak_rss_bytes())
+        with open(path, "w") as f:
+            json.dump(stats, f, indent=2)
+
+def parse_args(argv=None):
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Eye-controlled grid target game.")
+    parser.add_argument("--camera", default="0", help="Camera index or video file path (default: 0).")
+    parser.add_argument("--grid-size", type=int, default=GRID_SIZE, help="Cells per grid side.")
+    parser.add_argument("--ui-fps", type=float, default=UI_FPS, help="Tk update rate.")
+    parser.add_argument("--preview-fps", type=float, default=PREVIEW_FPS,
+                        help="Camera preview refresh rate; 0 disables the preview window.")
+    parser.add_argument("--no-preview", dest="preview_fps", action="store_const", const=0,
+                        help="Same as --preview-fps 0.")
+    parser.add_argument("--record", default=None, metavar="PATH",
+                        help="Record landmarks and game events to this file "
+                             "(default: a new file in $CEREBLAID_RECORD_DIR, if set).")
+    parser.add_argument("--record-landmarks", choices=["eyes", "all"], default="eyes",
+                        help="Record only the eye landmarks, or the full mesh.")
+    parser.add_argument("--patient-id", type=int, default=None,
+                        help="Save the game's results as a session of this patient (set by server.py).")
+    parser.add_argument("--replay", default=None, metavar="PATH",
+                        help="Play a video file or .cbr recording instead of the camera (every frame, in order).")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Pace --replay at its recorded frame rate instead of max speed.")
+    parser.add_argument("--stats-json", default=None, metavar="PATH",
+                        help="Write per-stage timings and capture/inference stats here on exit.")
+    parser.add_argument("--calibration", default=None, metavar="PATH",
+                        help="Screen mapping written by calibration.py (default: the patient's cached "
+                             "calibration, if any; 'none' maps the eye position to the grid directly).")
+    parser.add_argument("--tracker", choices=["auto", "shared", "local"], default="auto",
+                        help="Where landmarks come from: 'shared' attaches to the trackerd.py daemon (waiting "
+                             "for it to start), 'local' opens the camera and runs FaceMesh here, 'auto' uses "
+                             "the daemon if it is running and local otherwise.")
+    parser.add_argument("--tracker-wait", type=float, default=30.0,
+                        help="Seconds to wait for the daemon with --tracker shared.")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    grabber = None
+    if args.replay:
+        from replay import open_replay
+        grabber, recorded_mesh = open_replay(args.replay, args.realtime)
+        face_mesh = recorded_mesh or local_face_mesh()  # Recorded landmarks replace inference
+    else:
+        shared = None
+        if args.tracker != "local":
+            from trackerd import open_shared
+            shared = open_shared(wait=args.tracker_wait if args.tracker == "shared" else 0.0)
+            if shared is None and args.tracker == "shared":
+                raise SystemExit("Tracker daemon is not running.")
+        if shared is not None:
+            grabber, face_mesh = shared
+            print(f"Attached to tracker daemon in {grabber.attach_ms:.1f} ms")
+        else:
+            face_mesh = local_face_mesh()
     root = tk.Tk()
-    game = EyeControlGridGame(root)
+    recorder = None
+    if args.record or not args.replay:  # Replays are only recorded when asked for explicitly
+        recorder = open_recorder(args.record, args.record_landmarks, "headaway.py")
+    calibration = None
+    if args.calibration != "none" and (args.calibration or not args.replay):
+        calibration = load_calibration(args.calibration, args.patient_id)
+        print(f"Using calibration: {calibration.describe()}" if calibration is not None
+              else "No calibration found, mapping the eye position to the grid directly")
+    game = EyeControlGridGame(root, grid_size=args.grid_size, camera=args.camera,
+                              ui_fps=args.ui_fps, preview_fps=args.preview_fps, recorder=recorder,
+                              grabber=grabber, stats_json=args.stats_json, patient_id=args.patient_id,
+                              calibration=calibration)
     root.mainloop()
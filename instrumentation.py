@@ -0,0 +1,378 @@
+# instrumentation.py
+"""
+Per-frame stage timing for the tracking loops (used by replay runs and benchmarks) and
+fixed-bucket metrics for the server's /metrics endpoint.
+
+Every process keeps its own Metrics registry. Trackers and server workers write
+snapshots of it to $CEREBLAID_METRICS_DIR, and render_prometheus() merges the snapshots
+into one Prometheus text exposition. Without that directory (or with enabled=False)
+nothing is timed or recorded.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+
+class StageTimer:
+    """
+    Splits each loop iteration into named stages.
+
+    Call start() at the top of the loop and lap(stage) after each stage; the time since
+    the previous mark is added to that stage. Samples are kept in flat float arrays for
+    exact percentiles (unless keep_samples=False, for loops that run indefinitely) and,
+    given an enabled Metrics registry, in its STAGE_METRIC histograms with the extra
+    labels. With enabled=False every call is a no-op.
+    """
+
+    def __init__(self, stages, enabled=True, metrics=None, keep_samples=True, **labels):
+        self.stages = list(stages)
+        self.enabled = enabled
+        self.keep_samples = keep_samples
+        self.samples = {stage: array("d") for stage in self.stages}
+        self.frames = 0
+        self._mark = None
+        self._first = None
+        self._last = None
+        self.histograms = None
+        self._frame_counter = None
+        if metrics is not None and metrics.enabled:
+            self.histograms = {stage: metrics.histogram(STAGE_METRIC, STAGE_HELP, stage=stage, **labels)
+                               for stage in self.stages}
+            self._frame_counter = metrics.counter(FRAMES_METRIC, FRAMES_HELP, **labels)
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._mark = time.perf_counter()
+        if self._first is None:
+            self._first = self._mark
+
+    def lap(self, stage):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        elapsed = now - self._mark
+        if self.keep_samples:
+            self.samples[stage].append(elapsed)
+        if self.histograms is not None:
+            self.histograms[stage].observe(elapsed)
+        self._mark = self._last = now
+
+    def frame_done(self):
+        """Count one completed frame (for the FPS figure)."""
+        if self.enabled:
+            self.frames += 1
+            if self._frame_counter is not None:
+                self._frame_counter.inc()
+
+    def summary(self):
+        """FPS plus mean/p50/p95/p99 milliseconds for every stage that has samples."""
+        elapsed = (self._last - self._first) if self.frames and self._last else 0.0
+        stages = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ms = np.frombuffer(samples, dtype=np.float64) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            stages[stage] = {"mean_ms": float(ms.mean()), "p50_ms": float(p50),
+                             "p95_ms": float(p95), "p99_ms": float(p99), "count": len(ms)}
+        return {
+            "frames": self.frames,
+            "elapsed_s": elapsed,
+            "fps": self.frames / elapsed if elapsed > 0 else 0.0,
+            "stages": stages,
+        }
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process (None where it cannot be determined)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+
+# --- Launch reporting ---
+def launch_time():
+    """When this script was launched: set by the supervisor, else the process start time."""
+    from supervisor import LAUNCH_TIME_ENV
+    try:
+        return float(os.environ[LAUNCH_TIME_ENV])
+    except (KeyError, ValueError):
+        import psutil
+        return psutil.Process().create_time()
+
+
+def report_status(**fields):
+    """Add fields to this script's supervisor status (one stdout line, kept out of the log)."""
+    from supervisor import STATUS_PREFIX
+    print(STATUS_PREFIX + json.dumps(fields), flush=True)
+
+
+def report_first_frame():
+    """
+    Report the time from launch to the first processed frame (call once, after the first
+    frame's landmarks). Returns the milliseconds.
+    """
+    ms = (time.time() - launch_time()) * 1000
+    print(f">>> Time to first frame: {ms:.0f} ms")
+    report_status(first_frame_ms=round(ms, 1))
+    return ms
+
+
+# --- Metrics ---
+METRICS_DIR_ENV = "CEREBLAID_METRICS_DIR"
+# Seconds; 250 us to 5 s covers both a FaceMesh stage and a password check
+DURATION_BUCKETS = (0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_METRIC = "cereblaid_tracker_stage_seconds"
+STAGE_HELP = "Time per tracker loop stage."
+FRAMES_METRIC = "cereblaid_tracker_frames_total"
+FRAMES_HELP = "Frames processed by the tracker loop."
+EXPORT_INTERVAL = 5.0
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with Prometheus semantics: a value is counted in the first
+    bucket whose upper bound is >= it, the last slot is +Inf. observe() is a bisect and
+    three additions.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {"buckets": list(self.buckets), "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+class Value:
+    """A counter (inc) or gauge (set)."""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = float(value)
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class _NoOp:
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1.0):
+        pass
+
+    def set(self, value):
+        pass
+
+
+_NOOP = _NoOp()
+
+
+class Metrics:
+    """
+    The metric families of one process, each a set of series keyed by label values.
+
+    histogram()/counter()/gauge() return the series object for a name and labels (look
+    it up once and keep it in hot loops). With enabled=False they return a shared no-op
+    and time() does not read the clock.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._families = {}  # name -> (type, help, {label items: series})
+        self._lock = threading.Lock()
+        self._last_dump = 0.0
+        self._exporter = None
+
+    def _series(self, kind, name, help, labels, factory):
+        if not self.enabled:
+            return _NOOP
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = (kind, help, {})
+            elif family[0] != kind:
+                raise ValueError(f"metric {name} is a {family[0]}, not a {kind}")
+            series = family[2].get(key)
+            if series is None:
+                series = family[2][key] = factory()
+            return series
+
+    def histogram(self, name, help="", buckets=DURATION_BUCKETS, **labels):
+        return self._series("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def counter(self, name, help="", **labels):
+        return self._series("counter", name, help, labels, Value)
+
+    def gauge(self, name, help="", **labels):
+        return self._series("gauge", name, help, labels, Value)
+
+    @contextmanager
+    def time(self, name, help="", **labels):
+        """Observe the duration of the with-block (seconds) in a histogram."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name, help, **labels).observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        """JSON-able copy of every series (what dump() writes and render_prometheus() reads)."""
+        with self._lock:
+            families = {name: (kind, help, list(series.items())) for name, (kind, help, series) in self._families.items()}
+        return {"pid": os.getpid(), "time": time.time(), "families": {
+            name: {"type": kind, "help": help,
+                   "series": [dict(series.snapshot(), labels=dict(key)) for key, series in items]}
+            for name, (kind, help, items) in families.items()}}
+
+    def dump(self, path):
+        """Write snapshot() to path atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(self.snapshot()))
+        os.replace(tmp, path)
+        self._last_dump = time.monotonic()
+
+    def dump_due(self, interval=EXPORT_INTERVAL):
+        return self.enabled and time.monotonic() - self._last_dump >= interval
+
+    def dump_if_due(self, path, interval=EXPORT_INTERVAL):
+        """dump() unless the last one was less than interval seconds ago (cheap to call per request)."""
+        if self.dump_due(interval):
+            try:
+                self.dump(path)
+            except OSError:
+                pass
+
+    def start_exporter(self, path, interval=EXPORT_INTERVAL):
+        """Dump to path every interval seconds from a daemon thread (for tracker loops)."""
+        if not self.enabled or self._exporter is not None:
+            return self
+
+        def export():
+            while True:
+                time.sleep(interval)
+                self.dump_if_due(path, 0.0)
+
+        self._exporter = threading.Thread(target=export, name="metrics-exporter", daemon=True)
+        self._exporter.start()
+        return self
+
+
+def script_metrics(script):
+    """
+    Metrics registry for a tracker script: enabled, and exported to the metrics directory,
+    only when it was launched by the server (which sets $CEREBLAID_METRICS_DIR).
+    """
+    directory = os.environ.get(METRICS_DIR_ENV)
+    metrics = Metrics(enabled=bool(directory))
+    if directory:
+        metrics.start_exporter(Path(directory) / f"{script}.{os.getpid()}.json")
+    return metrics
+
+
+def read_snapshots(directory, exclude_pid=None):
+    """Snapshots in directory written by live processes; files of exited ones are removed."""
+    import psutil
+    snapshots = []
+    for path in Path(directory).glob("*.json"):
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        pid = snapshot.get("pid")
+        if not psutil.pid_exists(pid):
+            path.unlink(missing_ok=True)
+            continue
+        if pid != exclude_pid:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def _labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def render_prometheus(snapshots):
+    """
+    Prometheus text format (0.0.4) for one or more snapshots. Series with the same name
+    and labels are merged: histograms and counters are summed, the newest gauge wins.
+    """
+    families = {}
+    for snapshot in sorted(snapshots, key=lambda s: s.get("time", 0)):
+        for name, family in snapshot["families"].items():
+            kind, merged = families.setdefault(name, (family["type"], {}))
+            for series in family["series"]:
+                key = tuple(sorted(series["labels"].items()))
+                current = merged.get(key)
+                if current is None or kind == "gauge":
+                    merged[key] = {k: list(v) if isinstance(v, list) else v for k, v in series.items()}
+                elif kind == "counter":
+                    current["value"] += series["value"]
+                elif current["buckets"] == series["buckets"]:
+                    current["counts"] = [a + b for a, b in zip(current["counts"], series["counts"])]
+                    current["sum"] += series["sum"]
+                    current["count"] += series["count"]
+    helps = {name: family["help"] for snapshot in snapshots for name, family in snapshot["families"].items()}
+    lines = []
+    for name in sorted(families):
+        kind, merged = families[name]
+        if helps.get(name):
+            lines.append(f"# HELP {name} {helps[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, series in sorted(merged.items()):
+            labels = dict(key)
+            if kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(series["buckets"] + ["+Inf"], series["counts"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels, {'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {series['sum']!r}")
+                lines.append(f"{name}_count{_labels(labels)} {series['count']}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {series['value']!r}")
+    return "\n".join(lines) + "\n"
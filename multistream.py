@@ -0,0 +1,295 @@
+# multistream.py
+"""
+Multi-station tracking: one capture + FaceMesh worker process per camera or video file.
+
+Each stream gets its own process, pinned round-robin to the CPU cores this process may
+use, so N stations use N cores instead of sharing one interpreter (and its GIL). Frames
+are buffered per stream in the worker's FrameGrabber, a bounded queue of queue_size
+frames, and results go back through the stream's own pipe. That gives backpressure at
+both ends. A consumer that falls behind blocks the worker's send. The worker stops
+reading frames, and its grabber then drops the oldest camera frames (cameras) or pauses
+decoding (files). A slow station never slows the others.
+
+MultiStreamTracker.results() merges the pipes into one channel of StreamResults tagged
+with their stream. Landmarks are (478, 3) float32 arrays, or None without a face.
+
+    python multistream.py --source 0 --source 1 --seconds 60
+    python multistream.py --source a.mp4 --source b.mp4 --loop --json stats.json
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import deque, namedtuple
+from multiprocessing import connection, get_context
+
+import numpy as np
+
+# latency: capture to the consumer receiving the result (seconds, time.monotonic is system-wide)
+StreamResult = namedtuple("StreamResult", ["stream", "index", "timestamp", "landmarks", "latency"])
+
+QUEUE_SIZE = 4
+LATENCY_SAMPLES = 10000  # Per stream; latency percentiles cover the most recent results
+START_TIMEOUT = 60.0  # Spawning imports mediapipe and loads the model in every worker
+# Libraries that would otherwise start a thread pool per core in every worker
+SINGLE_THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def available_cores():
+    """CPU cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def looped(path):
+    """Frames of a video file, restarting at the end (benchmarks and demo stations)."""
+    import cv2
+    while True:
+        capture = cv2.VideoCapture(str(path))
+        if not capture.isOpened():
+            return
+        frames = 0
+        while True:
+            ok, image = capture.read()
+            if not ok:
+                break
+            frames += 1
+            yield image
+        capture.release()
+        if not frames:
+            return
+
+
+def _worker(name, source, core, conn, stop, options):
+    """Stream process: capture, FaceMesh and one result message per frame until stop is set."""
+    for variable in SINGLE_THREAD_ENV:
+        os.environ.setdefault(variable, "1")
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+    import cv2
+    import mediapipe as mp
+    from capture import FrameGrabber
+    from facemesh import RoiFaceMesh
+    from preprocess import FramePreprocessor
+    cv2.setNumThreads(1)
+
+    camera = isinstance(source, int) or (isinstance(source, str) and source.isdigit())
+    if camera:
+        grabber = FrameGrabber(source, buffer_size=options["queue_size"], drop_stale=True)
+    else:
+        grabber = FrameGrabber(looped(source) if options["loop"] else source,
+                               buffer_size=options["queue_size"], drop_stale=False)
+    face_mesh = RoiFaceMesh(mp.solutions.face_mesh.FaceMesh(refine_landmarks=True, max_num_faces=1),
+                            roi=options["roi"])
+    preprocessor = FramePreprocessor()
+    if not grabber.open():
+        conn.send(("error", name, f"could not open {source!r}"))
+        conn.close()
+        return
+    grabber.start()
+    conn.send(("ready", name, {"pid": os.getpid(), "core": core}))
+    processed = faces = 0
+    started = time.monotonic()
+    busy = 0.0
+    try:
+        while not stop.is_set():
+            captured = grabber.read(timeout=0.5)
+            if captured is None:
+                if grabber.finished:
+                    break
+                continue
+            work_start = time.monotonic()
+            landmarks = face_mesh.process(preprocessor.rgb(captured.image))
+            busy += time.monotonic() - work_start
+            processed += 1
+            faces += landmarks is not None
+            # Blocks while the consumer is behind: this stream's backpressure
+            conn.send(("result", name, captured.index, captured.timestamp, landmarks))
+            grabber.mark_done(captured)
+    except (BrokenPipeError, EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        elapsed = time.monotonic() - started
+        stats = {"source": str(source), "core": core, "pid": os.getpid(), "processed": processed, "faces": faces,
+                 "seconds": elapsed, "fps": processed / elapsed if elapsed > 0 else 0.0,
+                 "busy_fraction": busy / elapsed if elapsed > 0 else 0.0,
+                 "capture": grabber.stats(), "inference": face_mesh.stats()}
+        grabber.stop()
+        face_mesh.close()
+        try:
+            conn.send(("stats", name, stats))
+            conn.close()
+        except OSError:
+            pass
+
+
+class MultiStreamTracker:
+    """
+    Runs one worker process per source and merges their results.
+
+    sources are camera indices or video paths; names default to stream0, stream1...
+    With pin=True the workers are spread round-robin over available_cores().
+    """
+
+    def __init__(self, sources, names=None, queue_size=QUEUE_SIZE, loop=False, roi=True, pin=True):
+        self.sources = list(sources)
+        self.names = list(names) if names else [f"stream{n}" for n in range(len(self.sources))]
+        cores = available_cores()
+        self.cores = {name: cores[n % len(cores)] if pin else None for n, name in enumerate(self.names)}
+        self.options = {"queue_size": queue_size, "loop": loop, "roi": roi}
+        self._context = get_context("spawn")  # Workers import mediapipe themselves; nothing is forked
+        self._stop = self._context.Event()
+        self._processes = {}
+        self._conns = {}
+        self.received = dict.fromkeys(self.names, 0)
+        self.latency = {name: deque(maxlen=LATENCY_SAMPLES) for name in self.names}
+        self.stats = {}
+        self.errors = {}
+
+    def start(self, timeout=START_TIMEOUT):
+        """Start every worker and wait until each has its model loaded and source open."""
+        for name, source in zip(self.names, self.sources):
+            reader, writer = self._context.Pipe(duplex=False)
+            process = self._context.Process(target=_worker, name=f"multistream-{name}", daemon=True,
+                                            args=(name, source, self.cores[name], writer, self._stop, self.options))
+            process.start()
+            writer.close()  # Only the worker holds the write end: EOF once it exits
+            self._processes[name] = process
+            self._conns[name] = reader
+        deadline = time.monotonic() + timeout
+        pending = set(self.names)
+        while pending and time.monotonic() < deadline:
+            for reader in connection.wait([self._conns[name] for name in pending], timeout=0.5):
+                name = self._name_of(reader)
+                try:
+                    kind, _, payload = reader.recv()
+                except EOFError:
+                    self.errors[name] = "exited during startup"
+                    self._conns.pop(name)
+                    pending.discard(name)
+                    continue
+                if kind == "error":
+                    self.errors[name] = payload
+                pending.discard(name)
+        for name in pending:
+            self.errors[name] = "did not start in time"
+        return self
+
+    @property
+    def running(self):
+        """True while any stream can still deliver results."""
+        return bool(self._conns)
+
+    def _name_of(self, reader):
+        return next(name for name, conn in self._conns.items() if conn is reader)
+
+    def results(self, timeout=None):
+        """
+        Yield StreamResults from all streams as they arrive, until every stream has ended
+        or no result arrived for timeout seconds. Worker stats are collected on the way.
+        """
+        while self._conns:
+            ready = connection.wait(list(self._conns.values()), timeout=timeout)
+            if not ready:
+                return
+            for reader in ready:
+                name = self._name_of(reader)
+                try:
+                    message = reader.recv()
+                except EOFError:
+                    self._conns.pop(name).close()
+                    continue
+                if message[0] == "result":
+                    _, _, index, timestamp, landmarks = message
+                    latency = time.monotonic() - timestamp
+                    self.received[name] += 1
+                    self.latency[name].append(latency)
+                    yield StreamResult(name, index, timestamp, landmarks, latency)
+                elif message[0] == "stats":
+                    self.stats[name] = message[2]
+                elif message[0] == "error":
+                    self.errors[name] = message[2]
+
+    def stop(self, timeout=5.0):
+        """Stop the workers, collecting their final stats (pending results are discarded)."""
+        self._stop.set()
+        # Keep draining: a worker blocked on a full pipe only sees the stop flag after its send
+        deadline = time.monotonic() + timeout
+        while self._conns and time.monotonic() < deadline:
+            for _ in self.results(timeout=max(0.0, deadline - time.monotonic())):
+                pass
+        for process in self._processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join(1.0)
+        for reader in self._conns.values():
+            reader.close()
+        self._conns.clear()
+
+    def summary(self):
+        """Per-stream throughput and latency (over the last LATENCY_SAMPLES results) plus totals."""
+        streams = {}
+        for name in self.names:
+            latency = np.asarray(self.latency[name]) * 1000
+            streams[name] = dict(self.stats.get(name, {}), received=self.received[name],
+                                 error=self.errors.get(name),
+                                 latency_p50_ms=float(np.percentile(latency, 50)) if len(latency) else None,
+                                 latency_p95_ms=float(np.percentile(latency, 95)) if len(latency) else None)
+        return {"streams": streams, "total_fps": sum(stream.get("fps", 0.0) for stream in streams.values())}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Track several cameras or video files in parallel, one process each.")
+    parser.add_argument("--source", action="append", required=True,
+                        help="Camera index or video file (repeatable, one worker process each).")
+    parser.add_argument("--seconds", type=float, default=0.0, help="Stop after this long (0 = until the sources end).")
+    parser.add_argument("--loop", action="store_true", help="Restart video files at their end.")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="Frames buffered per stream.")
+    parser.add_argument("--roi", action=argparse.BooleanOptionalAction, default=True,
+                        help="Run inference on a crop around the tracked face.")
+    parser.add_argument("--pin", action=argparse.BooleanOptionalAction, default=True,
+                        help="Pin each worker to its own core (round-robin).")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the per-stream summary here.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from calibration import gaze_feature
+    from telemetry import TelemetryPublisher
+    args = parse_args(argv)
+    tracker = MultiStreamTracker(args.source, queue_size=args.queue_size, loop=args.loop, roi=args.roi,
+                                 pin=args.pin).start()
+    for name, error in tracker.errors.items():
+        print(f"!!! ERROR: {name}: {error}")
+    print(f">>> Tracking {len(tracker.names)} streams on cores {sorted(set(tracker.cores.values()), key=str)}")
+    # Live gaze per station for the dashboard (uncalibrated, like the trackers without a calibration)
+    publishers = {name: TelemetryPublisher(f"multistream.py:{name}") for name in tracker.names}
+    deadline = time.monotonic() + args.seconds if args.seconds else float("inf")
+    try:
+        while tracker.running and time.monotonic() < deadline:
+            for result in tracker.results(timeout=1.0):
+                if result.landmarks is not None:
+                    publishers[result.stream].gaze(*gaze_feature(result.landmarks))
+                if time.monotonic() >= deadline:
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tracker.stop()
+        for publisher in publishers.values():
+            publisher.close()
+    summary = tracker.summary()
+    for name, stream in summary["streams"].items():
+        print(f">>> {name}: {stream.get('fps', 0.0):.1f} fps on core {stream.get('core')}, "
+              f"p95 latency {stream['latency_p95_ms'] or 0:.0f} ms, dropped {stream.get('capture', {}).get('dropped', 0)}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 1 if tracker.errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+# preprocess.py
+
+import cv2
+import numpy as np
+
+
+def mirror_x(x):
+    """Mirror a normalised x coordinate (works on floats and NumPy arrays)."""
+    return 1.0 - x
+
+
+class FramePreprocessor:
+    """
+    Colour conversion and preview scaling into preallocated buffers.
+
+    The camera frame is never flipped before inference. FaceMesh runs on the raw
+    frame and callers mirror landmark x coordinates with mirror_x() instead, so the
+    hot path does one cvtColor into a reused buffer and nothing else. Note that on an
+    unmirrored frame the left/right eye landmark indices refer to the opposite
+    physical eye. Both-eye EAR and the eye-corner midpoint are symmetric; a single
+    landmark is not, so the gaze point uses the mirrored counterpart of the index the
+    flipped frame used (calibration.IRIS_LANDMARK: 470 for 475).
+
+    Buffers are reallocated only when the input shape changes.
+    """
+
+    def __init__(self, preview_size=None):
+        self.preview_size = preview_size  # (width, height) of the preview image, or None
+        self._rgb = None
+        self._rgb_readonly = None
+        self._scaled = None
+        self._display = None
+        self._preview = None
+        self._preview_mirrored = None
+
+    def _ensure(self, shape):
+        if self._rgb is None or self._rgb.shape != shape:
+            self._rgb = np.empty(shape, dtype=np.uint8)
+            # Read-only view of the same memory: MediaPipe passes non-writeable arrays by reference
+            self._rgb_readonly = self._rgb.view()
+            self._rgb_readonly.flags.writeable = False
+            self._display = None
+        if self.preview_size and self._preview is None:
+            w, h = self.preview_size
+            self._preview = np.empty((h, w, 3), dtype=np.uint8)
+            self._preview_mirrored = np.empty((h, w, 3), dtype=np.uint8)
+
+    def rgb(self, frame, scale=1.0):
+        """
+        Convert a BGR frame to RGB in place of the previous one; returns a read-only array.
+        With scale < 1 the frame is first downscaled (cheaper conversion and inference).
+        """
+        if scale < 1.0:
+            h, w = frame.shape[:2]
+            shape = (max(1, int(h * scale)), max(1, int(w * scale)), frame.shape[2])
+            if self._scaled is None or self._scaled.shape != shape:
+                self._scaled = np.empty(shape, dtype=np.uint8)
+            cv2.resize(frame, (shape[1], shape[0]), dst=self._scaled, interpolation=cv2.INTER_AREA)
+            frame = self._scaled
+        self._ensure(frame.shape)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        return self._rgb_readonly
+
+    def display(self, frame):
+        """Mirrored BGR copy of frame for cv2.imshow overlays (only needed with a preview)."""
+        if self._display is None or self._display.shape != frame.shape:
+            self._display = np.empty_like(frame)
+        return cv2.flip(frame, 1, dst=self._display)
+
+    def preview(self):
+        """Mirrored, downscaled RGB copy of the last rgb() result for Tk/PIL previews."""
+        cv2.resize(self._rgb, self.preview_size, dst=self._preview)
+        return cv2.flip(self._preview, 1, dst=self._preview_mirrored)
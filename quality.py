@@ -0,0 +1,197 @@
+# quality.py
+"""
+Adaptive quality for the eye tracker: holds a per-frame latency budget when the CPU is busy.
+
+QualityController walks a ladder of QualityLevels, from full quality (level 0) to the
+cheapest setting. It steps down one level as soon as the recent frame latency (capture to
+cursor decision) exceeds the budget, and climbs back one level at a time once latency has
+stayed well inside the budget and the machine is no longer busy. Each climb that has to be
+undone within a short time doubles the wait before the next one, so a steady load settles
+on one level instead of oscillating around it. Every change is reported through log with
+the measurements that triggered it.
+
+The controller only decides; the tracking loop applies the level (see eyetracking.py).
+simulate() drives it with a synthetic load trace (TRACES; bench.py quality, tests/test_quality.py).
+"""
+
+import time
+from collections import deque, namedtuple
+
+# scale: processing resolution relative to the camera frame, skip: frames dropped after
+# each processed one, roi_size: FaceMesh crop side, refine: iris landmarks (FaceMesh rebuild)
+QualityLevel = namedtuple("QualityLevel", ["scale", "skip", "roi_size", "refine"])
+
+LEVELS = (
+    QualityLevel(1.0, 0, 256, True),
+    QualityLevel(1.0, 0, 192, True),
+    QualityLevel(0.75, 0, 192, True),
+    QualityLevel(0.75, 1, 192, True),
+    QualityLevel(0.5, 1, 160, True),
+    QualityLevel(0.5, 2, 160, True),
+    QualityLevel(0.5, 2, 160, False),  # Last resort: no iris, gaze falls back to the eye corners
+)
+
+
+def ladder(roi_size=256, refine=True, levels=LEVELS):
+    """levels with ROI sizes scaled to a different top ROI size, and without refinement if it is off."""
+    factor = roi_size / levels[0].roi_size
+    return tuple(level._replace(roi_size=int(level.roi_size * factor), refine=level.refine and refine)
+                 for level in levels)
+
+
+def level_cost(level, base=LEVELS[0]):
+    """Rough CPU cost per second of a level relative to base (for simulations)."""
+    inference = (level.roi_size / base.roi_size) ** 2 * (1.0 if level.refine else 0.75)
+    convert = 0.15 * level.scale ** 2 / base.scale ** 2
+    return (inference + convert) / 1.15 / (level.skip + 1) * (base.skip + 1)
+
+
+def describe(level):
+    return (f"scale {level.scale:g}, skip {level.skip}, roi {level.roi_size}, "
+            f"refine {'on' if level.refine else 'off'}")
+
+
+class QualityController:
+    """
+    Picks a QualityLevel from per-frame latency and system CPU load.
+
+    Call update(latency_s) once per processed frame. Decisions are taken at most every
+    window seconds from the window's 90th percentile latency: above budget_s, or above
+    pressure_ratio * budget_s while system CPU is over cpu_high -> one level down (any
+    time); below upgrade_ratio * budget_s with system CPU under cpu_high for upgrade_after
+    seconds -> one level up. cpu_percent is a callable returning system-wide
+    CPU percent (psutil.cpu_percent by default); clock and log are replaceable for
+    simulations.
+    """
+
+    def __init__(self, budget_s=0.1, levels=LEVELS, start_level=0, window=1.0, upgrade_after=5.0,
+                 upgrade_ratio=0.6, pressure_ratio=0.85, cpu_high=85.0, max_upgrade_after=60.0, relapse=10.0,
+                 cpu_percent=None, clock=time.monotonic, log=print):
+        self.budget_s = budget_s
+        self.levels = tuple(levels)
+        self.index = start_level
+        self.window = window
+        self.base_upgrade_after = upgrade_after
+        self.upgrade_after = upgrade_after  # Grows after upgrades that had to be undone
+        self.max_upgrade_after = max_upgrade_after
+        self.upgrade_ratio = upgrade_ratio
+        self.pressure_ratio = pressure_ratio
+        self.cpu_high = cpu_high
+        self.relapse = relapse  # A downgrade this soon after an upgrade means the upgrade was premature
+        if cpu_percent is None:
+            import psutil
+            psutil.cpu_percent(None)  # First call only sets the reference point
+            cpu_percent = lambda: psutil.cpu_percent(None)
+        self.cpu_percent = cpu_percent
+        self.clock = clock
+        self.log = log
+        self.decisions = []
+        self._samples = deque(maxlen=1000)
+        self._window_start = None
+        self._good_since = None
+        self._last_upgrade = None
+        self._skip_left = 0
+        self.cpu = 0.0
+        self.p90_s = None
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    def skip_frame(self):
+        """True for frames the current level drops without processing."""
+        if self._skip_left > 0:
+            self._skip_left -= 1
+            return True
+        self._skip_left = self.level.skip
+        return False
+
+    def update(self, latency_s):
+        """Add one frame's latency; returns the new QualityLevel when it changed, else None."""
+        now = self.clock()
+        self._samples.append(latency_s)
+        if self._window_start is None:
+            self._window_start = now
+        if now - self._window_start < self.window:
+            return None
+        samples = sorted(self._samples)
+        self._samples.clear()
+        self._window_start = now
+        self.p90_s = samples[min(len(samples) - 1, int(len(samples) * 0.9))]
+        self.cpu = self.cpu_percent()
+
+        over = self.p90_s > self.budget_s
+        # A busy machine gets no headroom: step down before the budget is actually missed
+        pressed = self.cpu >= self.cpu_high and self.p90_s > self.budget_s * self.pressure_ratio
+        if over or pressed:
+            self._good_since = None
+            if self.index + 1 < len(self.levels):
+                if self._last_upgrade is not None and now - self._last_upgrade < self.relapse:
+                    self.upgrade_after = min(self.upgrade_after * 2, self.max_upgrade_after)
+                limit = self.budget_s * (1.0 if over else self.pressure_ratio)
+                return self._change(now, +1, f"p90 {self.p90_s * 1000:.0f} ms > {limit * 1000:.0f} ms")
+            return None
+
+        if self.p90_s < self.budget_s * self.upgrade_ratio and self.cpu < self.cpu_high and self.index > 0:
+            if self._good_since is None:
+                self._good_since = now
+            elif now - self._good_since >= self.upgrade_after:
+                self._good_since = None
+                self._last_upgrade = now
+                return self._change(now, -1, f"p90 {self.p90_s * 1000:.0f} ms for {self.upgrade_after:.0f}s")
+        else:
+            self._good_since = None
+            if self._last_upgrade is not None and now - self._last_upgrade >= self.relapse:
+                self.upgrade_after = self.base_upgrade_after  # Held the level: forget the backoff
+                self._last_upgrade = None
+        return None
+
+    def _change(self, now, step, reason):
+        old = self.index
+        self.index += step
+        self._skip_left = 0
+        decision = {"time": now, "from": old, "to": self.index, "reason": reason, "cpu_percent": self.cpu,
+                    "p90_ms": self.p90_s * 1000, "level": self.level._asdict()}
+        self.decisions.append(decision)
+        self.log(f">>> Quality {old} -> {self.index} ({reason}, cpu {self.cpu:.0f}%): {describe(self.level)}")
+        return self.level
+
+
+# Synthetic load traces for simulate(): (seconds, system CPU percent, latency at full quality in seconds)
+TRACES = {
+    "idle": [(60, 20, 0.04)],
+    "overload": [(10, 20, 0.04), (40, 98, 0.4), (90, 20, 0.04)],
+    "pressure": [(10, 20, 0.04), (30, 95, 0.09), (60, 20, 0.04)],
+    "borderline": [(5, 30, 0.05), (175, 70, 0.2)],
+    "spikes": [(5, 30, 0.04)] + [(2, 99, 0.5), (8, 30, 0.04)] * 12,
+}
+
+
+def simulate(trace, budget_s=0.1, fps=30.0, **options):
+    """
+    Run a QualityController against a synthetic load trace without a camera.
+
+    trace is a list of (seconds, cpu_percent, full_quality_latency_s) phases. A frame's
+    latency is full_quality_latency_s scaled by the level's cost: the less CPU the tracker
+    asks for, the less it waits behind the competing load. Returns per-second
+    (time, level, latency_s) samples plus the controller's decisions.
+    """
+    now = [0.0]
+    current_cpu = [0.0]
+    controller = QualityController(budget_s=budget_s, clock=lambda: now[0], log=lambda message: None,
+                                   cpu_percent=lambda: current_cpu[0], **options)
+    timeline = []
+    for seconds, cpu, latency_s in trace:
+        current_cpu[0] = cpu
+        end = now[0] + seconds
+        next_sample = now[0]
+        while now[0] < end:
+            now[0] += 1.0 / fps
+            if controller.skip_frame():
+                continue
+            latency = latency_s * level_cost(controller.level)
+            controller.update(latency)
+            if now[0] >= next_sample:
+                timeline.append((round(now[0], 3), controller.index, latency))
+                next_sample += 1.0
+    return {"timeline": timeline, "decisions": controller.decisions}
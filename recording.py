@@ -0,0 +1,344 @@
+# recording.py
+"""
+Binary session recordings of FaceMesh landmark streams.
+
+A recording is two files:
+
+  <name>.cbr          a small header followed by fixed-width frame records
+  <name>.cbr.events   one JSON line per discrete event (blink, hit, ...)
+
+Each frame record holds the capture time (seconds since the recording started), the
+frame number, a flags word and a float32 (K, 3) landmark block, where K is either the
+full 478-point mesh or a selected subset (see LANDMARK_SETS). Frames without a face are
+stored with FLAG_FACE unset and NaN landmarks so the time axis has no gaps, and the iris
+rows of frames from FaceMesh without refine_landmarks (468 rows) are NaN.
+
+SessionRecorder does the writing on a background thread, in chunks, so the tracker loop
+only pays for a small array copy. Recording opens the frame records with numpy.memmap,
+so slicing hours of data does not read the file into memory. Because every record has
+the same size the frame count comes from the file size, and a recording cut short by a
+crash is still readable up to the last complete record.
+"""
+
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b"CBAIDREC"
+VERSION = 1
+# magic, version, header length (whole header, including the JSON metadata and padding)
+_PREAMBLE = struct.Struct("<8sHI")
+_HEADER_ALIGN = 64
+
+FLAG_FACE = 1  # A face was found; landmarks are valid
+
+NUM_LANDMARKS = 478  # FaceMesh with refine_landmarks=True
+FACE_LANDMARKS = 468  # Without refinement: no iris rows (recorded as NaN)
+# Landmarks the tracking scripts actually use: irises (469-472, 474-477), eyelids (145/159),
+# the blink EAR points and the eye corners used by the grid game (362/133)
+EYE_LANDMARKS = sorted({469, 470, 471, 472, 474, 475, 476, 477, 145, 159,
+                        33, 160, 158, 133, 153, 144, 362, 385, 387, 263, 373, 380})
+LANDMARK_SETS = {"all": None, "eyes": EYE_LANDMARKS}
+
+
+def record_dtype(count):
+    """Structured dtype of one frame record holding count landmarks."""
+    return np.dtype([
+        ("t", "<f8"),
+        ("frame", "<u4"),
+        ("flags", "<u4"),
+        ("landmarks", "<f4", (count, 3)),
+    ])
+
+
+def session_path(directory, source):
+    """Timestamped recording path for a script, e.g. recordings/eyetracking-20240101-120000.cbr."""
+    name = Path(source).stem
+    return Path(directory) / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.cbr"
+
+
+def open_recorder(path, landmark_set, source):
+    """
+    SessionRecorder for a tracking script's --record/--record-landmarks options.
+
+    Without an explicit path, sessions are recorded into $CEREBLAID_RECORD_DIR when it
+    is set; otherwise nothing is recorded and None is returned.
+    """
+    if path is None:
+        directory = os.environ.get("CEREBLAID_RECORD_DIR")
+        if not directory:
+            return None
+        path = session_path(directory, source)
+    return SessionRecorder(path, indices=LANDMARK_SETS[landmark_set], source=source)
+
+
+def _events_path(path):
+    return Path(f"{path}.events")
+
+
+# --- Writing ---
+class SessionRecorder:
+    """
+    Appends landmark frames and events to a recording from a background thread.
+
+    frame() and event() never block: if the writer falls behind by more than
+    queue_size items the new item is dropped and counted.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path, indices=None, num_landmarks=NUM_LANDMARKS, source=None, meta=None,
+                 chunk_frames=256, flush_interval=1.0, queue_size=1024):
+        self.path = Path(path)
+        self.indices = None if indices is None else np.asarray(indices, dtype=np.intp)
+        self.num_landmarks = num_landmarks
+        self.count = num_landmarks if self.indices is None else len(self.indices)
+        self.dtype = record_dtype(self.count)
+        self.flush_interval = flush_interval
+        self.t0 = time.monotonic()
+        self.frames = 0
+        self.events = 0
+        self.dropped = 0
+        self.bytes_written = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        header = {
+            "source": source,
+            "created": time.time(),
+            "num_landmarks": num_landmarks,
+            "indices": None if self.indices is None else self.indices.tolist(),
+            "dtype": self.dtype.descr,
+            **(meta or {}),
+        }
+        self._file = open(self.path, "wb")
+        self._file.write(self._encode_header(header))
+        self._events_file = open(_events_path(self.path), "w", encoding="utf-8")
+        self._chunk = np.zeros(chunk_frames, dtype=self.dtype)
+        self._pending = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _encode_header(header):
+        body = json.dumps(header, separators=(",", ":")).encode()
+        length = -(-(_PREAMBLE.size + len(body)) // _HEADER_ALIGN) * _HEADER_ALIGN
+        return _PREAMBLE.pack(MAGIC, VERSION, length) + body.ljust(length - _PREAMBLE.size, b" ")
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def frame(self, landmarks, timestamp=None, frame=0):
+        """Queue one frame of (N, 3) landmarks (None when no face was found; missing rows are stored as NaN)."""
+        t = (time.monotonic() if timestamp is None else timestamp) - self.t0
+        if landmarks is not None and len(landmarks) < self.num_landmarks:
+            # FaceMesh without refine_landmarks (or a quality level that turned it off)
+            padded = np.full((self.num_landmarks, 3), np.nan, dtype=np.float32)
+            padded[:len(landmarks)] = landmarks
+            landmarks = padded
+        if landmarks is not None:
+            # Copy (or select) here: the caller may reuse its array for the next frame
+            landmarks = np.array(landmarks if self.indices is None else landmarks[self.indices],
+                                 dtype=np.float32)
+        self._put(("frame", t, frame, landmarks))
+
+    def event(self, name, timestamp=None, **fields):
+        """Queue a discrete event stamped on the same clock as the frames."""
+        t = (time.monotonic() if timestamp is None else timestamp) - self.t0
+        self._put(("event", t, name, fields))
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                break
+            if item is not None:
+                self._write(item)
+            if self._pending == len(self._chunk) or time.monotonic() >= next_flush:
+                self._flush()
+                next_flush = time.monotonic() + self.flush_interval
+        self._flush()
+
+    def _write(self, item):
+        if item[0] == "event":
+            _, t, name, fields = item
+            # The frame number ties the event to the record it happened after
+            line = json.dumps({"t": t, "frame": self.frames, "name": name, **fields},
+                              separators=(",", ":"))
+            self._events_file.write(line + "\n")
+            self.events += 1
+            return
+
+        _, t, frame, landmarks = item
+        record = self._chunk[self._pending]
+        record["t"] = t
+        record["frame"] = frame
+        if landmarks is None:
+            record["flags"] = 0
+            record["landmarks"] = np.nan
+        else:
+            record["flags"] = FLAG_FACE
+            record["landmarks"] = landmarks
+        self._pending += 1
+        self.frames += 1
+
+    def _flush(self):
+        if self._pending:
+            data = memoryview(self._chunk[:self._pending]).cast("B")
+            self._file.write(data)
+            self.bytes_written += len(data)
+            self._pending = 0
+        self._file.flush()
+        self._events_file.flush()
+
+    def stats(self):
+        return {
+            "path": str(self.path),
+            "frames": self.frames,
+            "events": self.events,
+            "dropped": self.dropped,
+            "bytes": self.bytes_written,
+        }
+
+    def close(self):
+        """Write everything still queued and close the files."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+        self._file.close()
+        self._events_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Reading ---
+class Recording:
+    """
+    Read-only view of a recording.
+
+    records is a memmap of the frame records; t, frame, flags and landmarks are
+    zero-copy views of its fields. landmarks is always (frames, K, 3) in the order of
+    indices, so use column() to look up a FaceMesh landmark number.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            preamble = f.read(_PREAMBLE.size)
+            if len(preamble) < _PREAMBLE.size:
+                raise ValueError(f"{self.path} is not a session recording (file too short)")
+            magic, version, header_len = _PREAMBLE.unpack(preamble)
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a session recording")
+            if version != VERSION:
+                raise ValueError(f"{self.path}: unsupported recording version {version}")
+            self.meta = json.loads(f.read(header_len - _PREAMBLE.size))
+
+        self.indices = self.meta["indices"]
+        self.count = self.meta["num_landmarks"] if self.indices is None else len(self.indices)
+        self.dtype = record_dtype(self.count)
+        n = (os.path.getsize(self.path) - header_len) // self.dtype.itemsize
+        if n > 0:
+            self.records = np.memmap(self.path, dtype=self.dtype, mode="r", offset=header_len, shape=(n,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)  # memmap cannot map zero bytes
+        self._events = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def t(self):
+        return self.records["t"]
+
+    @property
+    def frame(self):
+        return self.records["frame"]
+
+    @property
+    def flags(self):
+        return self.records["flags"]
+
+    @property
+    def face_found(self):
+        return (self.records["flags"] & FLAG_FACE).astype(bool)
+
+    @property
+    def landmarks(self):
+        return self.records["landmarks"]
+
+    @property
+    def duration(self):
+        return float(self.t[-1] - self.t[0]) if len(self) else 0.0
+
+    def column(self, landmark):
+        """Position of FaceMesh landmark number `landmark` within the stored landmark axis."""
+        if self.indices is None:
+            return landmark
+        try:
+            return self.indices.index(landmark)
+        except ValueError:
+            raise KeyError(f"landmark {landmark} was not recorded") from None
+
+    def between(self, start, stop):
+        """Records with start <= t < stop (a memmap slice; nothing is read until used)."""
+        lo, hi = np.searchsorted(self.t, [start, stop])
+        return self.records[lo:hi]
+
+    def expand(self, records):
+        """Full (n, num_landmarks, 3) arrays for records of a subset recording (NaN elsewhere)."""
+        if self.indices is None:
+            return np.asarray(records["landmarks"])
+        full = np.full((len(records), self.meta["num_landmarks"], 3), np.nan, dtype=np.float32)
+        full[:, self.indices] = records["landmarks"]
+        return full
+
+    @property
+    def events(self):
+        """List of event dicts (t, frame, name and the event's own fields)."""
+        if self._events is None:
+            events_path = _events_path(self.path)
+            self._events = []
+            if events_path.exists():
+                with open(events_path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            self._events.append(json.loads(line))
+                        except ValueError:
+                            break  # Truncated last line from an interrupted session
+        return self._events
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarise a session recording.")
+    parser.add_argument("path")
+    args = parser.parse_args()
+    rec = Recording(args.path)
+    print(json.dumps({
+        "source": rec.meta.get("source"),
+        "frames": len(rec),
+        "duration_s": round(rec.duration, 3),
+        "face_found": int(rec.face_found.sum()),
+        "landmarks_per_frame": rec.count,
+        "bytes_per_frame": rec.dtype.itemsize,
+        "events": len(rec.events),
+    }, indent=2))
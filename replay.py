@@ -0,0 +1,201 @@
+# replay.py
+"""
+Offline replay sources for the tracking scripts.
+
+A replay source is either a video file (frames go through the real FaceMesh) or a
+session recording made with recording.py (landmarks are played back and FaceMesh is
+not run at all). open_replay() returns a FrameGrabber plus, for recordings, a
+RecordedFaceMesh that stands in for RoiFaceMesh, so the scripts' per-frame logic runs
+unchanged. Replays process every frame in order (no stale-frame dropping) and run at
+max speed unless realtime pacing is requested.
+
+Run as a script to drive headaway.py's inference worker headlessly, or to write a
+synthetic recording for benchmarks:
+
+    python replay.py headaway session.cbr --stats-json stats.json
+    python replay.py synthesize synthetic.cbr --seconds 60
+"""
+
+import argparse
+import json
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+
+from capture import FrameGrabber
+from recording import EYE_LANDMARKS, FACE_LANDMARKS, Recording, SessionRecorder
+
+REPLAY_FRAME_SIZE = (640, 480)  # Size of the blank frames fed through preprocessing for recordings
+REPLAY_BUFFER = 4
+
+
+def is_recording(path):
+    return Path(path).suffix == ".cbr"
+
+
+class RecordedFaceMesh:
+    """RoiFaceMesh stand-in returning the landmarks of the next recorded frame on every process()."""
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.position = 0
+        self.frames = 0
+        self.faces = 0
+
+    def process(self, rgb):
+        if self.position >= len(self.recording):
+            return None
+        record = self.recording.records[self.position:self.position + 1]
+        self.position += 1
+        self.frames += 1
+        if not record["flags"][0]:
+            return None
+        self.faces += 1
+        landmarks = self.recording.expand(record)[0]
+        if np.isnan(landmarks[FACE_LANDMARKS:, 0]).all():
+            return landmarks[:FACE_LANDMARKS]  # Recorded without iris rows: FaceMesh without refinement
+        return landmarks
+
+    def stats(self):
+        return {"frames": self.frames, "faces": self.faces, "source": str(self.recording.path)}
+
+    def close(self):
+        pass
+
+
+def recording_frames(recording, size=REPLAY_FRAME_SIZE):
+    """One blank BGR frame per recorded frame (the landmarks come from RecordedFaceMesh)."""
+    width, height = size
+    blank = np.zeros((height, width, 3), dtype=np.uint8)
+    for _ in range(len(recording)):
+        yield blank
+
+
+def recording_fps(recording):
+    if len(recording) < 2 or recording.duration <= 0:
+        return None
+    return (len(recording) - 1) / recording.duration
+
+
+def recorded_gaze(path):
+    """(t, gaze feature) of every face frame of a recording, as the trackers compute it."""
+    from calibration import gaze_feature
+    recording = Recording(path)
+    landmarks = recording.expand(recording.records)
+    face = recording.face_found
+    gaze = np.array([gaze_feature(points) for points in landmarks[face]]).reshape(-1, 2)
+    return np.asarray(recording.t[face], dtype=np.float64), gaze
+
+
+def open_replay(path, realtime=False):
+    """(grabber, face_mesh) for a video file or recording; face_mesh is None for videos."""
+    if is_recording(path):
+        recording = Recording(path)
+        grabber = FrameGrabber(recording_frames(recording), buffer_size=REPLAY_BUFFER, drop_stale=False,
+                               fps=recording_fps(recording), realtime=realtime)
+        return grabber, RecordedFaceMesh(recording)
+    grabber = FrameGrabber(str(path), buffer_size=REPLAY_BUFFER, drop_stale=False, realtime=realtime)
+    return grabber, None
+
+
+# --- Synthetic sessions ---
+def synthesize_recording(path, seconds=60.0, fps=30.0, blink_every=3.0, seed=0):
+    """
+    Write a recording of a face looking around the screen and blinking, for benchmarks.
+
+    Only the "eyes" landmark set is stored: the iris follows a Lissajous path, the eye
+    corners sit either side of it, and every blink_every seconds the eyelids close for
+    about 150 ms.
+    """
+    rng = np.random.default_rng(seed)
+    rest = np.zeros((max(EYE_LANDMARKS) + 1, 3), dtype=np.float32)
+    # Eye contour points relative to each eye centre (x offset, y offset when open)
+    right_eye = {33: (-0.03, 0.0), 160: (-0.01, -0.012), 158: (0.01, -0.012),
+                 133: (0.03, 0.0), 153: (0.01, 0.012), 144: (-0.01, 0.012)}
+    left_eye = {362: (-0.03, 0.0), 385: (-0.01, -0.012), 387: (0.01, -0.012),
+                263: (0.03, 0.0), 373: (0.01, 0.012), 380: (-0.01, 0.012)}
+    recorder = SessionRecorder(path, indices=EYE_LANDMARKS, source="synthetic",
+                               meta={"fps": fps}, queue_size=int(seconds * fps) + 16)
+    frames = int(seconds * fps)
+    for n in range(frames):
+        t = n / fps
+        cx = 0.5 + 0.15 * math.sin(t * 0.7)
+        cy = 0.45 + 0.1 * math.sin(t * 1.1)
+        closed = (t % blink_every) < 0.15
+        points = rest.copy()
+        for centre_x, eye in ((cx - 0.06, right_eye), (cx + 0.06, left_eye)):
+            for index, (dx, dy) in eye.items():
+                points[index] = (centre_x + dx, cy + (dy * 0.1 if closed else dy), 0.0)
+        for ring, centre_x in (((469, 470, 471, 472), cx - 0.06), ((474, 475, 476, 477), cx + 0.06)):
+            for index, dx in zip(ring, (0.004, 0.0, -0.004, 0.0)):
+                points[index] = (centre_x + dx, cy, 0.0)
+        points[145] = points[380]
+        points[159] = points[385]
+        points[:, :2] += rng.normal(0, 0.0005, (len(points), 2)).astype(np.float32)
+        recorder.frame(points, recorder.t0 + t, n)
+    recorder.close()
+    return recorder.stats()
+
+
+# --- headaway.py worker replay ---
+def replay_headaway(source, realtime=False):
+    """Run headaway.py's InferenceWorker over a replay source without Tk; returns stage stats."""
+    import headaway
+    from instrumentation import StageTimer
+
+    grabber, recorded_mesh = open_replay(source, realtime)
+    # The worker uses the module-level landmark source
+    headaway.face_mesh = recorded_mesh if recorded_mesh is not None else headaway.local_face_mesh()
+    timer = StageTimer(headaway.WORKER_STAGES)
+    worker = headaway.InferenceWorker(grabber.start(), headaway.GRID_SIZE, preview_fps=0,
+                                      queue_size=1024, timer=timer).start()
+    fixations = 0
+    while True:
+        kind, *payload = worker.results.get()
+        if kind == "eof":
+            break
+        if kind == "fixation":
+            fixations += 1
+            grabber.mark_done(payload[0])
+    worker.stop()
+    grabber.stop()
+    return dict(timer.summary(), fixations=fixations, gaze_events=worker.detector.stats(),
+                capture=grabber.stats(), inference=headaway.face_mesh.stats())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay tools for the tracking scripts.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("headaway", help="Drive headaway.py's inference worker from a video or recording.")
+    p.add_argument("source", help="Video file or .cbr recording.")
+    p.add_argument("--realtime", action="store_true", help="Pace at the recorded frame rate.")
+    p.add_argument("--stats-json", default=None, help="Write stage statistics to this file.")
+
+    p = sub.add_parser("synthesize", help="Write a synthetic .cbr recording.")
+    p.add_argument("path")
+    p.add_argument("--seconds", type=float, default=60.0)
+    p.add_argument("--fps", type=float, default=30.0)
+
+    args = parser.parse_args(argv)
+    if args.command == "synthesize":
+        print(json.dumps(synthesize_recording(args.path, args.seconds, args.fps)))
+        return 0
+
+    from instrumentation import peak_rss_bytes
+    start = time.perf_counter()
+    stats = replay_headaway(args.source, args.realtime)
+    stats.update(script="headaway.py", source=args.source, wall_s=time.perf_counter() - start,
+                 peak_rss_bytes=peak_rss_bytes())
+    text = json.dumps(stats, indent=2)
+    print(text)
+    if args.stats_json:
+        with open(args.stats_json, "w") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,28 +1,38 @@
 # server.py
 
 import subprocess
-import psutil
 import os
 import sys
+import time
 import secrets
 import logging
+import ipaddress
+import threading
 from pathlib import Path
 from functools import wraps
 from flask import (
     Flask, request, jsonify, send_from_directory, render_template,
-    session, redirect, url_for
+    session, redirect, url_for, Response, stream_with_context, g
 )
 from flask_cors import CORS
+from supervisor import Supervisor, RESTART_NEVER, RESTART_ON_FAILURE
+from telemetry import TelemetryHub
+from store import Store, StoreError, SESSION_KINDS
+from assets import Assets
+from zygote import PRELOAD, ZygoteLauncher, import_profile
+from instrumentation import METRICS_DIR_ENV, Metrics, read_snapshots, render_prometheus
+import psutil
 
 # --- Basic Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(name)s:%(message)s')
 log = logging.getLogger(__name__) # Use a logger instance
 
 app = Flask(__name__)
-# IMPORTANT: Use a strong, unpredictable secret key, ideally from environment variables
-app.secret_key = os.environ.get('FLASK_SECRET_KEY', secrets.token_hex(24))
 # Allow credentials (cookies) to be sent with requests from frontend origins
 CORS(app, supports_credentials=True, origins=["http://localhost:5000", "http://127.0.0.1:5000"]) # Adjust origins if needed
+# Content-hashed, precompressed copies of static/ served with immutable caching (see assets.py);
+# templates reference them through url_for('static', filename=...)
+assets = Assets(app)
 
 # --- Paths and Script Constants ---
 # Assumes server.py is at the root of your project directory
@@ -31,47 +41,173 @@ SCRIPT_HEADAWAY = "headaway.py"
 SCRIPT_EYETRACKING = "eyetracking.py"
 # Ensure this matches the actual filename for your Arduino script
 SCRIPT_ARDUINO = "arduino_control.py"
-ALLOWED_SCRIPTS = [SCRIPT_HEADAWAY, SCRIPT_EYETRACKING, SCRIPT_ARDUINO]
-
-# --- Mock User Database ---
-# !!! WARNING: Store hashed passwords in a real application !!!
-# Example: from werkzeug.security import generate_password_hash, check_password_hash
-USERS = {
-    "doctor@example.com": {
-        "password": "doctor123", # HASH ME: generate_password_hash("doctor123")
-        "name": "Dr. Jane Smith",
-        "role": "doctor"
-    },
-    "patient@example.com": {
-        "password": "patient123", # HASH ME: generate_password_hash("patient123")
-        "name": "John Doe",
-        "role": "patient"
-    }
+# Tracking daemon owning the camera and FaceMesh; started on demand for TRACKER_CLIENTS
+SCRIPT_TRACKERD = "trackerd.py"
+# On-screen gaze calibration; the trackers load the patient's result at startup
+SCRIPT_CALIBRATION = "calibration.py"
+ALLOWED_SCRIPTS = [SCRIPT_HEADAWAY, SCRIPT_EYETRACKING, SCRIPT_ARDUINO, SCRIPT_TRACKERD, SCRIPT_CALIBRATION]
+# Scripts that read landmarks from the tracker daemon instead of opening the camera themselves
+TRACKER_CLIENTS = {SCRIPT_HEADAWAY, SCRIPT_EYETRACKING, SCRIPT_CALIBRATION, SCRIPT_ARDUINO}
+TRACKER_IDLE_EXIT = 60  # Seconds without clients before the daemon releases the camera
+# Warm launcher: scripts are forked from an interpreter that has numpy, OpenCV and mediapipe
+# imported already (see zygote.py). CEREBLAID_ZYGOTE=0 starts every script from scratch.
+SCRIPT_ZYGOTE = "zygote.py"
+ZYGOTE_ENABLED = os.environ.get('CEREBLAID_ZYGOTE', '1') != '0' and os.name == 'posix'
+ZYGOTE_SCRIPTS = {SCRIPT_HEADAWAY, SCRIPT_EYETRACKING, SCRIPT_ARDUINO, SCRIPT_TRACKERD, SCRIPT_CALIBRATION}
+ZYGOTE_IDLE_EXIT = 3600  # Seconds without launches before the zygote gives its memory back
+# Scripts that record their results as a patient session (given --patient-id)
+SESSION_SCRIPTS = {SCRIPT_HEADAWAY, SCRIPT_EYETRACKING}
+# Scripts told which patient launched them (sessions, plus the per-patient calibration and
+# the Arduino control, which maps gaze with it)
+PATIENT_SCRIPTS = SESSION_SCRIPTS | {SCRIPT_CALIBRATION, SCRIPT_ARDUINO}
+# Background services are restarted if they crash; the game exits on purpose when finished
+RESTART_POLICIES = {
+    SCRIPT_HEADAWAY: RESTART_NEVER,
+    SCRIPT_EYETRACKING: RESTART_ON_FAILURE,
+    SCRIPT_ARDUINO: RESTART_ON_FAILURE,
+    SCRIPT_TRACKERD: RESTART_ON_FAILURE,
+    SCRIPT_CALIBRATION: RESTART_NEVER,
 }
+# PID files and launch locks shared by every server process
+RUN_DIR = Path(os.environ.get('CEREBLAID_RUN_DIR', OUTPUT_PATH / 'run'))
+# Size-rotated script output logs (stdout/stderr of every launched script)
+LOG_DIR = Path(os.environ.get('CEREBLAID_LOG_DIR', OUTPUT_PATH / 'logs'))
+# Session recordings (landmark frames + events), written only for launches that ask for one
+# ({"record": true}). Not inherited: a script would otherwise record every session into it.
+RECORD_DIR = Path(os.environ.pop('CEREBLAID_RECORD_DIR', OUTPUT_PATH / 'recordings'))
+RECORDING_SCRIPTS = {SCRIPT_EYETRACKING, SCRIPT_HEADAWAY}
+ZYGOTE_SOCKET = RUN_DIR / 'zygote.sock'
+# Metric snapshots of every server worker and tracker, merged by /metrics (CEREBLAID_METRICS=0 disables)
+METRICS_ENABLED = os.environ.get('CEREBLAID_METRICS', '1') != '0'
+METRICS_DIR = Path(os.environ.get(METRICS_DIR_ENV, RUN_DIR / 'metrics'))
+if METRICS_ENABLED:
+    os.environ[METRICS_DIR_ENV] = str(METRICS_DIR)  # Trackers only time their stages when this is set
+else:
+    os.environ.pop(METRICS_DIR_ENV, None)
+# /metrics names scripts, PIDs and failure details: it is served to logged-in doctors and to
+# scrapers connecting from these addresses (comma-separated IPs or networks, default loopback)
+METRICS_ALLOW = [ipaddress.ip_network(address.strip(), strict=False)
+                 for address in os.environ.get('CEREBLAID_METRICS_ALLOW', '127.0.0.1,::1').split(',')
+                 if address.strip()]
+REQUEST_METRIC = "cereblaid_http_request_seconds"
+HANDLER_STAGE_METRIC = "cereblaid_handler_stage_seconds"
+HANDLER_STAGE_HELP = "Time per stage of selected request handlers."
+SSE_KEEPALIVE_SECONDS = 15
+# Each open stream holds one of its worker's threads (gunicorn.conf.py threads): at most
+# SSE_MAX_STREAMS per worker, the rest are refused with 503 so ordinary requests still get
+# a thread. Streams end after SSE_MAX_STREAM_SECONDS and the browser reconnects (after
+# SSE_RETRY_MS), so a forgotten tab gives its thread back and load spreads across workers.
+SSE_MAX_STREAMS = int(os.environ.get('CEREBLAID_SSE_MAX_STREAMS',
+                                     max(1, int(os.environ.get('CEREBLAID_THREADS', 8)) // 2)))
+SSE_MAX_STREAM_SECONDS = 300
+SSE_RETRY_MS = 5000
+# SQLite database with users, patients and doctor-patient links (WAL mode, shared by all workers)
+DB_PATH = Path(os.environ.get('CEREBLAID_DB', OUTPUT_PATH / 'data' / 'cereblaid.db'))
+os.environ['CEREBLAID_DB'] = str(DB_PATH)  # Launched scripts write their session results here
+# Generated session signing key, used when FLASK_SECRET_KEY is not set (kept next to the database)
+SECRET_KEY_PATH = Path(os.environ.get('CEREBLAID_SECRET_FILE', DB_PATH.parent / 'secret_key'))
+PATIENT_PAGE_SIZE = 50
+RECENT_SESSIONS = 20  # Sessions listed in the doctor's patient details
+
+# --- Session Secret ---
+def load_secret_key(path):
+    """
+    FLASK_SECRET_KEY if set, else a random key generated once and kept in path.
+
+    Every gunicorn worker (and every restart) must sign session cookies with the same
+    key, or a login is only valid on the worker that handled it. The key is written to a
+    temporary file and hard-linked into place, so when several workers start at once
+    exactly one key wins and the others read it back.
+    """
+    key = os.environ.get('FLASK_SECRET_KEY')
+    if key:
+        return key
+    path = Path(path)
+    try:
+        return path.read_text().strip()
+    except FileNotFoundError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(tmp, path)  # Fails if another process created the key first
+        log.info(f"Generated a new session secret in {path}")
+    except FileExistsError:
+        pass
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path.read_text().strip()
+
+app.secret_key = load_secret_key(SECRET_KEY_PATH)
+
+# --- User Database ---
+# Passwords are stored as werkzeug hashes. An empty database gets the two demo accounts
+# (doctor@example.com / doctor123 and patient@example.com / patient123).
+store = Store(DB_PATH)
+store.ensure_demo_users()
+store.close()  # Connections are opened per thread on first use; a pre-forking parent must not hold one
+
+# --- Script Supervisor ---
+# Tracks the children this server launched (Popen handles + PID files with start-time
+# verification) instead of scanning every process on the host. Scripts are forked from
+# the zygote when it is up, and started with Popen otherwise.
+zygote_launcher = ZygoteLauncher(ZYGOTE_SOCKET, ZYGOTE_SCRIPTS)
+supervisor = Supervisor(RUN_DIR, log_dir=LOG_DIR, launcher=zygote_launcher if ZYGOTE_ENABLED else None)
+
+# --- Live Telemetry ---
+# Trackers publish gaze/blink/hit datagrams; the hub socket is bound lazily on the first
+# viewer so idle servers (and a pre-forking parent) hold no socket or thread.
+telemetry_hub = TelemetryHub(RUN_DIR)
+
+# --- Metrics ---
+# Request latency per endpoint and handler stage timings of this process. Each worker
+# writes a snapshot to METRICS_DIR every few seconds, so /metrics on any worker reports all.
+metrics = Metrics(enabled=METRICS_ENABLED)
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _remember_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def _record_request(exc):
+    """Runs after the response (including the session cookie) has been built."""
+    start = g.pop('request_start', None)
+    if start is None or not metrics.enabled:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    metrics.histogram(REQUEST_METRIC, "Time to build the response, per endpoint.",
+                      endpoint=endpoint, method=request.method).observe(time.perf_counter() - start)
+    metrics.counter("cereblaid_http_requests_total", "Requests handled, per endpoint and status.",
+                    endpoint=endpoint, status=g.get('response_status', 500)).inc()
+    if metrics.dump_due():
+        _set_process_gauges(metrics)
+        metrics.dump_if_due(METRICS_DIR / f"server.{os.getpid()}.json")
+
+
+def _set_process_gauges(registry):
+    """CPU time and RSS of this server process (one series per worker)."""
+    proc = psutil.Process()
+    with proc.oneshot():
+        cpu = proc.cpu_times()
+        registry.counter("cereblaid_server_cpu_seconds_total", "CPU time of the server process.",
+                         pid=proc.pid).set(cpu.user + cpu.system)
+        registry.gauge("cereblaid_server_resident_memory_bytes", "Resident memory of the server process.",
+                       pid=proc.pid).set(proc.memory_info().rss)
 
-# --- Helper Function ---
 def is_script_running(script_name):
-    """Checks if a script with the given name is likely running."""
-    script_full_path = str(OUTPUT_PATH / script_name)
-    python_exe = sys.executable # Get the path of the current python interpreter
-    try:
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            # Check if process info is accessible
-            if proc.info['cmdline']:
-                cmdline = proc.info['cmdline']
-                # Check if the command line involves the python interpreter and the target script path
-                if (python_exe in cmdline or 'python' in cmdline[0].lower()) and script_full_path in cmdline:
-                    log.debug(f"Found running process for {script_name}: PID {proc.info['pid']}, Cmdline: {' '.join(cmdline)}")
-                    return True
-    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess) as e:
-        log.warning(f"Error checking process list: {e}")
-        # Decide how to handle - conservatively assume it might be running? Or not?
-        # For now, assume not running if we can't check properly.
-        return False
-    except Exception as e:
-        log.error(f"Unexpected error in is_script_running: {e}", exc_info=True)
-        return False # Fail safe
-    return False
+    """Checks if a script with the given name is running (O(1) registry lookup)."""
+    return supervisor.is_running(script_name)
 
 
 # --- Authentication Decorators ---
@@ -142,6 +278,7 @@ def patient_home():
          log.warning(f"Non-patient user '{session.get('user')}' tried to access /home. Redirecting.")
          return redirect(url_for('landing_page'))
     log.debug(f"Serving patient home page for user '{session.get('user')}'")
+    _ensure_zygote()  # Warm up now, so the patient's first launch is already forked
     return render_template('index.html')
 
 @app.route('/doctor/dashboard')
@@ -164,11 +301,12 @@ def login():
         return jsonify({"success": False, "error": "Email and password required"}), 400
 
     log.info(f"Login attempt for email: {email}")
-    user_data = USERS.get(email)
+    with metrics.time(HANDLER_STAGE_METRIC, HANDLER_STAGE_HELP, handler='login', stage='authenticate'):
+        user_data = store.authenticate(email, password)
 
-    # !!! Replace with password hash check: check_password_hash(user_data['password'], password)
-    if user_data and user_data['password'] == password:
-        session['user'] = email
+    if user_data:
+        session['user'] = user_data['email']
+        session['user_id'] = user_data['id']
         session['name'] = user_data['name']
         session['role'] = user_data['role']
         session.permanent = True # Make session last longer (configure lifetime via app.permanent_session_lifetime)
@@ -203,23 +341,17 @@ def register():
         log.warning(f"Registration failed: Invalid role '{role}'.")
         return jsonify({"success": False, "error": "Invalid role specified"}), 400
 
-    if email in USERS:
-        log.warning(f"Registration failed: Email {email} already exists.")
-        return jsonify({"success": False, "error": "Email already registered"}), 400
-
     # Basic validation (add more as needed)
     if len(password) < 6:
          log.warning(f"Registration failed: Password too short for {email}.")
          return jsonify({"success": False, "error": "Password must be at least 6 characters long"}), 400
 
-    # !!! HASH the password securely before storing !!!
-    # from werkzeug.security import generate_password_hash
-    # hashed_password = generate_password_hash(password)
-    USERS[email] = {
-        "password": password, # Store the hash: hashed_password
-        "name": name,
-        "role": role
-    }
+    try:
+        store.create_user(email, password, name, role)
+    except StoreError as e:
+        # The UNIQUE index on email makes concurrent duplicate registrations fail here too
+        log.warning(f"Registration failed for {email}: {e}")
+        return jsonify({"success": False, "error": str(e)}), 400
     log.info(f"Registration successful for {email}, role: {role}")
     # Consider logging the user in immediately or requiring them to log in.
     # For now, require login after registration.
@@ -259,7 +391,128 @@ def check_auth():
         return jsonify({"authenticated": False}), 401 # Use 401 Unauthorized
 
 
+# --- Doctor Patient API ---
+def _current_doctor_id():
+    """Store id of the logged-in doctor (sessions from before the store lack user_id)."""
+    if 'user_id' not in session:
+        user = store.get_user(session['user'])
+        if user is None:
+            return None
+        session['user_id'] = user['id']
+    return session['user_id']
+
+
+@app.route('/api/doctor/patients', methods=['GET'])
+@doctor_required
+def doctor_patients():
+    """
+    One page of patients, ordered by name.
+
+    Query parameters: q (search text, prefix-matched against name and email words),
+    scope ('mine' = patients linked to this doctor, 'all' = every patient), limit and
+    cursor (the next_cursor of the previous page).
+    """
+    doctor_id = _current_doctor_id()
+    if doctor_id is None:
+        return jsonify({"success": False, "error": "Unknown user"}), 401
+    scope = request.args.get('scope', 'mine')
+    if scope not in ('mine', 'all'):
+        return jsonify({"success": False, "error": "scope must be 'mine' or 'all'"}), 400
+    try:
+        limit = int(request.args.get('limit', PATIENT_PAGE_SIZE))
+        patients, next_cursor = store.list_patients(
+            doctor_id if scope == 'mine' else None,
+            query=request.args.get('q', ''),
+            cursor=request.args.get('cursor') or None,
+            limit=limit,
+        )
+    except ValueError:
+        return jsonify({"success": False, "error": "limit must be an integer"}), 400
+    except StoreError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "patients": patients, "next_cursor": next_cursor})
+
+
+@app.route('/api/doctor/patients/<int:patient_id>', methods=['GET'])
+@doctor_required
+def doctor_patient_details(patient_id):
+    """Full record of one patient (the list endpoint only returns summary fields)."""
+    patient = store.get_patient(patient_id)
+    if patient is None:
+        return jsonify({"success": False, "error": "Patient not found"}), 404
+    patient['sessions'] = store.recent_sessions(patient_id, limit=RECENT_SESSIONS)
+    return jsonify({"success": True, "patient": patient})
+
+
+@app.route('/api/doctor/patients/<int:patient_id>/trends', methods=['GET'])
+@doctor_required
+def patient_trends(patient_id):
+    """
+    Session trends for one patient from the rollup tables.
+
+    Query parameters: period ('day', 'week' or 'month'), kind ('grid_game' or 'tracking')
+    and limit (number of most recent buckets, default 12).
+    """
+    period = request.args.get('period', 'week')
+    kind = request.args.get('kind', 'grid_game')
+    if kind not in SESSION_KINDS:
+        return jsonify({"success": False, "error": f"kind must be one of {', '.join(SESSION_KINDS)}"}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 12)), 366))
+        buckets = store.session_trends(patient_id, kind, period, limit=limit)
+    except ValueError:
+        return jsonify({"success": False, "error": "limit must be an integer"}), 400
+    except StoreError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "period": period, "kind": kind, "buckets": buckets})
+
+
+@app.route('/api/doctor/patients/<int:patient_id>/link', methods=['POST'])
+@doctor_required
+def link_patient(patient_id):
+    """Adds a patient to the logged-in doctor's list (idempotent)."""
+    doctor_id = _current_doctor_id()
+    if doctor_id is None or not store.link_patient(doctor_id, patient_id):
+        return jsonify({"success": False, "error": "Patient not found"}), 404
+    log.info(f"Doctor '{session.get('user')}' linked patient {patient_id}.")
+    return jsonify({"success": True})
+
+
 # --- Script Running API ---
+def _ensure_zygote():
+    """Start the warm launcher under the supervisor unless it is running (or disabled)."""
+    if not ZYGOTE_ENABLED:
+        return None
+    try:
+        managed, already_running = supervisor.start(
+            SCRIPT_ZYGOTE,
+            [sys.executable, str(OUTPUT_PATH / SCRIPT_ZYGOTE), 'serve', '--socket', str(ZYGOTE_SOCKET),
+             '--idle-exit', str(ZYGOTE_IDLE_EXIT)],
+            restart_policy=RESTART_ON_FAILURE,
+            cwd=OUTPUT_PATH
+        )
+    except OSError:
+        log.exception("Could not start the zygote; scripts will be started from scratch")
+        return None
+    if not already_running:
+        log.info(f"Started {SCRIPT_ZYGOTE} (PID: {managed.pid})")
+    return managed
+
+
+def _ensure_tracker_daemon(python_exe):
+    """Start trackerd.py under the supervisor unless it is already running."""
+    managed, already_running = supervisor.start(
+        SCRIPT_TRACKERD,
+        [python_exe, str(OUTPUT_PATH / SCRIPT_TRACKERD), 'serve', '--idle-exit', str(TRACKER_IDLE_EXIT)],
+        restart_policy=RESTART_POLICIES[SCRIPT_TRACKERD],
+        cwd=OUTPUT_PATH,
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    )
+    if not already_running:
+        log.info(f"API run-script: started {SCRIPT_TRACKERD} (PID: {managed.pid})")
+    return managed
+
+
 @app.route('/api/run-script', methods=['POST'])
 @login_required # Only logged-in users can run scripts
 def run_script():
@@ -283,19 +536,20 @@ def run_script():
         log.error(f"API run-script: Script file not found at: {script_path}")
         return jsonify({"success": False, "error": f"Script '{script_name}' not found on server."}), 404
 
-    # --- Check if script is already running ---
-    if is_script_running(script_name):
-         log.info(f"API run-script: {script_name} is already running (requested by '{user_email}').")
-         return jsonify({"success": True, "already_running": True, "message": f"{script_name} is already running."})
-
     try:
         # --- Use the *correct* Python executable (the one running Flask) ---
         python_exe = sys.executable
         log.info(f"API run-script: Using Python interpreter: {python_exe}")
 
+        # Launched from scratch while the zygote is still importing; forked from it after that
+        with metrics.time(HANDLER_STAGE_METRIC, HANDLER_STAGE_HELP, handler='run_script', stage='zygote'):
+            _ensure_zygote()
+
         command = [python_exe, str(script_path)]
+        if script_name == SCRIPT_TRACKERD:
+            command += ['serve', '--idle-exit', str(TRACKER_IDLE_EXIT)]
 
-        # --- Add --headless for eyetracking (Modify script to accept it!) ---
+        # --- Add --headless for eyetracking (no preview window, drawing or GUI polling) ---
         if script_name == SCRIPT_EYETRACKING:
             command.append('--headless')
             log.info("API run-script: Adding --headless argument for eyetracking.py")
@@ -304,6 +558,23 @@ def run_script():
         # if script_name == SCRIPT_HEADAWAY:
         #     command.append('--some-non-interactive-flag')
 
+        # --- Trackers attach to the shared daemon (started here if needed) ---
+        # The daemon keeps the camera and model loaded, so the game and the eye tracker can
+        # run side by side and each launch skips the model load and camera warm-up.
+        if script_name in TRACKER_CLIENTS:
+            with metrics.time(HANDLER_STAGE_METRIC, HANDLER_STAGE_HELP, handler='run_script', stage='tracker_daemon'):
+                _ensure_tracker_daemon(python_exe)
+            command += ['--tracker', 'shared']
+
+        # --- Sessions and calibrations of a patient are stored against that patient ---
+        if script_name in PATIENT_SCRIPTS and session.get('role') == 'patient' and session.get('user_id'):
+            command += ['--patient-id', str(session['user_id'])]
+
+        # --- Session recording is opt-in per launch ---
+        if data.get('record') and script_name in RECORDING_SCRIPTS:
+            from recording import session_path
+            command += ['--record', str(session_path(RECORD_DIR, script_name))]
+
         log.info(f"API run-script: Attempting to start: {' '.join(command)}")
         log.info(f"API run-script: Working directory: {OUTPUT_PATH}")
 
@@ -311,40 +582,34 @@ def run_script():
         # Use CREATE_NO_WINDOW on Windows to prevent brief console flashes
         creation_flags = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
 
-        process = subprocess.Popen(
-            command,
-            cwd=OUTPUT_PATH,
-            stdout=subprocess.PIPE, # Capture output for potential later logging/debugging
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            creationflags=creation_flags
-        )
-
-        # --- Check for Immediate Failure ---
-        # Give the process a very short time to potentially fail on startup
-        try:
-             stdout, stderr = process.communicate(timeout=0.75) # Check for immediate exit/error (adjust timeout slightly if needed)
-
-             # If communicate() finishes, the process terminated very quickly. Check return code.
-             if process.returncode is not None and process.returncode != 0:
-                 log.error(f"API run-script: {script_name} failed immediately on launch. PID: {process.pid}, Code: {process.returncode}")
-                 log.error(f"API run-script: {script_name} STDERR:\n{stderr.strip()}")
-                 return jsonify({
-                     "success": False,
-                     "error": f"{script_name} failed to start properly.",
-                     "details": stderr.strip() if stderr else "No specific error output captured on immediate exit."
-                 }), 500
-             else:
-                 # Script finished extremely quickly without error (maybe intended?)
-                 log.warning(f"API run-script: {script_name} finished very quickly. PID: {process.pid}, Code: {process.returncode}")
-                 return jsonify({"success": True, "message": f"{script_name} started (and finished almost immediately).", "pid": process.pid})
-
-        except subprocess.TimeoutExpired:
-             # This is the EXPECTED successful path for scripts running in the background
-             log.info(f"API run-script: {script_name} started successfully in background (PID: {process.pid}).")
-             return jsonify({"success": True, "message": f"{script_name} started successfully.", "pid": process.pid})
+        # The supervisor serialises launches of the same script (also across server
+        # processes), so two concurrent requests can never start it twice. Output is
+        # drained into a ring buffer + rotated log file by the supervisor.
+        with metrics.time(HANDLER_STAGE_METRIC, HANDLER_STAGE_HELP, handler='run_script', stage='spawn'):
+            managed, already_running = supervisor.start(
+                script_name,
+                command,
+                restart_policy=RESTART_POLICIES.get(script_name, RESTART_NEVER),
+                cwd=OUTPUT_PATH,
+                creationflags=creation_flags
+            )
+        if already_running:
+            log.info(f"API run-script: {script_name} is already running (requested by '{user_email}').")
+            return jsonify({"success": True, "already_running": True, "pid": managed.pid,
+                            "message": f"{script_name} is already running."})
+
+        # --- Return immediately ---
+        # The "failed during startup" check runs asynchronously in the supervisor; clients
+        # follow it via /api/script-status/<script> ("startup" field) or the log stream.
+        log.info(f"API run-script: {script_name} launched in background (PID: {managed.pid}).")
+        return jsonify({
+            "success": True,
+            "message": f"{script_name} started successfully.",
+            "pid": managed.pid,
+            "startup": managed.startup,
+            "status_url": url_for('script_status', script_name=script_name),
+            "log_stream_url": url_for('stream_script_log', script_name=script_name)
+        })
 
     except FileNotFoundError:
         # This usually means python_exe wasn't found, less likely with sys.executable
@@ -360,6 +625,301 @@ def run_script():
         return jsonify({"success": False, "error": f"An unexpected server error occurred: {str(e)}"}), 500
 
 
+@app.route('/api/stop-script', methods=['POST'])
+@login_required
+def stop_script():
+    """Stops a script started through /api/run-script."""
+    data = request.json
+    script_name = data.get('script')
+    user_email = session.get('user', 'Unknown')
+
+    if script_name not in ALLOWED_SCRIPTS:
+        log.warning(f"API stop-script: Invalid script name '{script_name}' requested by '{user_email}'.")
+        return jsonify({"success": False, "error": "Invalid script name"}), 400
+
+    log.info(f"User '{user_email}' requested to stop script: {script_name}")
+    if not supervisor.stop(script_name):
+        return jsonify({"success": False, "error": f"{script_name} is not running."}), 404
+    return jsonify({"success": True, "message": f"{script_name} stopped.", "status": supervisor.status(script_name)})
+
+
+@app.route('/api/script-status/<script_name>', methods=['GET'])
+@login_required
+def script_status(script_name):
+    """Returns the supervisor status of one script."""
+    if script_name not in ALLOWED_SCRIPTS:
+        return jsonify({"success": False, "error": "Invalid script name"}), 400
+    status = supervisor.status(script_name)
+    if status is None:
+        return jsonify({"success": True, "status": {"script": script_name, "running": False}})
+    return jsonify({"success": True, "status": status})
+
+
+@app.route('/api/scripts', methods=['GET'])
+@login_required
+def list_scripts():
+    """Lists every script known to the supervisor."""
+    return jsonify({"success": True, "scripts": supervisor.list()})
+
+
+_import_profile = None
+_import_profile_lock = threading.Lock()
+
+
+@app.route('/api/importtime', methods=['GET'])
+@login_required
+def importtime():
+    """
+    Where a script launched from scratch spends its import time: the -X importtime
+    breakdown of the modules the zygote preloads (measured once per server process in a
+    fresh interpreter, ?refresh=1 to measure again), next to the zygote's own timings.
+    """
+    global _import_profile
+    top = min(request.args.get('top', 30, type=int), 500)
+    with _import_profile_lock:
+        if _import_profile is None or request.args.get('refresh') == '1':
+            try:
+                _import_profile = import_profile(PRELOAD, python=sys.executable, cwd=OUTPUT_PATH)
+            except (OSError, subprocess.SubprocessError) as e:
+                log.exception("API importtime: profiling failed")
+                return jsonify({"success": False, "error": f"Import profiling failed: {e}"}), 500
+        profile = _import_profile
+    imports = profile["imports"]
+    return jsonify({
+        "success": True,
+        "wall_ms": profile["wall_ms"],
+        "total_ms": profile["total_ms"],
+        "top_level": [entry for entry in imports if entry["depth"] == 0],
+        "slowest": sorted(imports, key=lambda entry: entry["self_ms"], reverse=True)[:top],
+        "zygote": zygote_launcher.status() if ZYGOTE_ENABLED else None,
+    })
+
+
+@app.route('/api/launches', methods=['GET'])
+@login_required
+def launches():
+    """How each known script was launched (zygote or from scratch) and its time to first frame."""
+    return jsonify({
+        "success": True,
+        "zygote_enabled": ZYGOTE_ENABLED,
+        "zygote_ready": ZYGOTE_ENABLED and zygote_launcher.available(),
+        "scripts": [{"script": status["script"], "running": status["running"], "pid": status["pid"],
+                     "launcher": status.get("launcher"), "started_at": status["started_at"],
+                     "first_frame_ms": status.get("reported", {}).get("first_frame_ms")}
+                    for status in supervisor.list() if status["script"] != SCRIPT_ZYGOTE],
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus text exposition: request and handler timings of every server worker,
+    tracker stage histograms, and CPU/RSS of every supervised script.
+    """
+    if not METRICS_ENABLED:
+        return jsonify({"success": False, "error": "Metrics are disabled"}), 404
+    if session.get('role') != 'doctor' and not _metrics_client_allowed(request.remote_addr):
+        log.warning(f"Refused /metrics to {request.remote_addr} (not in CEREBLAID_METRICS_ALLOW, not a doctor)")
+        return jsonify({"success": False, "error": "Forbidden"}), 403
+    _set_process_gauges(metrics)
+    snapshots = [metrics.snapshot(), *read_snapshots(METRICS_DIR, exclude_pid=os.getpid()),
+                 _script_snapshot()]
+    return Response(render_prometheus(snapshots), mimetype='text/plain; version=0.0.4; charset=utf-8',
+                    headers={'Cache-Control': 'no-store'})
+
+
+def _metrics_client_allowed(address):
+    try:
+        address = ipaddress.ip_address(address or '')
+    except ValueError:
+        return False
+    address = getattr(address, 'ipv4_mapped', None) or address  # ::ffff:127.0.0.1 on dual-stack binds
+    return any(address in network for network in METRICS_ALLOW)
+
+
+def _script_snapshot():
+    """Resource usage of the supervised scripts (including other workers' children), read now."""
+    registry = Metrics()
+    for status in supervisor.list():
+        script = status["script"]
+        registry.gauge("cereblaid_script_up", "1 if the script is running.", script=script).set(status["running"])
+        registry.counter("cereblaid_script_restarts_total", "Restarts by the supervisor.",
+                         script=script).set(status["restarts"])
+        first_frame_ms = status.get("reported", {}).get("first_frame_ms")
+        if first_frame_ms is not None:
+            registry.gauge("cereblaid_script_first_frame_seconds", "Launch to first processed frame.",
+                           script=script).set(first_frame_ms / 1000)
+        if not status["running"]:
+            continue
+        try:
+            proc = psutil.Process(status["pid"])
+            with proc.oneshot():
+                cpu = proc.cpu_times()
+                rss = proc.memory_info().rss
+                threads = proc.num_threads()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        registry.counter("cereblaid_script_cpu_seconds_total", "CPU time (user + system) of the script.",
+                         script=script).set(cpu.user + cpu.system)
+        registry.gauge("cereblaid_script_resident_memory_bytes", "Resident memory of the script.",
+                       script=script).set(rss)
+        registry.gauge("cereblaid_script_threads", "Threads of the script.", script=script).set(threads)
+    return registry.snapshot()
+
+
+@app.route('/api/script-log/<script_name>', methods=['GET'])
+@login_required
+def script_log(script_name):
+    """Returns the most recent output lines of a script."""
+    if script_name not in ALLOWED_SCRIPTS:
+        return jsonify({"success": False, "error": "Invalid script name"}), 400
+    lines = min(request.args.get('lines', 200, type=int), 2000)
+    output = supervisor.output(script_name)
+    if output is None:
+        # Launched by another server process: fall back to the shared log file
+        return jsonify({"success": True, "lines": _tail_file(supervisor.log_path(script_name), lines)})
+    return jsonify({"success": True, "lines": output.tail(lines)})
+
+
+def _tail_file(path, lines):
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return [line.rstrip('\n') for line in f.readlines()[-lines:]]
+    except OSError:
+        return []
+
+
+def _sse(data, event=None, event_id=None):
+    """Formats one Server-Sent Event (multi-line data is split per the SSE spec)."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {part}" for part in str(data).split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+_stream_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+
+def _reserve_stream():
+    """Takes one of this worker's stream slots; returns a 503 response instead when none is free."""
+    if _stream_slots.acquire(blocking=False):
+        return None
+    log.warning(f"Refused a stream for '{session.get('user')}': {SSE_MAX_STREAMS} streams already open")
+    return (jsonify({"success": False, "error": "Too many open streams, retry shortly."}), 503,
+            {'Retry-After': str(SSE_RETRY_MS // 1000)})
+
+
+def _event_stream(generator):
+    """SSE response for a reserved slot: released when the response closes, ended after SSE_MAX_STREAM_SECONDS."""
+    def bounded():
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            for chunk in generator:
+                yield chunk
+                if time.monotonic() >= deadline:
+                    return
+        finally:
+            generator.close()
+
+    response = Response(stream_with_context(bounded()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(_stream_slots.release)
+    return response
+
+
+@app.route('/api/script-log/<script_name>/stream', methods=['GET'])
+@login_required
+def stream_script_log(script_name):
+    """Streams a running script's output as Server-Sent Events (resumable via Last-Event-ID)."""
+    if script_name not in ALLOWED_SCRIPTS:
+        return jsonify({"success": False, "error": "Invalid script name"}), 400
+    output = supervisor.output(script_name)
+    last_id = request.headers.get('Last-Event-ID', request.args.get('since', -1))
+    try:
+        last_id = int(last_id)
+    except ValueError:
+        last_id = -1
+    busy = _reserve_stream()
+    if busy is not None:
+        return busy
+
+    def from_buffer():
+        seq = last_id
+        while True:
+            for entry_seq, stream, line in output.since(seq):
+                seq = entry_seq
+                yield _sse(line, event=stream, event_id=entry_seq)
+            if not output.wait(seq, timeout=SSE_KEEPALIVE_SECONDS):
+                yield ": keepalive\n\n"
+
+    def from_file():
+        # Script owned by another server process: follow its log file
+        path = supervisor.log_path(script_name)
+        position = path.stat().st_size if path.exists() else 0
+        idle = 0.0
+        while True:
+            try:
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    f.seek(position)
+                    chunk = f.read()
+                    position = f.tell()
+            except OSError:
+                chunk = ''
+            for line in chunk.splitlines():
+                yield _sse(line, event='log')
+            if chunk:
+                idle = 0.0
+            else:
+                time.sleep(0.25)
+                idle += 0.25
+                if idle >= SSE_KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+
+    return _event_stream(from_buffer() if output is not None else from_file())
+
+
+@app.route('/api/telemetry/stream', methods=['GET'])
+@login_required
+def stream_telemetry():
+    """Streams live tracker telemetry as Server-Sent Events.
+
+    Query parameters: max_hz (gaze samples per second per source, default 15) and
+    source (repeatable; e.g. eyetracking.py). Non-gaze events are never downsampled.
+    """
+    if not telemetry_hub.ensure_started():
+        return jsonify({"success": False, "error": "Live telemetry is not available on this server."}), 503
+    max_hz = request.args.get('max_hz', 15, type=float)
+    sources = request.args.getlist('source') or None
+    busy = _reserve_stream()
+    if busy is not None:
+        return busy
+    log.info(f"Telemetry viewer connected: user '{session.get('user')}', max_hz={max_hz}, sources={sources}")
+
+    def generate():
+        # Subscribed once streaming starts, so a response closed before that leaves nothing behind
+        subscription = telemetry_hub.subscribe(max_hz=max_hz if max_hz > 0 else None, sources=sources)
+        try:
+            # Latest known state first so a new viewer does not start blank
+            for (source, kind), payload in list(telemetry_hub.latest.items()):
+                if sources is None or source in sources:
+                    yield _sse(payload, event=kind)
+            while True:
+                items = subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if not items:
+                    yield ": keepalive\n\n"
+                for kind, payload in items:
+                    yield _sse(payload, event=kind)
+        finally:
+            telemetry_hub.unsubscribe(subscription)
+
+    return _event_stream(generate())
+
+
 # --- Static Files Route (Optional - Flask usually handles this) ---
 # If you have issues with static files, uncommenting this might help sometimes,
 # but usually it's automatic if the 'static' folder is present.
@@ -385,5 +945,5 @@ if __name__ == '__main__':
 
     log.info("Starting Flask development server...")
     log.warning("DEBUG MODE IS ON. Do not use in production.")
-    # Use debug=False and a production WSGI server (like Gunicorn or Waitress) for deployment
+    # For deployment run several workers under gunicorn instead: gunicorn -c gunicorn.conf.py server:app
     app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
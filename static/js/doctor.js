@@ -3,6 +3,7 @@ document.addEventListener('DOMContentLoaded', function () {
     const doctorNameDisplay = document.getElementById('doctor-name-display');
     const logoutBtn = document.getElementById('logout-btn');
     const patientSearchInput = document.getElementById('patient-search-input');
+    const patientScopeSelect = document.getElementById('patient-scope-select');
     const patientListUl = document.getElementById('patient-list-ul');
     const loadingPatientsLi = document.getElementById('loading-patients');
     const noPatientSelectedDiv = document.getElementById('no-patient-selected');
@@ -17,19 +18,38 @@ document.addEventListener('DOMContentLoaded', function () {
     const detailsMedicalHistory = document.getElementById('details-medical-history');
     const detailsSessionListTbody = document.getElementById('details-session-list');
     const startSessionBtn = document.getElementById('start-session-btn');
+    const trendKindSelect = document.getElementById('trend-kind-select');
+    const trendPeriodSelect = document.getElementById('trend-period-select');
+    const trendMetricHeader = document.getElementById('trend-metric-header');
+    const trendListTbody = document.getElementById('trend-list');
+
+    // Live tracking fields
+    const liveGazeDot = document.getElementById('live-gaze-dot');
+    const liveSource = document.getElementById('live-source');
+    const liveGaze = document.getElementById('live-gaze');
+    const liveEvent = document.getElementById('live-event');
 
     // --- State ---
-    let allPatientsData = [];
-    let selectedPatientEmail = null;
+    // The server pages and searches the patient list; only loaded pages are kept here
+    let loadedPatients = [];
+    let nextCursor = null;
+    let selectedPatient = null;
+    let listRequest = null; // AbortController of the in-flight list request
+    let searchTimer = null;
+    const SEARCH_DEBOUNCE_MS = 200;
 
     // --- Initialization ---
     checkAuthenticationAndRole('doctor');
     fetchAndDisplayPatients();
+    startLiveTelemetry();
 
     // --- Event Listeners ---
     logoutBtn?.addEventListener('click', logout);
     patientSearchInput?.addEventListener('input', handleSearch);
+    patientScopeSelect?.addEventListener('change', () => fetchAndDisplayPatients());
     startSessionBtn?.addEventListener('click', startPatientSession);
+    trendKindSelect?.addEventListener('change', () => selectedPatient && fetchTrends(selectedPatient.id));
+    trendPeriodSelect?.addEventListener('change', () => selectedPatient && fetchTrends(selectedPatient.id));
 
     // --- Auth Check ---
     async function checkAuthenticationAndRole(requiredRole = null) {
@@ -54,18 +74,31 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 
     // --- Fetch Patients ---
-    async function fetchAndDisplayPatients() {
+    // append=false starts a new list (new search/scope); append=true loads the next page
+    async function fetchAndDisplayPatients(append = false) {
+        listRequest?.abort(); // A newer search supersedes any request still in flight
+        const controller = new AbortController();
+        listRequest = controller;
+
+        const params = new URLSearchParams({
+            q: patientSearchInput?.value.trim() || '',
+            scope: patientScopeSelect?.value || 'mine',
+        });
+        if (append && nextCursor) params.set('cursor', nextCursor);
+
         try {
-            const res = await fetch('/api/doctor/patients');
+            const res = await fetch(`/api/doctor/patients?${params}`, { signal: controller.signal });
             const data = await res.json();
             if (res.ok && data.success && Array.isArray(data.patients)) {
-                allPatientsData = data.patients;
-                populatePatientList(allPatientsData);
+                loadedPatients = append ? loadedPatients.concat(data.patients) : data.patients;
+                nextCursor = data.next_cursor;
+                populatePatientList(loadedPatients);
                 loadingPatientsLi?.remove();
             } else {
-                showError("Error loading patients.");
+                showError(data.error || "Error loading patients.");
             }
         } catch (err) {
+            if (err.name === 'AbortError') return;
             console.error('Fetch error:', err);
             showError("Error loading patients.");
         }
@@ -87,25 +120,42 @@ document.addEventListener('DOMContentLoaded', function () {
             return;
         }
 
+        const fragment = document.createDocumentFragment();
         patients.forEach(patient => {
             const li = document.createElement('li');
             li.textContent = patient.name;
-            li.dataset.email = patient.email;
-            if (patient.email === selectedPatientEmail) li.classList.add('active');
-            li.addEventListener('click', () => selectPatient(patient.email));
-            patientListUl.appendChild(li);
+            li.dataset.id = patient.id;
+            if (selectedPatient && patient.id === selectedPatient.id) li.classList.add('active');
+            li.addEventListener('click', () => selectPatient(patient.id));
+            fragment.appendChild(li);
         });
+        if (nextCursor) {
+            const more = document.createElement('li');
+            more.textContent = 'Load more...';
+            more.classList.add('load-more');
+            more.addEventListener('click', () => fetchAndDisplayPatients(true));
+            fragment.appendChild(more);
+        }
+        patientListUl.appendChild(fragment);
     }
 
     // --- Select Patient ---
-    function selectPatient(email) {
-        selectedPatientEmail = email;
-        populatePatientList(filterPatients(patientSearchInput.value));
-        const patient = allPatientsData.find(p => p.email === email);
-        if (patient) {
-            displayPatientDetails(patient);
-        } else {
-            console.error("Patient not found:", email);
+    async function selectPatient(id) {
+        patientListUl.querySelector('li.active')?.classList.remove('active');
+        patientListUl.querySelector(`li[data-id="${id}"]`)?.classList.add('active');
+        try {
+            const res = await fetch(`/api/doctor/patients/${id}`);
+            const data = await res.json();
+            if (res.ok && data.success) {
+                selectedPatient = data.patient;
+                displayPatientDetails(selectedPatient);
+                fetchTrends(selectedPatient.id);
+            } else {
+                console.error("Patient not found:", id);
+                hidePatientDetails();
+            }
+        } catch (err) {
+            console.error('Fetch error:', err);
             hidePatientDetails();
         }
     }
@@ -126,51 +176,144 @@ document.addEventListener('DOMContentLoaded', function () {
         if (Array.isArray(patient.sessions) && patient.sessions.length > 0) {
             patient.sessions.forEach(session => {
                 const row = detailsSessionListTbody.insertRow();
-                row.insertCell().textContent = session.date || 'N/A';
-                row.insertCell().textContent = session.duration || 'N/A';
-                row.insertCell().textContent = session.notes || 'N/A';
+                row.insertCell().textContent = new Date(session.started * 1000).toLocaleString();
+                row.insertCell().textContent = formatDuration(session.duration);
+                row.insertCell().textContent = describeSession(session);
             });
         } else {
             detailsSessionListTbody.innerHTML = '<tr><td colspan="3">No session records.</td></tr>';
         }
     }
 
+    function formatDuration(seconds) {
+        const minutes = Math.floor(seconds / 60);
+        return minutes ? `${minutes} min ${Math.round(seconds % 60)} s` : `${Math.round(seconds)} s`;
+    }
+
+    function describeSession(session) {
+        if (session.kind === 'grid_game') {
+            const accuracy = session.accuracy == null ? 'N/A' : `${session.accuracy.toFixed(1)}%`;
+            return `Grid game: ${session.hits} hits in ${session.attempts} attempts, accuracy ${accuracy}`;
+        }
+        const tracked = session.frames ? Math.round(100 * session.face_frames / session.frames) : 0;
+        return `Eye tracking: face tracked ${tracked}% of the time, ${session.blinks} blink clicks`;
+    }
+
+    // --- Progress Trends ---
+    // Served from per-day/week/month rollups, so this is cheap however many sessions exist
+    async function fetchTrends(patientId) {
+        const kind = trendKindSelect?.value || 'grid_game';
+        const period = trendPeriodSelect?.value || 'week';
+        try {
+            const res = await fetch(`/api/doctor/patients/${patientId}/trends?kind=${kind}&period=${period}`);
+            const data = await res.json();
+            if (!selectedPatient || selectedPatient.id !== patientId) return; // Selection changed meanwhile
+            if (res.ok && data.success) {
+                displayTrends(data.buckets, kind, period);
+            } else {
+                trendListTbody.innerHTML = `<tr><td colspan="4">${data.error || 'Error loading trends.'}</td></tr>`;
+            }
+        } catch (err) {
+            console.error('Trend fetch error:', err);
+        }
+    }
+
+    function displayTrends(buckets, kind, period) {
+        trendMetricHeader.textContent = kind === 'grid_game' ? 'Accuracy' : 'Face tracked';
+        trendListTbody.innerHTML = '';
+        if (!buckets.length) {
+            trendListTbody.innerHTML = '<tr><td colspan="4">No sessions yet.</td></tr>';
+            return;
+        }
+        const labelOptions = period === 'month' ? { year: 'numeric', month: 'short' }
+                                                : { year: 'numeric', month: 'short', day: 'numeric' };
+        buckets.slice().reverse().forEach(bucket => {
+            const value = kind === 'grid_game' ? bucket.accuracy : (bucket.face_rate ?? 0) * 100;
+            const row = trendListTbody.insertRow();
+            const label = new Date(bucket.bucket * 1000).toLocaleDateString(undefined, { ...labelOptions, timeZone: 'UTC' });
+            row.insertCell().textContent = period === 'week' ? `Week of ${label}` : label;
+            row.insertCell().textContent = bucket.sessions;
+
+            const valueCell = row.insertCell();
+            if (value == null) {
+                valueCell.textContent = 'N/A';
+            } else {
+                const bar = document.createElement('span');
+                bar.className = 'trend-bar';
+                bar.style.width = `${Math.round(Math.min(Math.max(value, 0), 100) * 0.6)}px`;
+                valueCell.append(bar, `${value.toFixed(1)}%`);
+            }
+
+            const changeCell = row.insertCell();
+            const change = bucket.accuracy_change;
+            if (kind === 'grid_game' && change != null) {
+                changeCell.textContent = `${change >= 0 ? '+' : ''}${change.toFixed(1)}`;
+                changeCell.className = change >= 0 ? 'trend-up' : 'trend-down';
+            } else {
+                changeCell.textContent = '-';
+            }
+        });
+    }
+
     // --- Hide Patient Details ---
     function hidePatientDetails() {
-        selectedPatientEmail = null;
+        selectedPatient = null;
         noPatientSelectedDiv.classList.add('active');
         patientInfoContentDiv.classList.remove('active');
-        populatePatientList(filterPatients(patientSearchInput.value));
+        patientListUl.querySelector('li.active')?.classList.remove('active');
     }
 
     // --- Handle Search ---
+    // Searching happens server-side; wait for a pause in typing before asking
     function handleSearch() {
-        const filtered = filterPatients(patientSearchInput.value);
-        populatePatientList(filtered);
-        if (selectedPatientEmail && !filtered.some(p => p.email === selectedPatientEmail)) {
-            hidePatientDetails();
-        }
-    }
-
-    function filterPatients(term) {
-        const search = term.toLowerCase().trim();
-        return !search ? allPatientsData : allPatientsData.filter(p =>
-            p.name.toLowerCase().includes(search) || p.email.toLowerCase().includes(search)
-        );
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => fetchAndDisplayPatients(), SEARCH_DEBOUNCE_MS);
     }
 
     // --- Start Session ---
-    function startPatientSession() {
-        if (!selectedPatientEmail) {
+    async function startPatientSession() {
+        if (!selectedPatient) {
             alert("Please select a patient first.");
             return;
         }
-        const patient = allPatientsData.find(p => p.email === selectedPatientEmail);
-        if (patient) {
-            window.location.href = `/home?patient_email=${encodeURIComponent(patient.email)}&patient_name=${encodeURIComponent(patient.name)}`;
-        } else {
-            alert("Patient not found. Please re-select.");
+        const patient = selectedPatient;
+        try {
+            // Starting a session adds the patient to this doctor's list
+            await fetch(`/api/doctor/patients/${patient.id}/link`, { method: 'POST' });
+        } catch (err) {
+            console.warn('Could not link patient:', err);
         }
+        window.location.href = `/home?patient_email=${encodeURIComponent(patient.email)}&patient_name=${encodeURIComponent(patient.name)}`;
+    }
+
+    // --- Live Telemetry ---
+    function startLiveTelemetry() {
+        if (!window.EventSource || !liveGazeDot) return;
+        // Gaze is downsampled server-side; blink/hit events always come through
+        const source = new EventSource('/api/telemetry/stream?max_hz=15');
+
+        source.addEventListener('gaze', (e) => {
+            const sample = JSON.parse(e.data);
+            liveSource.textContent = sample.src;
+            liveGaze.textContent = `x ${sample.x.toFixed(2)}, y ${sample.y.toFixed(2)}`;
+            liveGazeDot.style.left = `${Math.min(Math.max(sample.x, 0), 1) * 100}%`;
+            liveGazeDot.style.top = `${Math.min(Math.max(sample.y, 0), 1) * 100}%`;
+            liveGazeDot.style.display = 'block';
+        });
+        source.addEventListener('blink', (e) => showLiveEvent(JSON.parse(e.data), data => data.gesture.replace('_', ' ')));
+        source.addEventListener('hit', (e) => showLiveEvent(JSON.parse(e.data), data => `target hit (${data.hits} hits / ${data.attempts} attempts)`));
+        source.addEventListener('game_end', (e) => showLiveEvent(JSON.parse(e.data), data => `game over, accuracy ${data.accuracy}%`));
+        source.onerror = () => {
+            console.warn('Live telemetry connection lost, retrying...');
+            // Refused (503: the server's streams are all taken) closes the source for good
+            if (source.readyState === EventSource.CLOSED) setTimeout(startLiveTelemetry, 5000);
+        };
+    }
+
+    function showLiveEvent(data, describe) {
+        const time = new Date(data.t * 1000).toLocaleTimeString();
+        liveSource.textContent = data.src;
+        liveEvent.textContent = `${describe(data)} at ${time}`;
     }
 
     // --- Logout ---
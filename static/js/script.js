@@ -8,6 +8,7 @@ document.addEventListener('DOMContentLoaded', function () {
     const headawayBtn = document.getElementById('headaway-btn');
     const reactledBtn = document.getElementById('reactled-btn'); // Assuming this maps to arduino
     const gazeaidBtn = document.getElementById('gazeaid-btn');   // Assuming this maps to eyetracking
+    const calibrateBtn = document.getElementById('calibrate-btn');
 
     if (headawayBtn) {
         headawayBtn.addEventListener('click', () => {
@@ -36,6 +37,14 @@ document.addEventListener('DOMContentLoaded', function () {
         console.error("GazeAid button not found");
     }
 
+    if (calibrateBtn) {
+        calibrateBtn.addEventListener('click', () => {
+            runScriptOnServer("calibration.py");
+        });
+    } else {
+        console.error("Calibrate button not found");
+    }
+
 
     // ... (rest of your script.js, including runScriptOnServer, checkAuthenticationAndRole, logout etc.)
 });
@@ -60,6 +69,10 @@ async function runScriptOnServer(scriptName) {
 
         if (response.ok && result.success) {
             alert(`${scriptName} ${result.already_running ? 'is already running' : 'started successfully'} (PID: ${result.pid || 'N/A'}).`);
+            // The server returns before the startup check finishes; report a startup failure afterwards
+            if (result.startup === 'starting' && result.status_url) {
+                setTimeout(() => checkScriptStartup(scriptName, result.status_url), 1500);
+            }
         } else {
             alert(`Error starting ${scriptName}: ${result.error || `Server responded with status ${response.status}`}`);
         }
@@ -69,6 +82,27 @@ async function runScriptOnServer(scriptName) {
     }
 }
 
+async function checkScriptStartup(scriptName, statusUrl) {
+    try {
+        const response = await fetch(statusUrl);
+        const result = await response.json();
+        if (!response.ok || !result.success) {
+            return;
+        }
+        const status = result.status;
+        if (status.startup === 'failed') {
+            alert(`${scriptName} failed to start properly:\n${status.startup_details || 'No details available.'}`);
+        } else if (status.last_failure) {
+            // Crashed and was restarted by the server before this check: report the crash
+            const failure = status.last_failure;
+            alert(`${scriptName} exited with code ${failure.returncode} and was restarted` +
+                  ` (${status.restarts} restart${status.restarts === 1 ? '' : 's'}):\n${failure.details || 'No details available.'}`);
+        }
+    } catch (error) {
+        console.error(`Could not check startup status of ${scriptName}:`, error);
+    }
+}
+
 // --- Make sure checkAuthenticationAndRole and logout functions are also present ---
 // (Include the versions from the previous answer)
 async function checkAuthenticationAndRole(requiredRole = null) {
@@ -0,0 +1,501 @@
+# store.py
+"""
+SQLite store for users, patient records and doctor-patient links.
+
+The database runs in WAL mode so readers never block the (single) writer, and every
+thread gets its own connection (sqlite3 connections must not be shared between threads;
+a connection opened before a fork is never reused in the child).
+
+Patient lists are paged with keyset cursors over the (doctor_id, name_key, patient_id)
+index rather than OFFSET, so deep pages cost the same as the first one. Search uses an
+FTS5 index over name and email (token prefix matching) when the SQLite build has FTS5,
+and falls back to a name prefix range scan otherwise.
+"""
+
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+log = logging.getLogger(__name__)
+
+ROLES = ("patient", "doctor")
+MAX_PAGE_SIZE = 200
+# Searches matching fewer users than this are served from the FTS hits instead of the name index
+SELECTIVE_MATCHES = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    password_hash TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    role TEXT NOT NULL CHECK (role IN ('patient', 'doctor')),
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_role_name ON users (role, name_key, id);
+
+CREATE TABLE IF NOT EXISTS patients (
+    user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+    age INTEGER,
+    gender TEXT,
+    medical_history TEXT
+);
+
+-- name_key is copied from users so a doctor's list is one ordered index range
+CREATE TABLE IF NOT EXISTS doctor_patients (
+    doctor_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    patient_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    name_key TEXT NOT NULL,
+    linked REAL NOT NULL,
+    PRIMARY KEY (doctor_id, patient_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS doctor_patients_name ON doctor_patients (doctor_id, name_key, patient_id);
+CREATE INDEX IF NOT EXISTS doctor_patients_patient ON doctor_patients (patient_id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5(
+    name, email, content='users', content_rowid='id', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON users BEGIN
+    INSERT INTO user_search (rowid, name, email) VALUES (new.id, new.name, new.email);
+END;
+CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users BEGIN
+    INSERT INTO user_search (user_search, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+END;
+CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE OF name, email ON users BEGIN
+    INSERT INTO user_search (user_search, rowid, name, email) VALUES ('delete', old.id, old.name, old.email);
+    INSERT INTO user_search (rowid, name, email) VALUES (new.id, new.name, new.email);
+END;
+"""
+
+# --- Session analytics ---
+# Raw results of every game/tracking session, plus per-patient rollups by day, week and
+# month that are updated by trigger as sessions are inserted, so trend queries read one
+# row per bucket instead of scanning sessions. Buckets are UTC; weeks start on Monday.
+SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    patient_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    hits INTEGER,
+    attempts INTEGER,
+    accuracy REAL,
+    speed REAL,
+    frames INTEGER,
+    face_frames INTEGER,
+    blinks INTEGER,
+    recording TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_patient ON sessions (patient_id, started);
+
+CREATE TABLE IF NOT EXISTS session_rollups (
+    patient_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    period TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    sessions INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    hits INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    scored INTEGER NOT NULL,
+    accuracy_sum REAL NOT NULL,
+    accuracy_min REAL,
+    accuracy_max REAL,
+    speed_sum REAL NOT NULL,
+    frames INTEGER NOT NULL,
+    face_frames INTEGER NOT NULL,
+    blinks INTEGER NOT NULL,
+    PRIMARY KEY (patient_id, kind, period, bucket)
+) WITHOUT ROWID;
+"""
+
+# strftime modifiers that truncate a unix time to the start of its bucket
+PERIODS = {
+    "day": "'start of day'",
+    "week": "'start of day', '-6 days', 'weekday 1'",
+    "month": "'start of month'",
+}
+
+
+def _bucket_sql(column, period):
+    return f"CAST(strftime('%s', {column}, 'unixepoch', {PERIODS[period]}) AS INTEGER)"
+
+
+_ROLLUP_COLUMNS = ("patient_id, kind, period, bucket, sessions, duration, hits, attempts, scored, "
+                   "accuracy_sum, accuracy_min, accuracy_max, speed_sum, frames, face_frames, blinks")
+
+_ROLLUP_TRIGGER = "CREATE TRIGGER IF NOT EXISTS sessions_rollup AFTER INSERT ON sessions BEGIN\n" + "".join(
+    f"""    INSERT INTO session_rollups ({_ROLLUP_COLUMNS}) VALUES (
+        new.patient_id, new.kind, '{period}', {_bucket_sql("new.started", period)}, 1, new.duration,
+        coalesce(new.hits, 0), coalesce(new.attempts, 0), new.accuracy IS NOT NULL, coalesce(new.accuracy, 0),
+        new.accuracy, new.accuracy, coalesce(new.speed, 0), coalesce(new.frames, 0),
+        coalesce(new.face_frames, 0), coalesce(new.blinks, 0))
+    ON CONFLICT (patient_id, kind, period, bucket) DO UPDATE SET
+        sessions = sessions + 1, duration = duration + excluded.duration,
+        hits = hits + excluded.hits, attempts = attempts + excluded.attempts,
+        scored = scored + excluded.scored, accuracy_sum = accuracy_sum + excluded.accuracy_sum,
+        accuracy_min = coalesce(min(accuracy_min, excluded.accuracy_min), accuracy_min, excluded.accuracy_min),
+        accuracy_max = coalesce(max(accuracy_max, excluded.accuracy_max), accuracy_max, excluded.accuracy_max),
+        speed_sum = speed_sum + excluded.speed_sum, frames = frames + excluded.frames,
+        face_frames = face_frames + excluded.face_frames, blinks = blinks + excluded.blinks;
+""" for period in PERIODS) + "END;\n"
+
+SESSION_KINDS = ("grid_game", "tracking")
+SESSION_METRICS = ("hits", "attempts", "accuracy", "speed", "frames", "face_frames", "blinks")
+
+# Demo accounts created in an empty database
+DEMO_USERS = [
+    {"email": "doctor@example.com", "password": "doctor123", "name": "Dr. Jane Smith", "role": "doctor"},
+    {"email": "patient@example.com", "password": "patient123", "name": "John Doe", "role": "patient"},
+]
+
+
+class StoreError(Exception):
+    """A request the store cannot satisfy (duplicate email, unknown user, bad cursor...)."""
+
+
+def default_path():
+    """Database used by the server and the scripts it launches ($CEREBLAID_DB or data/cereblaid.db)."""
+    return Path(os.environ.get("CEREBLAID_DB", Path(__file__).parent / "data" / "cereblaid.db"))
+
+
+def name_key(name):
+    """Sort/search key for names: case-folded and whitespace-normalised."""
+    return " ".join(name.split()).casefold()
+
+
+def encode_cursor(key, row_id):
+    return base64.urlsafe_b64encode(json.dumps([key, row_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        key, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(key), int(row_id)
+    except (ValueError, TypeError):
+        raise StoreError("Invalid cursor") from None
+
+
+def _fts_query(text):
+    """Every word of the search text as a quoted FTS5 prefix term (all must match)."""
+    terms = [word.replace('"', '""') for word in text.split()]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def save_session(patient_id, kind, started, duration, **fields):
+    """
+    Store.record_session() for the tracking scripts: writes to the default database and
+    logs failures instead of raising, so a database problem never crashes a session.
+    """
+    try:
+        store = Store()
+        try:
+            return store.record_session(patient_id, kind, started, duration, **fields)
+        finally:
+            store.close()
+    except (sqlite3.Error, StoreError, OSError) as e:
+        log.error(f"Store: could not save {kind} session for patient {patient_id}: {e}")
+        return None
+
+
+class Store:
+    """Thread-safe access to the SQLite database at path (one connection per thread)."""
+
+    def __init__(self, path=None, busy_timeout=5.0):
+        self.path = Path(path) if path else default_path()
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self.fts = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.init_schema()
+
+    # --- Connections ---
+    @property
+    def conn(self):
+        """This thread's connection (reopened after a fork)."""
+        local = self._local
+        if getattr(local, "conn", None) is None or local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")  # Durable at checkpoints; safe with WAL
+            conn.execute("PRAGMA foreign_keys = ON")
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT on this thread's connection (rolled back on error)."""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def init_schema(self):
+        # executescript() runs outside Python's transaction handling, so BEGIN/COMMIT are in the script
+        conn = self.conn
+        conn.executescript("BEGIN IMMEDIATE;" + SCHEMA + SESSION_SCHEMA + _ROLLUP_TRIGGER + "COMMIT;")
+        try:
+            conn.executescript("BEGIN IMMEDIATE;" + FTS_SCHEMA + "COMMIT;")
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            log.warning(f"Store: FTS5 unavailable ({e}); patient search falls back to name prefixes.")
+
+    # --- Users ---
+    def create_user(self, email, password, name, role, age=None, gender=None, medical_history=None):
+        """Insert a user (and a patient record for patients); returns the new id."""
+        if role not in ROLES:
+            raise StoreError("Invalid role specified")
+        # Hash before taking the write lock: it is deliberately slow and would serialise every writer
+        password_hash = generate_password_hash(password)
+        try:
+            with self.transaction() as conn:
+                user_id = conn.execute(
+                    "INSERT INTO users (email, password_hash, name, name_key, role, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (email, password_hash, name, name_key(name), role, time.time()),
+                ).lastrowid
+                if role == "patient":
+                    conn.execute("INSERT INTO patients (user_id, age, gender, medical_history) VALUES (?, ?, ?, ?)",
+                                 (user_id, age, gender, medical_history))
+        except sqlite3.IntegrityError:
+            raise StoreError("Email already registered") from None
+        return user_id
+
+    def import_patients(self, patients, password_hash, doctor_id=None):
+        """
+        Bulk-insert patient dicts (email, name and optionally age, gender, medical_history)
+        in one transaction, all with the same precomputed password hash; optionally link
+        them all to doctor_id. Used for migrations and load tests.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            for patient in patients:
+                key = name_key(patient["name"])
+                user_id = conn.execute(
+                    "INSERT INTO users (email, password_hash, name, name_key, role, created) "
+                    "VALUES (?, ?, ?, ?, 'patient', ?)",
+                    (patient["email"], password_hash, patient["name"], key, now)).lastrowid
+                conn.execute("INSERT INTO patients (user_id, age, gender, medical_history) VALUES (?, ?, ?, ?)",
+                             (user_id, patient.get("age"), patient.get("gender"), patient.get("medical_history")))
+                if doctor_id is not None:
+                    conn.execute("INSERT INTO doctor_patients (doctor_id, patient_id, name_key, linked) "
+                                 "VALUES (?, ?, ?, ?)", (doctor_id, user_id, key, now))
+
+    def get_user(self, email):
+        row = self.conn.execute("SELECT id, email, name, role FROM users WHERE email = ?", (email,)).fetchone()
+        return dict(row) if row else None
+
+    def authenticate(self, email, password):
+        """The user's id/email/name/role if the password matches, else None."""
+        row = self.conn.execute("SELECT id, email, name, role, password_hash FROM users WHERE email = ?",
+                                (email,)).fetchone()
+        if row is None or not check_password_hash(row["password_hash"], password):
+            return None
+        return {key: row[key] for key in ("id", "email", "name", "role")}
+
+    def ensure_demo_users(self):
+        """Create the demo doctor/patient (and link them) when the database has no users yet."""
+        if self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            return
+        ids = {}
+        for user in DEMO_USERS:
+            try:
+                ids[user["role"]] = self.create_user(**user)
+            except StoreError:
+                return  # Another worker seeded the database first
+        self.link_patient(ids["doctor"], ids["patient"])
+        log.info("Store: created demo users.")
+
+    # --- Doctor/patient links ---
+    def link_patient(self, doctor_id, patient_id):
+        """Add a patient to a doctor's list (no-op if already linked). Returns False if not a patient."""
+        with self.transaction() as conn:
+            row = conn.execute("SELECT name_key FROM users WHERE id = ? AND role = 'patient'",
+                               (patient_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("INSERT OR IGNORE INTO doctor_patients (doctor_id, patient_id, name_key, linked) "
+                         "VALUES (?, ?, ?, ?)", (doctor_id, patient_id, row["name_key"], time.time()))
+        return True
+
+    # --- Patients ---
+    def list_patients(self, doctor_id=None, query="", cursor=None, limit=50):
+        """
+        One page of patients ordered by name: (rows, next_cursor).
+
+        doctor_id=None lists every patient, otherwise only the doctor's linked patients.
+        next_cursor is None on the last page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        after = decode_cursor(cursor) if cursor else None
+        query = query.strip()
+        match = _fts_query(query) if query and self.fts else None
+        columns = "u.id, u.email, u.name, u.name_key, p.age, p.gender"
+        try:
+            # A rare term is fastest from its FTS hits (then sorted); a common one is fastest
+            # by walking the name index in order until the page is full
+            selective = match is not None and self._count_matches(match, SELECTIVE_MATCHES) < SELECTIVE_MATCHES
+            if selective:
+                sql = f"SELECT {columns} FROM (SELECT rowid AS id FROM user_search WHERE user_search MATCH ?) m "
+                params = [match]
+                if doctor_id is None:
+                    sql += "CROSS JOIN users u ON u.id = m.id AND u.role = 'patient' "
+                else:
+                    sql += ("CROSS JOIN doctor_patients dp ON dp.doctor_id = ? AND dp.patient_id = m.id "
+                            "JOIN users u ON u.id = dp.patient_id ")
+                    params.append(doctor_id)
+                sql += "LEFT JOIN patients p ON p.user_id = u.id WHERE 1"
+            elif doctor_id is None:
+                sql = (f"SELECT {columns} FROM users u "
+                       "LEFT JOIN patients p ON p.user_id = u.id WHERE u.role = 'patient'")
+                params = []
+            else:
+                sql = (f"SELECT {columns} FROM doctor_patients dp "
+                       "JOIN users u ON u.id = dp.patient_id LEFT JOIN patients p ON p.user_id = u.id "
+                       "WHERE dp.doctor_id = ?")
+                params = [doctor_id]
+            key_cols = ("u.name_key", "u.id") if doctor_id is None else ("dp.name_key", "dp.patient_id")
+
+            if match is not None and not selective:
+                sql += " AND u.id IN (SELECT rowid FROM user_search WHERE user_search MATCH ?)"
+                params.append(match)
+            elif query and match is None:
+                prefix = name_key(query)
+                sql += f" AND {key_cols[0]} >= ? AND {key_cols[0]} < ?"
+                params += [prefix, prefix + "\U0010ffff"]
+            if after:
+                sql += f" AND ({key_cols[0]}, {key_cols[1]}) > (?, ?)"
+                params += list(after)
+            sql += f" ORDER BY {key_cols[0]}, {key_cols[1]} LIMIT ?"
+            params.append(limit + 1)  # One extra row tells us whether there is another page
+            rows = self.conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if "fts5" in str(e):
+                raise StoreError("Invalid search query") from None
+            raise
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["name_key"], rows[-1]["id"])
+        patients = [{"id": r["id"], "email": r["email"], "name": r["name"], "age": r["age"], "gender": r["gender"]}
+                    for r in rows]
+        return patients, next_cursor
+
+    def _count_matches(self, match, cap):
+        """Number of users matching an FTS query, counting no further than cap."""
+        return self.conn.execute("SELECT count(*) FROM (SELECT rowid FROM user_search WHERE user_search MATCH ? "
+                                 "LIMIT ?)", (match, cap)).fetchone()[0]
+
+    def get_patient(self, patient_id):
+        row = self.conn.execute(
+            "SELECT u.id, u.email, u.name, p.age, p.gender, p.medical_history FROM users u "
+            "LEFT JOIN patients p ON p.user_id = u.id WHERE u.id = ? AND u.role = 'patient'",
+            (patient_id,)).fetchone()
+        if row is None:
+            return None
+        return {"id": row["id"], "email": row["email"], "name": row["name"], "age": row["age"],
+                "gender": row["gender"], "medicalHistory": row["medical_history"]}
+
+    # --- Session analytics ---
+    def record_session(self, patient_id, kind, started, duration, recording=None, details=None, **metrics):
+        """
+        Store one finished session (the rollups are updated in the same transaction).
+
+        metrics are any of SESSION_METRICS; accuracy is a percentage and speed is hits/sec.
+        Returns the session id.
+        """
+        if kind not in SESSION_KINDS:
+            raise StoreError(f"Unknown session kind {kind!r}")
+        unknown = set(metrics) - set(SESSION_METRICS)
+        if unknown:
+            raise StoreError(f"Unknown session metrics: {', '.join(sorted(unknown))}")
+        columns = ["patient_id", "kind", "started", "duration", "recording", "details", *metrics]
+        values = [patient_id, kind, started, duration, recording,
+                  json.dumps(details) if details is not None else None, *metrics.values()]
+        try:
+            with self.transaction() as conn:
+                return conn.execute(f"INSERT INTO sessions ({', '.join(columns)}) "
+                                    f"VALUES ({', '.join('?' * len(values))})", values).lastrowid
+        except sqlite3.IntegrityError:
+            raise StoreError("Unknown patient") from None
+
+    def recent_sessions(self, patient_id, limit=20):
+        rows = self.conn.execute(
+            "SELECT id, kind, started, duration, hits, attempts, accuracy, speed, frames, face_frames, blinks "
+            "FROM sessions WHERE patient_id = ? ORDER BY started DESC LIMIT ?", (patient_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def session_trends(self, patient_id, kind, period, limit=12):
+        """
+        The last `limit` buckets of a patient's rollups, oldest first.
+
+        Averages and the change in accuracy from the previous bucket are computed in SQL
+        over the rollup rows only; buckets without sessions are simply absent.
+        """
+        if period not in PERIODS:
+            raise StoreError(f"period must be one of {', '.join(PERIODS)}")
+        rows = self.conn.execute(
+            """
+            SELECT * FROM (
+                SELECT bucket, sessions, duration, hits, attempts, frames, face_frames, blinks,
+                       accuracy_min, accuracy_max,
+                       accuracy_sum / NULLIF(scored, 0) AS accuracy,
+                       speed_sum / NULLIF(scored, 0) AS speed,
+                       CAST(hits AS REAL) / NULLIF(attempts, 0) AS hit_rate,
+                       CAST(face_frames AS REAL) / NULLIF(frames, 0) AS face_rate,
+                       accuracy_sum / NULLIF(scored, 0)
+                           - LAG(accuracy_sum / NULLIF(scored, 0)) OVER (ORDER BY bucket) AS accuracy_change
+                FROM (SELECT * FROM session_rollups
+                      WHERE patient_id = ? AND kind = ? AND period = ?
+                      ORDER BY bucket DESC LIMIT ?)
+            ) ORDER BY bucket
+            """,
+            # One extra bucket so the oldest returned bucket still gets its accuracy_change
+            (patient_id, kind, period, limit + 1)).fetchall()
+        return [dict(row) for row in rows[-limit:]]
+
+    def rebuild_rollups(self):
+        """Recompute every rollup from the raw sessions (after imports or manual repairs)."""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM session_rollups")
+            for period in PERIODS:
+                conn.execute(
+                    f"INSERT INTO session_rollups ({_ROLLUP_COLUMNS}) "
+                    f"SELECT patient_id, kind, '{period}', {_bucket_sql('started', period)} AS bucket, count(*), "
+                    "sum(duration), coalesce(sum(hits), 0), coalesce(sum(attempts), 0), count(accuracy), "
+                    "coalesce(sum(accuracy), 0), min(accuracy), max(accuracy), coalesce(sum(speed), 0), "
+                    "coalesce(sum(frames), 0), coalesce(sum(face_frames), 0), coalesce(sum(blinks), 0) "
+                    "FROM sessions GROUP BY patient_id, kind, bucket")
+
+    def counts(self):
+        row = self.conn.execute("SELECT "
+                                "(SELECT count(*) FROM users WHERE role = 'patient'), "
+                                "(SELECT count(*) FROM users WHERE role = 'doctor'), "
+                                "(SELECT count(*) FROM doctor_patients)").fetchone()
+        return {"patients": row[0], "doctors": row[1], "links": row[2]}
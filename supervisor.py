@@ -0,0 +1,477 @@
+# supervisor.py
+
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from itertools import islice
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+import psutil
+
+try:
+    import fcntl  # Cross-process launch lock (POSIX); Windows falls back to the in-process lock only
+except ImportError:
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# --- Restart policies ---
+RESTART_NEVER = "never"
+RESTART_ON_FAILURE = "on-failure"
+RESTART_ALWAYS = "always"
+
+# --- Child -> supervisor reports ---
+# A child prints STATUS_PREFIX + a JSON object on stdout to add fields to its status
+# (e.g. {"first_frame_ms": 412.5}, see instrumentation.report_status). Such lines are
+# not shown in the script's log. LAUNCH_TIME_ENV holds the time.time() of the launch.
+STATUS_PREFIX = "@@status "
+LAUNCH_TIME_ENV = "CEREBLAID_LAUNCH_TIME"
+
+
+class ManagedProcess:
+    """A child script started by the supervisor (or adopted from another worker's PID file)."""
+
+    def __init__(self, name, command, pid, create_time, popen=None, restart_policy=RESTART_NEVER, restarts=0,
+                 launcher="exec", reported=None, last_failure=None):
+        self.name = name
+        self.command = command
+        self.pid = pid
+        self.create_time = create_time
+        self.popen = popen  # None when the child belongs to another server process
+        self.restart_policy = restart_policy
+        self.restarts = restarts
+        self.started_at = create_time
+        self.returncode = None
+        self.stop_requested = False
+        self.reaped = False
+        self.startup = "starting"  # -> "running", "exited" or "failed" after the startup grace period
+        self.startup_details = None
+        self.drainers = []
+        self.launcher = launcher  # "exec" (a new interpreter) or "zygote" (forked from a warm one)
+        self.reported = dict(reported or {})  # Fields reported by the child itself
+        # Failure of the process this one was restarted in place of (kept across restarts), so a
+        # status read after the reaper respawned a crashed script still shows why it crashed
+        self.last_failure = last_failure
+
+    def poll(self):
+        """Return the exit code if the child has exited (reaping it if it is ours), else None."""
+        if self.returncode is not None:
+            return self.returncode
+        if self.popen is not None:
+            self.returncode = self.popen.poll()
+        elif not _pid_alive(self.pid, self.create_time):
+            self.returncode = -1  # Exit status of a foreign child is not observable
+        return self.returncode
+
+    def to_dict(self):
+        running = self.poll() is None
+        return {
+            "script": self.name,
+            "running": running,
+            "pid": self.pid,
+            "returncode": self.returncode,
+            "restart_policy": self.restart_policy,
+            "restarts": self.restarts,
+            "started_at": self.started_at,
+            "uptime": time.time() - self.started_at if running else None,
+            "owned": self.popen is not None,
+            "startup": self.startup,
+            "startup_details": self.startup_details,
+            "launcher": self.launcher,
+            "reported": self.reported,
+            "last_failure": self.last_failure,
+        }
+
+
+def _pid_alive(pid, create_time):
+    """True if pid is alive AND is the same process (start time matches, so a reused PID is rejected)."""
+    try:
+        proc = psutil.Process(pid)
+        return abs(proc.create_time() - create_time) < 0.01 and proc.status() != psutil.STATUS_ZOMBIE
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return False
+
+
+class ScriptOutput:
+    """
+    Output of one script: a bounded in-memory ring of recent lines plus size-rotated log files.
+
+    Lines are numbered with a sequence that keeps increasing across restarts, so readers
+    (e.g. an SSE stream) can resume with since(last_seq) and block in wait().
+    """
+
+    def __init__(self, name, log_dir, max_lines=2000, max_bytes=1024 * 1024, backup_count=3):
+        self.name = name
+        self._lines = deque(maxlen=max_lines)
+        self._cond = threading.Condition()
+        self.seq = 0
+        self.log_path = Path(log_dir) / f"{name}.log"
+        self._file_log = logging.getLogger(f"scripts.{name}")
+        self._file_log.propagate = False  # Script output goes to its own file, not the server log
+        self._file_log.setLevel(logging.INFO)
+        if not self._file_log.handlers:
+            handler = RotatingFileHandler(self.log_path, maxBytes=max_bytes, backupCount=backup_count,
+                                          encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(stream)s %(message)s"))
+            self._file_log.addHandler(handler)
+
+    def append(self, stream, line):
+        with self._cond:
+            self.seq += 1
+            self._lines.append((self.seq, stream, line))
+            self._cond.notify_all()
+        self._file_log.info(line, extra={"stream": stream})
+
+    def since(self, seq):
+        """Buffered (seq, stream, line) entries newer than seq (older ones may have been evicted)."""
+        with self._cond:
+            first = self.seq - len(self._lines) + 1
+            return list(islice(self._lines, max(0, seq + 1 - first), None))
+
+    def tail(self, n, stream=None):
+        """Last n lines, optionally only from one stream."""
+        with self._cond:
+            entries = [e for e in self._lines if stream is None or e[1] == stream]
+        return [line for _, _, line in entries[-n:]]
+
+    def wait(self, seq, timeout=None):
+        """Block until a line newer than seq exists; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.seq > seq, timeout)
+
+    def drain(self, stream, pipe, on_status=None):
+        """
+        Read a child pipe until EOF (runs on its own thread so the child never blocks on a full pipe).
+        Status report lines are passed to on_status instead of the log, if it is given.
+        """
+        try:
+            for line in iter(pipe.readline, ""):
+                line = line.rstrip("\r\n")
+                if on_status is not None and line.startswith(STATUS_PREFIX):
+                    try:
+                        on_status(json.loads(line[len(STATUS_PREFIX):]))
+                        continue
+                    except ValueError:
+                        pass  # Not a valid report: keep it as output
+                self.append(stream, line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            pipe.close()
+
+
+class Supervisor:
+    """
+    Launches, tracks and restarts the helper scripts.
+
+    Every child has an entry in an in-memory registry (O(1) status lookups) and a PID file
+    in run_dir recording its PID and start time, so other server processes (gunicorn
+    workers) see the same children. Launches of the same script are serialised with a
+    thread lock plus an flock on run_dir/<script>.lock. A reaper thread collects exited
+    children and applies their restart policy.
+
+    Child stdout/stderr are always piped and drained continuously into a ScriptOutput,
+    and the "failed during startup" check runs on a timer after startup_grace seconds,
+    so start() returns as soon as the process exists.
+
+    launcher replaces subprocess.Popen for starting children (same call signature, must
+    return a Popen-like object), e.g. zygote.ZygoteLauncher.
+    """
+
+    def __init__(self, run_dir, log_dir=None, max_restarts=5, restart_window=60.0, reap_interval=1.0,
+                 startup_grace=0.75, output_lines=2000, log_max_bytes=1024 * 1024, log_backups=3,
+                 launcher=None):
+        self.run_dir = Path(run_dir)
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.log_dir = Path(log_dir) if log_dir else self.run_dir
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.startup_grace = startup_grace
+        self._output_options = {"max_lines": output_lines, "max_bytes": log_max_bytes, "backup_count": log_backups}
+        self._outputs = {}
+        self.max_restarts = max_restarts  # Restarts allowed within restart_window seconds
+        self.restart_window = restart_window
+        self.reap_interval = reap_interval
+        self.launcher = launcher or subprocess.Popen
+        self._procs = {}
+        self._launch_specs = {}
+        self._restart_times = {}
+        self._lock = threading.RLock()
+        self._name_locks = {}
+        self._reaper = None
+        self._stopping = threading.Event()
+
+    # --- PID files ---
+    def _pid_path(self, name):
+        return self.run_dir / f"{name}.pid"
+
+    def _write_pid_file(self, proc):
+        tmp = self._pid_path(proc.name).with_suffix(".pid.tmp")
+        tmp.write_text(json.dumps({"pid": proc.pid, "create_time": proc.create_time, "command": proc.command,
+                                   "restart_policy": proc.restart_policy, "restarts": proc.restarts,
+                                   "launcher": proc.launcher, "reported": proc.reported,
+                                   "last_failure": proc.last_failure}))
+        os.replace(tmp, self._pid_path(proc.name))  # Atomic, readers never see a partial file
+
+    def _remove_pid_file(self, proc):
+        path = self._pid_path(proc.name)
+        try:
+            if json.loads(path.read_text()).get("pid") == proc.pid:
+                path.unlink()
+        except (OSError, ValueError):
+            pass
+
+    def _adopt_from_pid_file(self, name):
+        """Register a live child started by another server process, if its PID file is valid."""
+        try:
+            info = json.loads(self._pid_path(name).read_text())
+        except (OSError, ValueError):
+            return None
+        if not _pid_alive(info["pid"], info["create_time"]):
+            self._pid_path(name).unlink(missing_ok=True)  # Stale: process gone or PID reused
+            return None
+        proc = ManagedProcess(name, info.get("command"), info["pid"], info["create_time"],
+                              restart_policy=info.get("restart_policy", RESTART_NEVER),
+                              restarts=info.get("restarts", 0), launcher=info.get("launcher", "exec"),
+                              reported=info.get("reported"), last_failure=info.get("last_failure"))
+        self._procs[name] = proc
+        return proc
+
+    # --- Locking ---
+    @contextmanager
+    def _launch_lock(self, name):
+        with self._lock:
+            name_lock = self._name_locks.setdefault(name, threading.Lock())
+        with name_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.run_dir / f"{name}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # --- Public API ---
+    def get(self, name):
+        """Return the live ManagedProcess for name, or None. Does not scan the process table."""
+        with self._lock:
+            proc = self._procs.get(name)
+            if proc is not None and proc.poll() is None:
+                return proc
+            # Not running here; another server process may have launched it since
+            adopted = self._adopt_from_pid_file(name)
+            if adopted is None and proc is not None and proc.popen is None:
+                self._procs.pop(name, None)
+            return adopted
+
+    def is_running(self, name):
+        return self.get(name) is not None
+
+    def start(self, name, command, restart_policy=RESTART_NEVER, **popen_kwargs):
+        """
+        Launch command as script name unless it is already running.
+        Returns (ManagedProcess, already_running). Popen errors propagate to the caller.
+        """
+        with self._launch_lock(name):
+            proc = self.get(name)
+            if proc is not None:
+                return proc, True
+            proc = self._spawn(name, command, restart_policy, popen_kwargs)
+            with self._lock:
+                self._launch_specs[name] = (command, restart_policy, popen_kwargs)
+                self._restart_times[name] = []
+        self._ensure_reaper()
+        return proc, False
+
+    def output(self, name):
+        """The ScriptOutput of a script started by this process, or None."""
+        with self._lock:
+            return self._outputs.get(name)
+
+    def log_path(self, name):
+        """Path of a script's (current) log file, shared by every server process."""
+        return self.log_dir / f"{name}.log"
+
+    def _spawn(self, name, command, restart_policy, popen_kwargs, restarts=0, last_failure=None):
+        kwargs = {"stdout": subprocess.PIPE, "stderr": subprocess.PIPE, "text": True,
+                  "encoding": "utf-8", "errors": "replace", "bufsize": 1,
+                  # Unbuffered child output so the log and stream endpoints are live
+                  "env": {**os.environ, "PYTHONUNBUFFERED": "1", LAUNCH_TIME_ENV: f"{time.time():.6f}"}}
+        kwargs.update(popen_kwargs)
+        popen = self.launcher(command, **kwargs)
+        try:
+            create_time = psutil.Process(popen.pid).create_time()
+        except psutil.NoSuchProcess:
+            create_time = time.time()  # Already exited; the reaper will collect it
+        proc = ManagedProcess(name, command, popen.pid, create_time, popen=popen,
+                              restart_policy=restart_policy, restarts=restarts,
+                              launcher=getattr(popen, "launcher", "exec"), last_failure=last_failure)
+        with self._lock:
+            self._procs[name] = proc
+            output = self._outputs.get(name)
+            if output is None:
+                output = self._outputs[name] = ScriptOutput(name, self.log_dir, **self._output_options)
+        output.append("supervisor", f"started PID {proc.pid} ({proc.launcher}): {' '.join(map(str, command))}")
+        proc.output_start = output.seq
+        for stream, pipe in (("stdout", popen.stdout), ("stderr", popen.stderr)):
+            if pipe is not None:
+                on_status = partial(self._on_status, proc) if stream == "stdout" else None
+                drainer = threading.Thread(target=output.drain, args=(stream, pipe, on_status),
+                                           name=f"drain-{name}-{stream}", daemon=True)
+                drainer.start()
+                proc.drainers.append(drainer)
+        self._write_pid_file(proc)
+
+        timer = threading.Timer(self.startup_grace, self._check_startup, args=(proc,))
+        timer.daemon = True
+        timer.start()
+        log.info(f"Supervisor: started {name} (PID {proc.pid}, restart policy '{restart_policy}')")
+        return proc
+
+    def _on_status(self, proc, fields):
+        """Merge a child's status report into its status (and PID file, for the other workers)."""
+        if not isinstance(fields, dict):
+            return
+        proc.reported.update(fields)
+        log.info(f"Supervisor: {proc.name} (PID {proc.pid}) reported {fields}")
+        with self._lock:
+            if self._procs.get(proc.name) is proc and proc.poll() is None:
+                self._write_pid_file(proc)
+
+    def _stderr_tail(self, proc, lines=20):
+        output = self.output(proc.name)
+        stderr = [line for _, stream, line in output.since(proc.output_start) if stream == "stderr"]
+        return "\n".join(stderr[-lines:])
+
+    def _check_startup(self, proc):
+        """
+        Classify a fresh child once startup_grace has passed (runs on a timer thread, or on
+        the reaper's when the child already exited and is about to be restarted).
+        """
+        if proc.startup != "starting":
+            return
+        code = proc.poll()
+        if code is None:
+            proc.startup = "running"
+            return
+        for drainer in proc.drainers:
+            drainer.join(0.5)  # Let the last output of the dead child arrive
+        if code == 0:
+            proc.startup = "exited"
+            log.warning(f"Supervisor: {proc.name} finished very quickly. PID: {proc.pid}, Code: {code}")
+            return
+        stderr = self._stderr_tail(proc)
+        proc.startup_details = stderr or "No specific error output captured on immediate exit."
+        proc.startup = "failed"
+        log.error(f"Supervisor: {proc.name} failed during startup. PID: {proc.pid}, Code: {code}\n{stderr}")
+
+    def stop(self, name, timeout=5.0):
+        """Terminate a running script (SIGTERM, then kill after timeout). Returns False if not running."""
+        with self._launch_lock(name):
+            proc = self.get(name)
+            if proc is None:
+                return False
+            proc.stop_requested = True
+            try:
+                target = proc.popen if proc.popen is not None else psutil.Process(proc.pid)
+                target.terminate()
+                try:
+                    target.wait(timeout=timeout)
+                except (subprocess.TimeoutExpired, psutil.TimeoutExpired):
+                    log.warning(f"Supervisor: {name} (PID {proc.pid}) ignored SIGTERM, killing.")
+                    target.kill()
+                    target.wait(timeout=timeout)
+            except psutil.NoSuchProcess:
+                pass
+            proc.poll()
+            proc.reaped = True
+            self._remove_pid_file(proc)
+            log.info(f"Supervisor: stopped {name} (PID {proc.pid}, code {proc.returncode})")
+            return True
+
+    def status(self, name):
+        """Status dict for a script, or None if it was never started. O(1)."""
+        with self._lock:
+            proc = self.get(name) or self._procs.get(name)
+            return proc.to_dict() if proc is not None else None
+
+    def list(self):
+        """Status dicts for every known script (own children plus PID files from other workers)."""
+        names = {path.stem for path in self.run_dir.glob("*.pid")}
+        with self._lock:
+            names.update(self._procs)
+        return [s for s in (self.status(name) for name in sorted(names)) if s is not None]
+
+    def shutdown(self, stop_children=True):
+        """Stop the reaper and, optionally, every child this process owns."""
+        self._stopping.set()
+        if stop_children:
+            with self._lock:
+                owned = [name for name, proc in self._procs.items() if proc.popen is not None]
+            for name in owned:
+                self.stop(name)
+
+    # --- Reaper ---
+    def _ensure_reaper(self):
+        with self._lock:
+            if self._reaper is None or not self._reaper.is_alive():
+                self._reaper = threading.Thread(target=self._reap_loop, name="script-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stopping.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception:
+                log.exception("Supervisor: reaper iteration failed")
+
+    def reap(self):
+        """Collect exited children we own and restart them according to their policy."""
+        with self._lock:
+            exited = [proc for proc in self._procs.values()
+                      if proc.popen is not None and not proc.reaped and proc.poll() is not None]
+            for proc in exited:
+                proc.reaped = True
+        for proc in exited:
+            self._remove_pid_file(proc)
+            log.info(f"Supervisor: {proc.name} (PID {proc.pid}) exited with code {proc.returncode}")
+            if proc.stop_requested or not self._should_restart(proc):
+                continue
+            if time.time() - proc.started_at < self.startup_grace:
+                self._check_startup(proc)  # Classify it now: its replacement takes over the status
+            last_failure = proc.last_failure
+            if proc.returncode != 0:
+                last_failure = {"pid": proc.pid, "returncode": proc.returncode, "exited_at": time.time(),
+                                "startup": proc.startup,
+                                "details": proc.startup_details or self._stderr_tail(proc) or None}
+            command, restart_policy, popen_kwargs = self._launch_specs[proc.name]
+            with self._launch_lock(proc.name):
+                if self.get(proc.name) is not None:
+                    continue  # Someone relaunched it meanwhile
+                try:
+                    self._spawn(proc.name, command, restart_policy, popen_kwargs, restarts=proc.restarts + 1,
+                                last_failure=last_failure)
+                except OSError:
+                    log.exception(f"Supervisor: failed to restart {proc.name}")
+
+    def _should_restart(self, proc):
+        if proc.restart_policy == RESTART_NEVER:
+            return False
+        if proc.restart_policy == RESTART_ON_FAILURE and proc.returncode == 0:
+            return False
+        now = time.monotonic()
+        times = [t for t in self._restart_times.get(proc.name, []) if now - t < self.restart_window]
+        if len(times) >= self.max_restarts:
+            log.error(f"Supervisor: {proc.name} restarted {len(times)} times in {self.restart_window:.0f}s, giving up.")
+            return False
+        times.append(now)
+        self._restart_times[proc.name] = times
+        return True
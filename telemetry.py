@@ -0,0 +1,255 @@
+# telemetry.py
+"""
+Live telemetry from the tracker scripts to the web server.
+
+Trackers publish small JSON datagrams (gaze samples, blink events, game hits) with a
+TelemetryPublisher. Each server process that has live viewers runs a TelemetryHub bound
+to its own Unix datagram socket (run/telemetry-<pid>.sock); publishers send every message
+to every hub socket they find. Sends are non-blocking: with no hub, or a hub that is
+behind, messages are dropped instead of slowing the tracker down.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+SOCKET_PREFIX = "telemetry-"
+MAX_DATAGRAM = 8192
+
+
+def default_dir():
+    """Directory holding hub sockets (shared with supervisor PID files)."""
+    return Path(os.environ.get("CEREBLAID_RUN_DIR", Path(__file__).parent / "run"))
+
+
+def _unix_dgram_socket():
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    try:
+        return socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    except OSError:
+        return None  # e.g. Windows, which only has AF_UNIX stream sockets
+
+
+# --- Tracker side ---
+class TelemetryPublisher:
+    """Fire-and-forget publisher used inside the tracker loops."""
+
+    def __init__(self, source, directory=None, refresh_interval=1.0):
+        self.source = source
+        self.directory = Path(directory) if directory else default_dir()
+        self.refresh_interval = refresh_interval
+        self._sock = _unix_dgram_socket()
+        if self._sock is not None:
+            self._sock.setblocking(False)
+        self._targets = []
+        self._next_refresh = 0.0
+        self.sent = 0
+        self.dropped = 0
+
+    def _refresh(self, now):
+        self._next_refresh = now + self.refresh_interval
+        try:
+            self._targets = [str(p) for p in self.directory.glob(f"{SOCKET_PREFIX}*.sock")]
+        except OSError:
+            self._targets = []
+
+    def publish(self, kind, **fields):
+        """Send one message of the given type to every live hub; never blocks."""
+        if self._sock is None:
+            return
+        now = time.monotonic()
+        if now >= self._next_refresh:
+            self._refresh(now)
+        if not self._targets:
+            return
+        data = json.dumps({"src": self.source, "type": kind, "t": time.time(), **fields},
+                          separators=(",", ":")).encode()
+        for target in list(self._targets):
+            try:
+                self._sock.sendto(data, target)
+                self.sent += 1
+            except BlockingIOError:
+                self.dropped += 1  # Hub queue full: drop rather than stall the tracker
+            except OSError:
+                # Hub went away; it is picked up again on the next refresh if it comes back
+                if target in self._targets:
+                    self._targets.remove(target)
+
+    def gaze(self, x, y, **fields):
+        """Per-frame gaze sample in normalised screen coordinates."""
+        self.publish("gaze", x=round(float(x), 4), y=round(float(y), 4), **fields)
+
+    def event(self, name, **fields):
+        """Discrete event such as a blink gesture or a game hit."""
+        self.publish(name, **fields)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+# --- Server side ---
+class Subscription:
+    """
+    One viewer's bounded message queue.
+
+    Gaze samples are downsampled to max_hz per source; every other message type is
+    always delivered. When the viewer falls behind, the oldest messages are dropped.
+    """
+
+    def __init__(self, max_hz=None, sources=None, maxlen=256):
+        # 5% slack so a publisher at an exact multiple of max_hz is not rounded down a step by jitter
+        self.min_interval = 0.95 / max_hz if max_hz else 0.0
+        self.sources = set(sources) if sources else None
+        self._queue = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self._last_gaze = {}
+        self.delivered = 0
+        self.skipped = 0
+
+    def offer(self, kind, source, payload, now):
+        if self.sources is not None and source not in self.sources:
+            return
+        if kind == "gaze" and self.min_interval:
+            if now - self._last_gaze.get(source, -math.inf) < self.min_interval:
+                self.skipped += 1
+                return
+            self._last_gaze[source] = now
+        with self._cond:
+            self._queue.append((kind, payload))
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Wait for messages and return all queued (type, json) pairs (empty list on timeout)."""
+        with self._cond:
+            if not self._queue:
+                self._cond.wait(timeout)
+            items = list(self._queue)
+            self._queue.clear()
+        self.delivered += len(items)
+        return items
+
+
+class TelemetryHub:
+    """Receives tracker datagrams on a per-process socket and fans them out to subscriptions."""
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory else default_dir()
+        self.path = None
+        self._sock = None
+        self._thread = None
+        self._subs = set()
+        self._lock = threading.Lock()
+        self.received = 0
+        self.latest = {}  # Last message of each (source, type), for viewers that join late
+
+    @property
+    def available(self):
+        return self._sock is not None
+
+    def ensure_started(self):
+        """Bind the socket and start the receiver thread on first use (after any fork)."""
+        with self._lock:
+            if self._thread is not None:
+                return self.available
+            self._thread = False  # Only try once
+            sock = _unix_dgram_socket()
+            if sock is None:
+                log.warning("Telemetry: Unix datagram sockets unavailable; live telemetry disabled.")
+                return False
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._remove_stale_sockets()
+            self.path = self.directory / f"{SOCKET_PREFIX}{os.getpid()}.sock"
+            self.path.unlink(missing_ok=True)
+            sock.bind(str(self.path))
+            self._sock = sock
+            self._thread = threading.Thread(target=self._run, name="telemetry-hub", daemon=True)
+            self._thread.start()
+            log.info(f"Telemetry: hub listening on {self.path}")
+            return True
+
+    def _remove_stale_sockets(self):
+        for path in self.directory.glob(f"{SOCKET_PREFIX}*.sock"):
+            try:
+                pid = int(path.stem[len(SOCKET_PREFIX):])
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                path.unlink(missing_ok=True)  # Owner is gone
+            except (ValueError, PermissionError, OSError):
+                pass
+
+    def _run(self):
+        while True:
+            try:
+                data = self._sock.recv(MAX_DATAGRAM)
+            except OSError:
+                return
+            now = time.monotonic()
+            try:
+                payload = data.decode()
+                message = json.loads(payload)
+                kind, source = message["type"], message["src"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            self.received += 1
+            self.latest[(source, kind)] = payload
+            with self._lock:
+                subs = list(self._subs)
+            for sub in subs:
+                sub.offer(kind, source, payload, now)
+
+    def subscribe(self, max_hz=None, sources=None):
+        sub = Subscription(max_hz=max_hz, sources=sources)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+
+# --- Synthetic publisher (for testing the pipeline without a camera) ---
+def run_synthetic(source="synthetic", rate=60.0, duration=10.0, directory=None):
+    """Publish a circular gaze trace at rate Hz plus a blink event every second (every sample below 1 Hz)."""
+    publisher = TelemetryPublisher(source, directory=directory)
+    interval = 1.0 / rate
+    start = next_due = time.monotonic()
+    n = 0
+    while time.monotonic() - start < duration:
+        phase = n * interval
+        publisher.gaze(0.5 + 0.3 * math.cos(phase), 0.5 + 0.3 * math.sin(phase), seq=n)
+        if n % max(1, int(rate)) == 0:
+            publisher.event("blink", gesture="blink", seq=n)
+        n += 1
+        next_due += interval
+        time.sleep(max(0.0, next_due - time.monotonic()))
+    publisher.close()
+    return {"published": n, "sent": publisher.sent, "dropped": publisher.dropped}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic telemetry publisher.")
+    parser.add_argument("--source", default="synthetic")
+    parser.add_argument("--rate", type=float, default=60.0, help="Gaze samples per second.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to publish for.")
+    args = parser.parse_args()
+    print(run_synthetic(args.source, args.rate, args.duration))
@@ -0,0 +1,63 @@
+# tests/conftest.py
+"""Shared fixtures: the repository root on sys.path and stand-ins for the camera-side models."""
+
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def wait_for(condition, timeout=5.0):
+    """Poll condition() until it is true or timeout seconds pass; returns its last value."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return condition()
+        time.sleep(0.005)
+    return True
+
+
+class BrightBoxFaceMesh:
+    """
+    FaceMesh stand-in that "finds" the bright pixels of an image: landmarks spread over their
+    bounding box, normalised to the image it was given (a crop or a full frame), so callers
+    remap them exactly as they would real ones.
+    """
+
+    def __init__(self, rows=478):
+        self.rows = rows
+        self.shapes = []
+        self.closed = False
+
+    def process(self, image):
+        self.shapes.append(image.shape[:2])
+        ys, xs = np.nonzero(image[..., 0] > 127)
+        if not len(xs):
+            return SimpleNamespace(multi_face_landmarks=None)
+        height, width = image.shape[:2]
+        fraction = np.linspace(0.0, 1.0, self.rows)
+        x = (xs.min() + fraction * (xs.max() + 1 - xs.min())) / width
+        y = (ys.min() + fraction * (ys.max() + 1 - ys.min())) / height
+        points = [SimpleNamespace(x=float(px), y=float(py), z=0.0) for px, py in zip(x, y)]
+        return SimpleNamespace(multi_face_landmarks=[SimpleNamespace(landmark=points)])
+
+    def close(self):
+        self.closed = True
+
+
+def face_frame(width, height, face=(0.4, 0.35, 0.2)):
+    """RGB frame with a bright square "face" at normalised (x0, y0, side of the frame width)."""
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    x0, y0, side = int(face[0] * width), int(face[1] * height), int(face[2] * width)
+    frame[y0:y0 + side, x0:x0 + side] = 255
+    return frame
+
+
+@pytest.fixture
+def stub_face_mesh():
+    return BrightBoxFaceMesh()
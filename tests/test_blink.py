@@ -0,0 +1,61 @@
+# tests/test_blink.py
+
+import numpy as np
+import pytest
+
+from blink import BLINK, DOUBLE_BLINK, LONG_BLINK, BlinkDetector, eye_aspect_ratio
+
+FPS = 30.0
+
+
+def eyes(ear):
+    """(2, 6, 2) eye points of two identical eyes with the given eye aspect ratio."""
+    eye = np.array([(0, 0), (10, -15 * ear), (20, -15 * ear), (30, 0), (20, 15 * ear), (10, 15 * ear)],
+                   dtype=np.float32)
+    return np.stack([eye, eye + (60, 0)])
+
+
+def run(detector, phases, t=0.0):
+    """Feed (seconds, ear) phases at FPS; returns [(time, gesture)] and the end time."""
+    gestures = []
+    for seconds, ear in phases:
+        end = t + seconds
+        while t < end - 1e-9:
+            gestures += [(t, gesture) for gesture in detector.update(eyes(ear), t)]
+            t += 1 / FPS
+    return gestures, t
+
+
+def test_eye_aspect_ratio():
+    assert eye_aspect_ratio(eyes(0.3)) == pytest.approx([0.3, 0.3], abs=1e-6)
+
+
+def test_blink():
+    gestures, _ = run(BlinkDetector(), [(1.0, 0.3), (0.15, 0.05), (1.0, 0.3)])
+    assert [gesture for _, gesture in gestures] == [BLINK]
+
+
+def test_flutter_and_too_short_closures_are_ignored():
+    # One frame closed is under min_closed; 0.2 sits inside the hysteresis band
+    gestures, _ = run(BlinkDetector(), [(1.0, 0.3), (1 / FPS, 0.05), (1.0, 0.3), (0.5, 0.2), (1.0, 0.3)])
+    assert gestures == []
+
+
+def test_double_blink():
+    phases = [(1.0, 0.3), (0.15, 0.05), (0.3, 0.3), (0.15, 0.05), (1.0, 0.3)]
+    gestures, _ = run(BlinkDetector(), phases)
+    assert [gesture for _, gesture in gestures] == [BLINK, DOUBLE_BLINK]
+
+
+def test_long_blink_is_emitted_while_still_closed():
+    gestures, _ = run(BlinkDetector(long_blink=0.8), [(1.0, 0.3), (1.5, 0.05), (1.0, 0.3)])
+    assert [gesture for _, gesture in gestures] == [LONG_BLINK]
+    assert 1.8 <= gestures[0][0] < 1.9
+
+
+def test_reset_drops_a_blink_in_progress():
+    detector = BlinkDetector()
+    run(detector, [(1.0, 0.3), (0.1, 0.05)])
+    detector.reset()  # Face lost mid-blink
+    gestures, _ = run(detector, [(1.0, 0.3)], t=1.1)
+    assert gestures == []
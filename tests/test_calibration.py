@@ -0,0 +1,69 @@
+# tests/test_calibration.py
+
+import numpy as np
+import pytest
+
+from calibration import DWELL_S, SETTLE_S, ScreenMapping, fit, fit_samples, targets
+
+
+def _project(matrix, points):
+    h = np.column_stack((points, np.ones(len(points)))) @ np.asarray(matrix).T
+    return h[:, :2] / h[:, 2:]
+
+
+def test_homography_fit_maps_its_calibration_points():
+    features = 0.4 + 0.2 * targets(9)
+    mapping = fit(features, targets(9), "homography")
+    for (x, y), expected in zip(features, targets(9)):
+        assert mapping.map_point(x, y) == pytest.approx(tuple(expected), abs=1e-6)
+
+
+@pytest.mark.parametrize("model", ["poly2", "homography"])
+def test_calibration_beats_the_direct_mapping(model):
+    """A simulated routine for a user whose eyes cover a small, off-centre, bent part of the camera frame."""
+    grid, fps, noise = 5, 30.0, 0.002
+    rng = np.random.default_rng(0)
+    head, gain, bend = np.array([0.6, 0.4]), np.array([0.15, 0.2]), np.array([0.03, -0.02])
+
+    def feature(screen):
+        centred = screen - 0.5
+        return head + gain * centred + bend * centred[:, ::-1] ** 2 + rng.normal(0, noise, screen.shape)
+
+    samples, windows = [], []
+    for index, point in enumerate(targets(9)):
+        start = index * (SETTLE_S + DWELL_S)
+        times = start + np.arange(0, SETTLE_S + DWELL_S, 1 / fps)
+        values = feature(np.repeat(point[None], len(times), axis=0))
+        samples += [(t, x, y, x, y) for t, (x, y) in zip(times, values)]
+        windows.append((start + SETTLE_S, start + SETTLE_S + DWELL_S))
+    calibration = fit_samples(samples, windows, targets(9), model, (1920, 1080))
+
+    looked_at = rng.uniform(0, 1, (2000, 2))
+    observed = feature(looked_at)
+    target_cells = np.minimum((looked_at * grid).astype(int), grid - 1)
+
+    def hit_rate(positions):
+        cells = np.minimum((positions * grid).astype(int), grid - 1)
+        return np.all(cells == target_cells, axis=1).mean()
+
+    calibrated = hit_rate(calibration.mapping("iris").map(observed))
+    assert calibrated > 0.8
+    assert calibrated > hit_rate(np.clip(observed, 0.0, 1.0))
+
+
+def test_map_point_beyond_the_horizon_is_none():
+    # w = 1 - x: the line x = 1 is the horizon, samples right of it are behind it
+    mapping = ScreenMapping("homography", [[1, 0, 0], [0, 1, 0], [-1, 0, 1]])
+    assert mapping.map_point(0.5, 0.5) == pytest.approx((1.0, 1.0))
+    assert mapping.map_point(1.0, 0.5) is None
+    assert mapping.map_point(1.5, 0.5) is None
+    mapped = mapping.map([[0.25, 0.5], [1.0, 0.5], [2.0, 0.5]])
+    assert np.isfinite(mapped[0]).all() and np.isnan(mapped[1:]).all()
+
+
+def test_homography_with_the_horizon_through_the_targets_is_rejected():
+    matrix = [[1, 0, 0], [0, 1, 0], [1, 0, -0.5]]  # w = x - 0.5 changes sign among the targets
+    features = targets(9, margin=0.1)
+    features = features[np.abs(features[:, 0] - 0.5) > 0.05]
+    with pytest.raises(ValueError, match="horizon"):
+        fit(features, _project(matrix, features), "homography")
@@ -0,0 +1,41 @@
+# tests/test_facemesh.py
+
+import numpy as np
+
+from conftest import face_frame
+from facemesh import RoiFaceMesh
+
+
+def test_roi_follows_the_face(stub_face_mesh):
+    runner = RoiFaceMesh(stub_face_mesh, roi_size=128)
+    frame = face_frame(640, 480)
+    first = runner.process(frame)
+    second = runner.process(frame)
+    assert runner.stats()["roi_frames"] == 1 and runner.stats()["full_searches"] == 1
+    assert stub_face_mesh.shapes[-1] == (128, 128)
+    np.testing.assert_allclose(second[:, :2], first[:, :2], atol=0.01)
+
+
+def test_box_off_a_smaller_frame_searches_the_full_frame(stub_face_mesh):
+    runner = RoiFaceMesh(stub_face_mesh, roi_size=128)
+    runner.process(face_frame(640, 480, face=(0.7, 0.6, 0.2)))
+    assert runner.box is not None
+    # The same face at half resolution: the old box lies partly or wholly outside the frame
+    small = face_frame(320, 240, face=(0.7, 0.6, 0.2))
+    landmarks = runner.process(small)
+    assert landmarks is not None
+    assert runner.stats()["reacquisitions"] == 1
+    x0, y0, side = runner.box
+    assert x0 + side <= 320 and y0 + side <= 240
+    np.testing.assert_allclose(landmarks[0, :2], [0.7, 0.6], atol=0.01)
+
+
+def test_box_is_clamped_into_the_frame(stub_face_mesh):
+    runner = RoiFaceMesh(stub_face_mesh, roi_size=128)
+    frame = face_frame(640, 480)
+    runner.process(frame)
+    x0, y0, side = runner.box
+    runner.box = (640 - side // 2, y0, side)  # Half off the right edge, but small enough to fit
+    assert runner.process(frame) is not None
+    assert runner.box[0] + side <= 640
+    assert runner.stats()["reacquisitions"] == 0
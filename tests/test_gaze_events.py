@@ -0,0 +1,103 @@
+# tests/test_gaze_events.py
+
+import numpy as np
+import pytest
+
+from calibration import IRIS_LANDMARK
+from gaze_events import FIXATION_START, SACCADE, GazeEvent, GazeEventBus, GazeEventDetector
+from recording import EYE_LANDMARKS, SessionRecorder
+from replay import recorded_gaze
+
+MIN_FIXATION = 0.1
+
+
+def scanpath(rng, fixations, fps=30.0, noise=0.003, saccade_s=0.05, min_s=0.15, max_s=0.8):
+    """
+    Synthetic gaze trace: fixations at random screen points joined by short saccades, with
+    landmark jitter and frame timing jitter. Returns (t, xy, fixation intervals).
+    """
+    points = [rng.uniform(0.05, 0.95, 2)]
+    while len(points) < fixations:
+        point = rng.uniform(0.05, 0.95, 2)
+        if np.hypot(*(point - points[-1])) > 0.1:  # Smaller jumps are corrections, not new fixations
+            points.append(point)
+    times, positions, truth = [], [], []
+    t = 0.0
+    for index, point in enumerate(points):
+        if index:
+            start, previous = t, points[index - 1]
+            while t < start + saccade_s:
+                times.append(t)
+                positions.append(previous + (point - previous) * (t - start) / saccade_s)
+                t += rng.uniform(0.8, 1.2) / fps
+        start = t
+        end = t + rng.uniform(min_s, max_s)
+        while t < end:
+            times.append(t)
+            positions.append(point)
+            t += rng.uniform(0.8, 1.2) / fps
+        truth.append((start, times[-1], point))
+    xy = np.array(positions) + rng.normal(0, noise, (len(positions), 2))
+    return np.array(times), xy, truth
+
+
+def write_trace(path, times, xy):
+    """Store a gaze trace as an eyes-only recording (iris and eye corners at the gaze point)."""
+    recorder = SessionRecorder(path, indices=EYE_LANDMARKS, source="synthetic", queue_size=len(times) + 16)
+    points = np.zeros((max(EYE_LANDMARKS) + 1, 3), dtype=np.float32)
+    for n, (t, (x, y)) in enumerate(zip(times, xy)):
+        points[[IRIS_LANDMARK, 362, 133], 0] = 1.0 - x  # Recorded unmirrored, like the camera sees it
+        points[[IRIS_LANDMARK, 362, 133], 1] = y
+        recorder.frame(points, recorder.t0 + t, n)
+    recorder.close()
+
+
+def detect(path):
+    """Events of a detector fed a recording's gaze the way the trackers read it."""
+    detector = GazeEventDetector(min_fixation=MIN_FIXATION)
+    events = []
+    for t, (x, y) in zip(*recorded_gaze(path)):
+        events += detector.update(t, x, y)
+    return events
+
+
+@pytest.mark.parametrize("noise", [0.002, 0.006])
+def test_fixations_of_a_recorded_scanpath(tmp_path, noise):
+    """
+    Recall over the true fixations long enough to be reported, precision over all
+    fixation starts (one must fall inside a fixation or on the frame after it, near its point).
+    """
+    times, xy, truth = scanpath(np.random.default_rng(0), 200, noise=noise)
+    write_trace(tmp_path / "scanpath.cbr", times, xy)
+    starts = [e for e in detect(tmp_path / "scanpath.cbr") if e.kind == FIXATION_START]
+    matched, reportable = set(), 0
+    for start, end, point in truth:
+        reportable += int(end - start >= MIN_FIXATION + 0.05)  # Shorter ones cannot be reported
+        for n, event in enumerate(starts):
+            if n not in matched and start <= event.t <= end + 0.05 and \
+                    np.hypot(event.x - point[0], event.y - point[1]) < 0.05:
+                matched.add(n)
+                break
+    assert min(1.0, len(matched) / reportable) >= 0.95, "missed fixations"
+    assert len(matched) / len(starts) >= 0.95, "spurious fixations"
+
+
+def test_steady_gaze_is_one_fixation(tmp_path):
+    """Looking at one point for 10 s: exactly one fixation, however noisy the landmarks."""
+    times = np.arange(0, 10, 1 / 30)
+    steady = 0.5 + np.random.default_rng(0).normal(0, 0.006, (len(times), 2))
+    write_trace(tmp_path / "steady.cbr", times, steady)
+    events = detect(tmp_path / "steady.cbr")
+    assert sum(e.kind == FIXATION_START for e in events) == 1
+    assert not any(e.kind == SACCADE for e in events)
+
+
+def test_bus_dispatches_by_kind():
+    bus = GazeEventBus()
+    starts, everything = [], []
+    bus.subscribe(lambda event, frame: starts.append((event, frame)), FIXATION_START)
+    bus.subscribe(lambda event, frame: everything.append(event))
+    events = [GazeEvent(SACCADE, 0.0, 0.1, 0.1, 0.0), GazeEvent(FIXATION_START, 0.1, 0.5, 0.5, 0.1)]
+    bus.publish(events, "frame")
+    assert starts == [(events[1], "frame")]
+    assert everything == events
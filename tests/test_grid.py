@@ -0,0 +1,66 @@
+# tests/test_grid.py
+
+import random
+
+import pytest
+
+from headaway import BACKGROUND_COLOR, HIGHLIGHT_COLOR, TARGET_COLOR, GridRenderer
+
+COLOURS = (BACKGROUND_COLOR, HIGHLIGHT_COLOR, TARGET_COLOR)
+
+
+class StubCanvas:
+    """Tk canvas stand-in: keeps items and counts the calls that reach it."""
+
+    def __init__(self):
+        self.items = {}
+        self.itemconfigs = 0
+
+    def create_rectangle(self, *coords, **options):
+        item = len(self.items) + 1
+        self.items[item] = options
+        return item
+
+    def itemconfig(self, item, **options):
+        self.items[item].update(options)
+        self.itemconfigs += 1
+
+    def find_all(self):
+        return tuple(self.items)
+
+
+@pytest.fixture(params=["stub", "tk"])
+def canvas(request):
+    if request.param == "stub":
+        yield StubCanvas()
+        return
+    tk = pytest.importorskip("tkinter")
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    root.withdraw()
+    yield tk.Canvas(root, width=500, height=500)
+    root.destroy()
+
+
+@pytest.mark.parametrize("size", [3, 5])
+def test_item_count_stays_fixed_under_recolouring(canvas, size):
+    rng = random.Random(0)
+    renderer = GridRenderer(canvas, size, 500 // size, 500 // size)
+    cells = list(renderer.items)
+    for _ in range(5):
+        for _ in range(20_000):
+            renderer.set_fill(rng.choice(cells), rng.choice(COLOURS))
+        assert renderer.item_count() == size * size
+
+
+def test_unchanged_fill_does_not_reach_the_canvas():
+    canvas = StubCanvas()
+    renderer = GridRenderer(canvas, 5, 100, 100)
+    renderer.set_fill((1, 2), BACKGROUND_COLOR)
+    assert canvas.itemconfigs == 0
+    renderer.set_fill((1, 2), TARGET_COLOR)
+    renderer.set_fill((1, 2), TARGET_COLOR)
+    assert canvas.itemconfigs == 1
+    assert canvas.items[renderer.items[(1, 2)]]["fill"] == TARGET_COLOR
@@ -0,0 +1,93 @@
+# tests/test_quality.py
+
+import numpy as np
+import pytest
+
+from conftest import face_frame
+from facemesh import RoiFaceMesh
+from preprocess import FramePreprocessor
+from quality import LEVELS, TRACES, QualityController, level_cost, simulate
+from recording import FACE_LANDMARKS, LANDMARK_SETS, NUM_LANDMARKS, Recording, SessionRecorder
+from replay import RecordedFaceMesh
+
+BUDGET_S = 0.1
+
+
+def test_idle_keeps_full_quality():
+    assert simulate(TRACES["idle"], budget_s=BUDGET_S)["decisions"] == []
+
+
+@pytest.mark.parametrize("name", ["overload", "pressure"])
+def test_load_is_absorbed_and_full_quality_recovered(name):
+    trace = TRACES[name]
+    timeline = simulate(trace, budget_s=BUDGET_S)["timeline"]
+    start = trace[0][0]
+    end = start + trace[1][0]
+    settled = [level for t, level, _ in timeline if start + 8 <= t < end]
+    assert all(trace[1][2] * level_cost(LEVELS[level]) <= BUDGET_S for level in settled), \
+        "still over budget 8 s into the load"
+    assert timeline[-1][1] == 0, "did not return to full quality after the load"
+
+
+def test_steady_load_settles_on_one_level():
+    run = simulate(TRACES["borderline"], budget_s=BUDGET_S)
+    late = [d for d in run["decisions"] if d["time"] > run["timeline"][-1][0] - 90]
+    assert len(late) <= 4
+
+
+@pytest.mark.parametrize("landmark_set", sorted(LANDMARK_SETS))
+def test_recording_down_to_the_last_level(tmp_path, landmark_set):
+    """
+    Overload the controller down to its last level (no iris refinement: 468-row frames)
+    while recording every processed frame, as eyetracking.py --record does; the recording
+    reads back with the row count of each frame.
+    """
+    fps, hold = 30.0, 5.0
+    rng = np.random.default_rng(0)
+    now = [0.0]
+    controller = QualityController(budget_s=BUDGET_S, clock=lambda: now[0], log=lambda message: None,
+                                   cpu_percent=lambda: 99.0)
+    last = len(controller.levels) - 1
+    path = tmp_path / f"{landmark_set}.cbr"
+    recorder = SessionRecorder(path, indices=LANDMARK_SETS[landmark_set], queue_size=int(120 * fps))
+    refined = []
+    at_last = None
+    while now[0] < 120.0 and (at_last is None or now[0] - at_last < hold):
+        now[0] += 1.0 / fps
+        if controller.skip_frame():
+            continue
+        rows = NUM_LANDMARKS if controller.level.refine else FACE_LANDMARKS
+        recorder.frame(rng.random((rows, 3), dtype=np.float32), recorder.t0 + now[0], len(refined))
+        refined.append(controller.level.refine)
+        controller.update(1.0)  # More load than any level can absorb
+        if controller.index == last and at_last is None:
+            at_last = now[0]
+    assert at_last is not None, f"never reached level {last}"
+    assert recorder._thread.is_alive()
+    recorder.close()
+    assert recorder.stats()["frames"] == len(refined) and not recorder.stats()["dropped"]
+    assert refined.count(False)
+    replayed = RecordedFaceMesh(Recording(path))
+    for refine in refined:
+        landmarks = replayed.process(None)
+        assert landmarks is not None
+        assert len(landmarks) == (NUM_LANDMARKS if refine else FACE_LANDMARKS)
+
+
+def test_roi_follows_the_processing_scale(stub_face_mesh):
+    """Down the whole ladder and back up, applied as eyetracking.py does: the crop stays on the face."""
+    runner = RoiFaceMesh(stub_face_mesh, roi_size=LEVELS[0].roi_size)
+    preprocessor = FramePreprocessor()
+    camera = face_frame(640, 480, face=(0.6, 0.5, 0.2))
+    scale = 1.0
+    for level in LEVELS + LEVELS[-2::-1]:
+        if level.scale != scale:
+            runner.rescale(level.scale / scale)
+        scale = level.scale
+        runner.set_roi_size(level.roi_size)
+        for _ in range(3):
+            landmarks = runner.process(preprocessor.rgb(camera, scale=scale))
+            assert landmarks is not None
+            np.testing.assert_allclose(landmarks[0, :2], [0.6, 0.5], atol=0.01)
+    assert runner.stats()["reacquisitions"] == 0
+    assert runner.stats()["full_searches"] == 1
@@ -0,0 +1,109 @@
+# tests/test_serial_link.py
+"""arduino_control.py's framing and SerialLink against the pty stand-in for the board."""
+
+import random
+import time
+
+import pytest
+
+from conftest import wait_for
+from arduino_control import (MSG_BLINK, MSG_DWELL, MSG_GAZE, FrameDecoder, LoopbackDevice, SerialLink,
+                             crc16, encode_frame, gaze_payload)
+
+
+@pytest.fixture
+def board(tmp_path):
+    """Opens a LoopbackDevice and a SerialLink to it; both are closed after the test."""
+    opened = []
+
+    def open_board(device_options=None, **link_options):
+        device = LoopbackDevice(tmp_path / "tty", **(device_options or {})).plug()
+        link = SerialLink(str(tmp_path / "tty"), **link_options).start()
+        opened.append((device, link))
+        assert wait_for(lambda: link.connected)
+        return device, link
+
+    yield open_board
+    for device, link in opened:
+        link.stop()
+        device.unplug()
+
+
+def test_crc16_check_value():
+    assert crc16(b"123456789") == 0x29B1  # CRC-16/CCITT-FALSE
+
+
+def test_decoder_resyncs_on_noise_and_bad_crc():
+    frames = [encode_frame(MSG_GAZE, n, gaze_payload(n / 10, 0.5)) for n in range(5)]
+    damaged = bytearray(frames[2])
+    damaged[-1] ^= 0xFF
+    stream = b"\x00\xa5\xff" + frames[0] + frames[1] + bytes(damaged) + b"junk" + frames[3] + frames[4]
+    decoder = FrameDecoder()
+    decoded = []
+    for byte in stream:  # Frames split at every possible point
+        decoded += decoder.feed(bytes((byte,)))
+    assert [seq for _, seq, _ in decoded] == [0, 1, 3, 4]
+    assert decoded[0] == (MSG_GAZE, 0, gaze_payload(0.0, 0.5))
+    assert decoder.crc_errors >= 1
+
+
+def test_reliable_commands_arrive_once(board):
+    device, link = board(queue_size=500, pace=False)
+    for n in range(500):
+        link.dwell(0.5, 0.5, n / 1000)
+    assert link.flush(30.0)
+    assert wait_for(lambda: device.received.get(MSG_DWELL, 0) >= 500)
+    assert device.received[MSG_DWELL] == 500
+
+
+def test_corrupted_bytes_are_retransmitted(board):
+    device, link = board({"corrupt": 0.1, "seed": 0}, queue_size=200, ack_timeout=0.02, max_retries=20)
+    for n in range(200):
+        link.dwell(0.5, 0.5, n / 1000)
+    assert link.flush(10.0)
+    assert device.received.get(MSG_DWELL, 0) == 200 and not link.stats()["lost"]
+
+
+def test_silent_board_accounts_for_every_blink(board):
+    """
+    A board that never acks, under a gaze flood: the gaze numbering must not wrap onto
+    commands waiting for their ack, so every blink is given up (lost) or dropped by the
+    full queue, none silently overwritten.
+    """
+    device, link = board({"acks": False}, pace=False, ack_timeout=0.1, max_retries=5)
+    rng = random.Random(0)
+    blinks = 200
+    for n in range(blinks):
+        link.blink("blink")
+        for _ in range(rng.randrange(10, 60)):  # Irregular gaze counts between blinks
+            link.gaze((n % 100) / 100, 0.5)
+            time.sleep(0.0002)
+    assert link.flush(5.0)
+    stats = link.stats()
+    written = blinks - stats["dropped"]
+    assert stats["lost"] == written
+    assert stats["lost"] + stats["acked"] + stats["dropped"] + stats["inflight"] + stats["queued_now"] == blinks
+    assert device.received.get(MSG_BLINK, 0) == written
+
+
+def test_commands_survive_an_unplug(board):
+    outage = 0.5
+    device, link = board()
+    sent = 0
+    start = time.monotonic()
+    unplugged = replugged = False
+    while time.monotonic() - start < 1.0 + outage:
+        elapsed = time.monotonic() - start
+        if not unplugged and elapsed >= 0.3:
+            device.unplug()
+            unplugged = True
+        if unplugged and not replugged and elapsed >= 0.3 + outage:
+            device.plug()
+            replugged = True
+        link.dwell(0.5, 0.5, sent / 1000)
+        sent += 1
+        time.sleep(0.02)
+    assert link.flush(10.0)
+    assert wait_for(lambda: device.received.get(MSG_DWELL, 0) >= sent)
+    assert device.received[MSG_DWELL] == sent
+    assert link.stats()["connects"] >= 2
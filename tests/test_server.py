@@ -0,0 +1,62 @@
+# tests/test_server.py
+
+import threading
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("server")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("CEREBLAID_RUN_DIR", str(directory / "run"))
+        patch.setenv("CEREBLAID_LOG_DIR", str(directory / "logs"))
+        patch.setenv("CEREBLAID_DB", str(directory / "cereblaid.db"))
+        import server
+    yield server
+    server.supervisor.shutdown()
+
+
+@pytest.fixture
+def client(server):
+    client = server.app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "doctor@example.com"
+        session["role"] = "doctor"
+    return client
+
+
+def test_streams_beyond_the_cap_are_refused(server, client, monkeypatch):
+    monkeypatch.setattr(server, "_stream_slots", threading.BoundedSemaphore(1))
+    first = client.get("/api/script-log/eyetracking.py/stream")
+    assert first.status_code == 200
+    refused = client.get("/api/script-log/eyetracking.py/stream")
+    assert refused.status_code == 503 and refused.headers["Retry-After"]
+    first.close()
+    again = client.get("/api/script-log/eyetracking.py/stream")
+    assert again.status_code == 200
+    again.close()
+
+
+def test_streams_end_after_their_lifetime(server, client, monkeypatch):
+    monkeypatch.setattr(server, "_stream_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(server, "SSE_MAX_STREAM_SECONDS", 0.0)
+    monkeypatch.setattr(server, "SSE_KEEPALIVE_SECONDS", 0.25)
+    response = client.get("/api/script-log/eyetracking.py/stream")
+    body = b"".join(response.response)  # Returns instead of streaming forever
+    response.close()
+    assert body.startswith(b"retry: ")
+    assert server._stream_slots.acquire(blocking=False)  # The slot was given back
+
+
+def test_metrics_are_refused_to_other_clients(server):
+    client = server.app.test_client()
+    remote = client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.7"})
+    assert remote.status_code == 403
+    scraper = client.get("/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"})
+    assert scraper.status_code == 200 and b"cereblaid_" in scraper.data
+
+
+def test_metrics_are_served_to_doctors(client):
+    response = client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.7"})
+    assert response.status_code == 200
@@ -0,0 +1,80 @@
+# tests/test_supervisor.py
+
+import json
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import wait_for
+from supervisor import RESTART_ON_FAILURE, Supervisor
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(60)"]
+CRASHER = [sys.executable, "-c", "import sys; print('boom', file=sys.stderr); sys.exit(3)"]
+FINISHER = [sys.executable, "-c", "pass"]
+MAX_RESTARTS = 3
+
+
+@pytest.fixture
+def supervisors(tmp_path):
+    """A supervisor and a second one on the same run dir (another server worker)."""
+    supervisor = Supervisor(tmp_path, reap_interval=0.1, startup_grace=0.2, max_restarts=MAX_RESTARTS)
+    other = Supervisor(tmp_path)
+    yield supervisor, other
+    supervisor.shutdown()
+    other.shutdown(stop_children=False)
+
+
+def test_concurrent_starts_launch_once(supervisors):
+    supervisor, _ = supervisors
+    barrier = threading.Barrier(8)
+    replies = []
+
+    def launch():
+        barrier.wait()
+        proc, already_running = supervisor.start("sleeper", SLEEPER)
+        replies.append((proc.pid, already_running))
+
+    threads = [threading.Thread(target=launch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(not already_running for _, already_running in replies) == 1
+    assert len({pid for pid, _ in replies}) == 1
+
+
+def test_another_supervisor_adopts_from_the_pid_file(supervisors):
+    supervisor, other = supervisors
+    proc, _ = supervisor.start("sleeper", SLEEPER)
+    adopted = other.get("sleeper")
+    assert adopted is not None and adopted.pid == proc.pid
+    assert adopted.popen is None  # Not ours to wait on
+    assert other.start("sleeper", SLEEPER)[1]
+    assert supervisor.stop("sleeper")
+    assert not other.is_running("sleeper")
+
+
+def test_recycled_pid_is_rejected(supervisors):
+    supervisor, other = supervisors
+    proc, _ = supervisor.start("sleeper", SLEEPER)
+    pid_path = supervisor.run_dir / "recycled.pid"
+    pid_path.write_text(json.dumps({"pid": proc.pid, "create_time": proc.create_time - 1000.0}))
+    assert other.get("recycled") is None
+    assert not pid_path.exists()
+
+
+def test_on_failure_restarts_keep_the_crash_and_respect_the_budget(supervisors):
+    supervisor, _ = supervisors
+    supervisor.start("crasher", CRASHER, restart_policy=RESTART_ON_FAILURE)
+    supervisor.start("finisher", FINISHER, restart_policy=RESTART_ON_FAILURE)
+    # The reaper respawns faster than startup_grace: the respawned status must still show the crash
+    assert wait_for(lambda: supervisor.status("crasher")["restarts"] >= 1, 10.0)
+    failure = supervisor.status("crasher")["last_failure"] or {}
+    assert failure.get("returncode") == 3 and "boom" in (failure.get("details") or "")
+    assert wait_for(lambda: supervisor.status("crasher")["restarts"] >= MAX_RESTARTS, 30.0)
+    time.sleep(1.0)  # Past the budget: no further restarts may follow
+    status = supervisor.status("crasher")
+    assert status["restarts"] == MAX_RESTARTS and not status["running"]
+    assert supervisor.status("finisher")["restarts"] == 0
@@ -0,0 +1,515 @@
+# trackerd.py
+"""
+Shared tracking daemon: one process owns the camera and the FaceMesh model and
+publishes every frame's landmarks to any number of local clients through shared memory.
+
+The segment (named "cereblaid-tracker", or $CEREBLAID_TRACKER) holds a small header and
+a ring of fixed-size slots. Each slot carries the capture timestamp (time.monotonic(),
+which is system-wide, so clients can measure latency against it), the frame number, a
+face flag, the (478, 3) landmark block and a downscaled copy of the camera frame for
+previews. Slots are written under a per-slot sequence number (a seqlock): the writer
+makes it odd before touching the slot and even again afterwards, and a reader that sees
+the number change while copying simply takes the newest slot again. Readers never
+block the writer and never take a lock, so any number of clients costs the daemon
+nothing; inference runs once per frame regardless. (Python has no memory barriers; the
+check relies on stores becoming visible in program order, as they do on x86.)
+
+Clients use TrackerClient, which looks like a FrameGrabber (read/finished/mark_done/
+stats/stop), together with SharedFaceMesh, which returns the daemon's landmarks for the
+frame just read in place of running FaceMesh. open_shared() returns the pair, like
+replay.open_replay(), so the tracking scripts' loops run unchanged. Attaching maps the
+segment and nothing else, so it takes milliseconds instead of a model load plus camera
+warm-up.
+
+    python trackerd.py serve --idle-exit 60
+    python trackerd.py probe --seconds 5
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+import psutil
+
+from capture import Frame
+from recording import FLAG_FACE, NUM_LANDMARKS
+
+SHM_NAME = "cereblaid-tracker"
+MAGIC = b"CBAIDTRK"
+VERSION = 1
+DEFAULT_SLOTS = 8
+DEFAULT_FRAME_WIDTH = 320  # Width of the frame copy in each slot (height keeps the camera's aspect)
+STATUS_RUNNING = 1
+STATUS_STOPPED = 2
+STALE_AFTER = 2.0  # Seconds without a new frame before a client checks that the daemon is alive
+POLL_INTERVAL = 0.001
+DAEMON_STAGES = ("capture", "preprocess", "inference", "publish")
+
+HEADER_SIZE = 128
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("slots", "<u4"),
+    ("num_landmarks", "<u4"),
+    ("height", "<u4"),
+    ("width", "<u4"),
+    ("pid", "<u4"),
+    ("status", "<u4"),
+    ("fps", "<f8"),
+    ("head", "<u8"),  # Number of frames published; the newest is in slot (head - 1) % slots
+    ("client_seen", "<f8"),  # time.monotonic() of the latest client read (for --idle-exit)
+])
+
+
+def slot_dtype(num_landmarks, height, width):
+    return np.dtype([
+        ("seq", "<u8"),
+        ("t", "<f8"),
+        ("index", "<u8"),
+        ("flags", "<u4"),
+        ("landmarks", "<f4", (num_landmarks, 3)),
+        ("image", "u1", (height, width, 3)),
+    ], align=True)
+
+
+def default_name():
+    return os.environ.get("CEREBLAID_TRACKER", SHM_NAME)
+
+
+def _attach(name):
+    """Map an existing segment without letting this process's resource tracker unlink it on exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        pass
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix":
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")  # Only the daemon removes the segment
+    return shm
+
+
+class _Ring:
+    """Numpy views of the header and slots of a mapped segment."""
+
+    def __init__(self, shm, slots=None, num_landmarks=None, height=None, width=None):
+        self.shm = shm
+        self.header = np.ndarray((1,), HEADER_DTYPE, buffer=shm.buf)
+        if slots is None:
+            if self.header["magic"][0] != MAGIC or self.header["version"][0] != VERSION:
+                self.header = None
+                shm.close()
+                raise RuntimeError(f"Shared memory {shm.name!r} is not a tracker segment")
+            slots, num_landmarks, height, width = (int(self.header[field][0]) for field in
+                                                   ("slots", "num_landmarks", "height", "width"))
+        self.slot_count = slots
+        self.slots = np.ndarray((slots,), slot_dtype(num_landmarks, height, width), buffer=shm.buf,
+                                offset=HEADER_SIZE)
+        self.head = self.header["head"]
+        self.seq = self.slots["seq"]
+        self.t = self.slots["t"]
+        self.index = self.slots["index"]
+        self.flags = self.slots["flags"]
+        self.landmarks = self.slots["landmarks"]
+        self.image = self.slots["image"]
+
+    @staticmethod
+    def size(slots, num_landmarks, height, width):
+        return HEADER_SIZE + slots * slot_dtype(num_landmarks, height, width).itemsize
+
+    def field(self, name):
+        return self.header[name][0]
+
+    def release(self):
+        # Every view must be gone before the mapping can be closed
+        self.header = self.slots = self.head = self.seq = self.t = None
+        self.index = self.flags = self.landmarks = self.image = None
+        self.shm.close()
+
+
+# --- Daemon side ---
+class TrackerPublisher:
+    """Creates the segment and writes frames into the ring (single writer)."""
+
+    def __init__(self, name=None, slots=DEFAULT_SLOTS, frame_size=(DEFAULT_FRAME_WIDTH, 240),
+                 num_landmarks=NUM_LANDMARKS, fps=0.0):
+        self.name = name or default_name()
+        width, height = frame_size
+        size = _Ring.size(slots, num_landmarks, height, width)
+        try:
+            shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            self._remove_stale(self.name)
+            shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self.ring = _Ring(shm, slots, num_landmarks, height, width)
+        header = self.ring.header
+        header["magic"], header["version"], header["slots"] = MAGIC, VERSION, slots
+        header["num_landmarks"], header["height"], header["width"] = num_landmarks, height, width
+        header["pid"], header["fps"], header["head"] = os.getpid(), fps or 0.0, 0
+        header["client_seen"] = 0.0
+        header["status"] = STATUS_RUNNING  # Last: clients only trust a fully initialised header
+        self.frame_size = frame_size
+        self.published = 0
+
+    @staticmethod
+    def _remove_stale(name):
+        """Unlink a segment left behind by a daemon that died; refuse if its owner is alive."""
+        shm = _attach(name)
+        ring = _Ring(shm)
+        pid, status = int(ring.field("pid")), int(ring.field("status"))
+        ring.release()
+        if status == STATUS_RUNNING and pid != os.getpid() and psutil.pid_exists(pid):
+            raise RuntimeError(f"Tracker daemon already running (PID {pid})")
+        shared_memory.SharedMemory(name=name).unlink()
+
+    def publish(self, landmarks, image, timestamp, index):
+        """Write one frame (landmarks None when no face was found) into the next slot."""
+        ring = self.ring
+        n = self.published
+        i = n % ring.slot_count
+        ring.seq[i] = 2 * n + 1  # Odd: slot is being written
+        ring.t[i] = timestamp
+        ring.index[i] = index
+        if landmarks is None:
+            ring.flags[i] = 0
+        else:
+            ring.flags[i] = FLAG_FACE
+            ring.landmarks[i, :len(landmarks)] = landmarks
+        cv2.resize(image, self.frame_size, dst=ring.image[i], interpolation=cv2.INTER_AREA)
+        ring.seq[i] = 2 * n + 2
+        ring.head[0] = n + 1
+        self.published = n + 1
+
+    @property
+    def client_seen(self):
+        return float(self.ring.field("client_seen"))
+
+    def close(self):
+        self.ring.header["status"] = STATUS_STOPPED
+        shm = self.ring.shm
+        self.ring.release()
+        shm.unlink()
+
+
+def serve(args):
+    """Run the camera + FaceMesh loop and publish every frame until SIGTERM (or --idle-exit)."""
+    from capture import FrameGrabber
+    from instrumentation import StageTimer, peak_rss_bytes, report_first_frame, script_metrics
+    from preprocess import FramePreprocessor
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    source_mesh = None
+    if args.replay:
+        from replay import open_replay
+        grabber, source_mesh = open_replay(args.replay, realtime=True)  # Paced like a camera
+    else:
+        grabber = FrameGrabber(args.camera, width=args.width, height=args.height, fps=args.fps or None)
+
+    # Load the model before capture starts so the first published frame is fresh
+    if source_mesh is not None:
+        face_mesh = source_mesh
+    else:
+        import mediapipe as mp
+        from facemesh import RoiFaceMesh
+        face_mesh = RoiFaceMesh(mp.solutions.face_mesh.FaceMesh(refine_landmarks=True, max_num_faces=1),
+                                roi=args.roi, roi_size=args.roi_size)
+
+    # The segment is sized from the first frame
+    if not grabber.open():
+        print("!!! ERROR: Could not open webcam.")
+        return 1
+    grabber.start()
+    first = grabber.read(timeout=10.0)
+    if first is None:
+        print("!!! ERROR: Camera delivered no frames.")
+        grabber.stop()
+        return 1
+
+    height, width = first.image.shape[:2]
+    frame_size = (args.frame_width, max(1, round(height * args.frame_width / width)))
+    try:
+        publisher = TrackerPublisher(args.name, args.slots, frame_size, fps=args.fps)
+    except RuntimeError as e:
+        print(f"!!! ERROR: {e}")
+        grabber.stop()
+        return 1
+    print(f">>> Tracker daemon publishing {width}x{height} frames as {publisher.name!r} "
+          f"({args.slots} slots, {publisher.ring.slots.itemsize} bytes each)")
+
+    preprocessor = FramePreprocessor()
+    # Frame count always (for the exit stats); exact stage samples only for --stats-json, the
+    # daemon runs indefinitely. Launched by the server, stages also go to its /metrics.
+    timer = StageTimer(DAEMON_STAGES, metrics=script_metrics("trackerd.py"),
+                       keep_samples=args.stats_json is not None, script="trackerd.py")
+    started = time.monotonic()
+    captured = first
+    try:
+        while not stop_event.is_set():
+            timer.start()
+            if captured is None:
+                captured = grabber.read(timeout=1.0)
+                if captured is None:
+                    if grabber.finished:
+                        print(">>> Source finished")
+                        break
+                    continue
+            timer.lap("capture")
+            rgb = preprocessor.rgb(captured.image)
+            timer.lap("preprocess")
+            landmarks = face_mesh.process(rgb)
+            timer.lap("inference")
+            publisher.publish(landmarks, captured.image, captured.timestamp, captured.index)
+            timer.lap("publish")
+            timer.frame_done()
+            if timer.frames == 1:
+                report_first_frame()
+            captured = None
+            if args.idle_exit:
+                last_use = max(publisher.client_seen, started)
+                if time.monotonic() - last_use > args.idle_exit:
+                    print(f">>> No clients for {args.idle_exit:.0f}s, exiting")
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publisher.close()
+        grabber.stop()
+        face_mesh.close()
+        summary = dict(timer.summary(), published=publisher.published, capture=grabber.stats(),
+                       inference=face_mesh.stats(), peak_rss_bytes=peak_rss_bytes())
+        print(f">>> Tracker stats: {json.dumps(summary)}")
+        if args.stats_json:
+            with open(args.stats_json, "w") as f:
+                json.dump(summary, f, indent=2)
+    return 0
+
+
+# --- Client side ---
+class TrackerClient:
+    """
+    FrameGrabber stand-in that reads the newest published frame from the daemon.
+
+    read() returns a capture.Frame whose image is the slot's downscaled camera frame
+    (BGR, not mirrored, like a camera frame) and sets .landmarks to that frame's
+    landmarks (None without a face). Like a camera grabber it always returns the newest
+    frame; frames published in between are counted as dropped.
+    """
+
+    def __init__(self, name=None, wait=0.0):
+        self.name = name or default_name()
+        self.wait = wait  # Seconds to wait for the daemon to come up in open()
+        self.ring = None
+        self.landmarks = None
+        self.eof = False
+        self._image = None
+        self._last = 0
+        self._last_new = time.monotonic()
+        self._interval = 0.0
+        self.attach_ms = None
+        self.delivered = 0
+        self.dropped = 0
+        self.retries = 0
+        self.latency = []
+
+    def open(self):
+        """Attach to the daemon's segment (waiting up to self.wait seconds). Returns False if absent."""
+        if self.ring is not None:
+            return True
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.wait
+        while True:
+            try:
+                ring = _Ring(_attach(self.name))
+                if int(ring.field("status")) == STATUS_RUNNING:
+                    break
+                ring.release()  # A segment being torn down; the daemon may be restarting
+            except (FileNotFoundError, RuntimeError, ValueError):
+                pass
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        self.ring = ring
+        self._image = np.empty(ring.image.shape[1:], dtype=np.uint8)
+        self._last = int(ring.head[0])  # Only frames published from now on
+        self._last_new = time.monotonic()
+        fps = float(ring.field("fps"))
+        self._interval = 1.0 / fps if fps > 0 else 0.0
+        self.attach_ms = (time.perf_counter() - start) * 1000
+        return True
+
+    def start(self):
+        if not self.open():
+            raise RuntimeError(f"Tracker daemon {self.name!r} is not running")
+        return self
+
+    @property
+    def frame_size(self):
+        """(width, height) of the images read() returns."""
+        return int(self.ring.field("width")), int(self.ring.field("height"))
+
+    def _daemon_gone(self):
+        pid, status = int(self.ring.field("pid")), int(self.ring.field("status"))
+        return status != STATUS_RUNNING or not psutil.pid_exists(pid)
+
+    def read(self, timeout=None):
+        """The newest Frame published since the last read, or None on timeout / once the daemon is gone."""
+        ring = self.ring
+        if ring is None or self.eof:
+            return None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            head = int(ring.head[0])
+            if head > self._last:
+                n = head - 1
+                i = n % ring.slot_count
+                expected = 2 * n + 2
+                if int(ring.seq[i]) == expected:
+                    t, index, flags = float(ring.t[i]), int(ring.index[i]), int(ring.flags[i])
+                    landmarks = ring.landmarks[i].copy() if flags & FLAG_FACE else None
+                    np.copyto(self._image, ring.image[i])
+                    if int(ring.seq[i]) == expected:  # Not overwritten while copying
+                        self.dropped += head - self._last - 1
+                        self._last = head
+                        self._last_new = time.monotonic()
+                        self.landmarks = landmarks
+                        self.delivered += 1
+                        ring.header["client_seen"] = self._last_new
+                        return Frame(self._image, t, index)
+                self.retries += 1  # The writer lapped us mid-copy: take the newest slot again
+                continue
+            now = time.monotonic()
+            if now - self._last_new > STALE_AFTER and self._daemon_gone():
+                self.eof = True
+                return None
+            if deadline is not None and now >= deadline:
+                return None
+            # Sleep through most of the frame interval, then poll closely for the frame itself
+            early = self._last_new + self._interval * 0.8 - now
+            time.sleep(early if early > POLL_INTERVAL else POLL_INTERVAL)
+
+    @property
+    def finished(self):
+        return self.eof
+
+    def mark_done(self, frame, now=None):
+        now = time.monotonic() if now is None else now
+        if len(self.latency) < 10000:
+            self.latency.append(now - frame.timestamp)
+
+    def stats(self):
+        stats = {"source": "trackerd", "attach_ms": self.attach_ms, "delivered": self.delivered,
+                 "dropped": self.dropped, "retries": self.retries}
+        if self.latency:
+            samples = np.asarray(self.latency) * 1000
+            stats["latency_ms_p50"] = float(np.percentile(samples, 50))
+            stats["latency_ms_p95"] = float(np.percentile(samples, 95))
+            stats["latency_ms_max"] = float(samples.max())
+        return stats
+
+    def stop(self, timeout=None):
+        if self.ring is not None:
+            self.ring.release()
+            self.ring = None
+
+    release = stop
+
+
+class SharedFaceMesh:
+    """RoiFaceMesh stand-in returning the daemon's landmarks for the frame the client just read."""
+
+    def __init__(self, client):
+        self.client = client
+        self.frames = 0
+        self.faces = 0
+
+    def process(self, rgb):
+        self.frames += 1
+        landmarks = self.client.landmarks
+        if landmarks is not None:
+            self.faces += 1
+        return landmarks
+
+    def stats(self):
+        return {"frames": self.frames, "faces": self.faces, "source": "trackerd"}
+
+    def close(self):
+        pass
+
+
+def open_shared(name=None, wait=0.0):
+    """(client, face_mesh) attached to the tracker daemon, or None if it is not running."""
+    client = TrackerClient(name, wait=wait)
+    if not client.open():
+        return None
+    return client, SharedFaceMesh(client)
+
+
+def probe(args):
+    """Attach as a client and report attach time, delivered/dropped frames and latency."""
+    shared = open_shared(args.name, wait=args.wait)
+    if shared is None:
+        print(json.dumps({"error": "tracker daemon not running"}))
+        return 1
+    client, _ = shared
+    start = time.monotonic()
+    while time.monotonic() - start < args.seconds:
+        frame = client.read(timeout=1.0)
+        if frame is None:
+            if client.finished:
+                break
+            continue
+        client.mark_done(frame)
+    stats = dict(client.stats(), seconds=time.monotonic() - start)
+    stats["fps"] = stats["delivered"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    client.stop()
+    print(json.dumps(stats))
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Shared camera + FaceMesh tracking daemon.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("serve", help="Own the camera and publish landmarks to clients.")
+    p.add_argument("--camera", default="0", help="Camera index or video file path (default: 0).")
+    p.add_argument("--replay", default=None, metavar="PATH",
+                   help="Publish a video file or .cbr recording (paced in real time) instead of the camera.")
+    p.add_argument("--width", type=int, default=None, help="Requested capture width in pixels.")
+    p.add_argument("--height", type=int, default=None, help="Requested capture height in pixels.")
+    p.add_argument("--fps", type=float, default=30.0, help="Requested camera frame rate.")
+    p.add_argument("--roi", action=argparse.BooleanOptionalAction, default=True,
+                   help="Run inference on a crop around the tracked face instead of the full frame.")
+    p.add_argument("--roi-size", type=int, default=256)
+    p.add_argument("--slots", type=int, default=DEFAULT_SLOTS, help="Ring buffer length in frames.")
+    p.add_argument("--frame-width", type=int, default=DEFAULT_FRAME_WIDTH,
+                   help="Width of the frame copy published with the landmarks (for previews).")
+    p.add_argument("--idle-exit", type=float, default=0.0, metavar="SECONDS",
+                   help="Exit (releasing the camera) after this long without any client reading (0 = never).")
+    p.add_argument("--stats-json", default=None, metavar="PATH", help="Write stage timings here on exit.")
+
+    p = sub.add_parser("probe", help="Attach as a client and print attach time, frame rate and latency.")
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--wait", type=float, default=0.0, help="Seconds to wait for the daemon to appear.")
+
+    for p in sub.choices.values():
+        p.add_argument("--name", default=None, help="Shared memory name (default: $CEREBLAID_TRACKER or "
+                                                    f"{SHM_NAME}).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    return serve(args) if args.command == "serve" else probe(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,543 @@
+# zygote.py
+"""
+Warm launcher for the tracking scripts.
+
+A fresh interpreter spends most of a tracker's first second importing numpy, OpenCV and
+mediapipe before it can touch a frame. The zygote imports them once, then forks a child
+for every launch that runs the script with runpy as __main__: the child starts with all
+of those modules already loaded (shared copy-on-write with the zygote).
+
+Only fork-safe work happens in the zygote. Nothing opens a display connection
+(pyautogui), creates a Tk root or starts threads (a FaceMesh graph starts several), so
+the zygote stays single-threaded; the child still does those things itself.
+
+Protocol, over a Unix socket with one connection per launch: the client sends one JSON
+line {"op": "launch", "argv", "cwd", "env"} with the write ends of the child's stdout and
+stderr pipes attached (SCM_RIGHTS). The zygote answers {"pid": ...} once it has forked
+and {"returncode": ...} when the child exits. {"op": "status"} returns what was preloaded
+and how long each import took. ZygoteLauncher wraps the client side as a drop-in for
+subprocess.Popen (supervisor.py's launcher) and falls back to Popen whenever the zygote
+is not running.
+
+    python zygote.py serve [--socket PATH] [--idle-exit SECONDS]
+    python zygote.py importtime [MODULE ...]
+"""
+
+import argparse
+import atexit
+import io
+import json
+import logging
+import os
+import re
+import runpy
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+# Imported by the zygote before it accepts launches. Third-party modules first (they are
+# the cost), then the repo's own modules the scripts import at startup.
+PRELOAD = (
+    "numpy", "cv2", "mediapipe", "PIL.Image", "tkinter", "PIL.ImageTk", "psutil",
+    "capture", "preprocess", "facemesh", "blink", "cursor", "telemetry", "recording",
+    "instrumentation", "trackerd", "replay", "store",
+)
+MAX_REQUEST_BYTES = 1024 * 1024
+CONNECT_TIMEOUT = 5.0
+
+
+def default_socket():
+    return Path(os.environ.get("CEREBLAID_RUN_DIR", Path(__file__).parent / "run")) / "zygote.sock"
+
+
+def _send(conn, message):
+    conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+class _LineReader:
+    """Newline-delimited JSON messages from a stream socket."""
+
+    def __init__(self, conn, data=b""):
+        self.conn = conn
+        self.buffer = data
+
+    def pending(self):
+        """The next complete message, if one has been received already."""
+        line, sep, rest = self.buffer.partition(b"\n")
+        if not sep:
+            return None
+        self.buffer = rest
+        return json.loads(line)
+
+    def read(self):
+        """Block (up to the socket timeout) for the next message; None on EOF."""
+        while True:
+            message = self.pending()
+            if message is not None:
+                return message
+            data = self.conn.recv(65536)
+            if not data:
+                return None
+            self.buffer += data
+            if len(self.buffer) > MAX_REQUEST_BYTES:
+                raise ValueError("message too large")
+
+
+# --- Server (the zygote process) ---
+class Zygote:
+    """Preloads PRELOAD, then forks one child per launch request on socket_path."""
+
+    def __init__(self, socket_path, idle_exit=0.0):
+        self.socket_path = Path(socket_path)
+        self.idle_exit = idle_exit
+        self.started_at = time.time()
+        self.preloaded = {}  # Module -> import milliseconds
+        self.failed = {}  # Module -> error
+        self.launches = 0
+        self.children = {}  # PID -> client connection (None once the client hung up)
+        self._stopping = False
+
+    def preload(self, modules=PRELOAD):
+        for module in modules:
+            start = time.perf_counter()
+            try:
+                __import__(module)
+            except Exception as e:  # ImportError, or e.g. a TclError without a display
+                self.failed[module] = f"{type(e).__name__}: {e}"
+                continue
+            self.preloaded[module] = round((time.perf_counter() - start) * 1000, 1)
+        if threading.active_count() > 1:
+            raise RuntimeError("a preloaded module started a thread; forking would not be safe")
+
+    def status(self):
+        return {"pid": os.getpid(), "started_at": self.started_at, "launches": self.launches,
+                "children": sorted(self.children), "preload_ms": round(sum(self.preloaded.values()), 1),
+                "preloaded": self.preloaded, "failed": self.failed}
+
+    def serve(self):
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Bound under a temporary name and renamed into place: a client can only connect
+        # once the zygote is warm, and a stale socket of a dead zygote is replaced atomically
+        tmp = self.socket_path.with_name(f".{self.socket_path.name}.{os.getpid()}")
+        tmp.unlink(missing_ok=True)
+        listener.bind(str(tmp))
+        os.chmod(tmp, 0o600)
+        inode = os.stat(tmp).st_ino
+        listener.listen(16)
+        os.replace(tmp, self.socket_path)
+
+        wake_r, wake_w = os.pipe()
+        os.set_blocking(wake_r, False)
+        os.set_blocking(wake_w, False)
+        signal.set_wakeup_fd(wake_w)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)  # Handled via the wakeup fd
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._stop)
+
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(listener, selectors.EVENT_READ, "accept")
+        self._selector.register(wake_r, selectors.EVENT_READ, "signal")
+        self._listener, self._wake = listener, (wake_r, wake_w)
+        print(f">>> Zygote ready on {self.socket_path} (PID {os.getpid()}, preloaded "
+              f"{len(self.preloaded)} modules in {sum(self.preloaded.values()):.0f} ms)", flush=True)
+        last_active = time.monotonic()
+        try:
+            while not self._stopping:
+                for key, _ in self._selector.select(timeout=1.0):
+                    if key.data == "accept":
+                        self._accept()
+                    elif key.data == "signal":
+                        try:
+                            while os.read(wake_r, 512):
+                                pass
+                        except BlockingIOError:
+                            pass
+                        self._reap()
+                    else:
+                        self._client_readable(key.fileobj, key.data)
+                if self.children:
+                    last_active = time.monotonic()
+                elif self.idle_exit and time.monotonic() - last_active > self.idle_exit:
+                    print(f">>> Zygote idle for {self.idle_exit:.0f}s, exiting", flush=True)
+                    break
+        finally:
+            listener.close()
+            try:
+                if os.stat(self.socket_path).st_ino == inode:  # Not yet replaced by a newer zygote
+                    self.socket_path.unlink()
+            except OSError:
+                pass
+            self._selector.close()
+        return 0
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+    def _accept(self):
+        conn, _ = self._listener.accept()
+        fds = []
+        try:
+            conn.settimeout(CONNECT_TIMEOUT)
+            data, fds, _, _ = socket.recv_fds(conn, 65536, 2)
+            request = _LineReader(conn, data).read()
+            if request is None:
+                raise ValueError("connection closed before the request")
+            if request.get("op") == "status":
+                _send(conn, self.status())
+                conn.close()
+                return
+            if len(fds) != 2:
+                raise ValueError("a launch needs the stdout and stderr pipes")
+            pid = os.fork()
+            if pid == 0:
+                self._child(conn, request, fds)  # Does not return
+            self.launches += 1
+            self.children[pid] = conn
+            _send(conn, {"pid": pid})
+            conn.setblocking(False)
+            self._selector.register(conn, selectors.EVENT_READ, pid)
+        except (OSError, ValueError) as e:
+            try:
+                _send(conn, {"error": str(e)})
+            except OSError:
+                pass
+            conn.close()
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def _client_readable(self, conn, pid):
+        """The only thing a client sends after the request is EOF (server worker gone)."""
+        try:
+            if conn.recv(4096):
+                return
+        except BlockingIOError:
+            return
+        except OSError:
+            pass
+        self._selector.unregister(conn)
+        conn.close()
+        if pid in self.children:
+            self.children[pid] = None
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            conn = self.children.pop(pid, None)
+            if conn is None:
+                continue
+            try:
+                conn.setblocking(True)
+                _send(conn, {"returncode": os.waitstatus_to_exitcode(status)})
+            except OSError:
+                pass
+            self._selector.unregister(conn)
+            conn.close()
+
+    def _child(self, conn, request, fds):
+        """Runs in the forked child: become the requested script and never return."""
+        code = 1
+        try:
+            # Drop everything that belongs to the zygote
+            signal.set_wakeup_fd(-1)
+            for signum in (signal.SIGCHLD, signal.SIGTERM):
+                signal.signal(signum, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            for client in self.children.values():
+                if client is not None:
+                    client.close()
+            self._selector.close()
+            self._listener.close()
+            for fd in self._wake:
+                os.close(fd)
+            conn.close()
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+            null = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(null, 0)
+            os.close(null)
+            for fd, target in zip(fds, (1, 2)):
+                os.dup2(fd, target)
+                os.close(fd)
+            fds.clear()
+            for stream in (sys.stdout, sys.stderr):
+                stream.reconfigure(line_buffering=True)
+
+            os.chdir(request.get("cwd") or os.getcwd())
+            os.environ.clear()
+            os.environ.update(request.get("env") or {})
+            argv = request["argv"][1:]  # Drop the interpreter
+            sys.argv = argv
+            sys.path[0] = os.path.dirname(os.path.abspath(argv[0]))
+            if "numpy" in sys.modules:
+                sys.modules["numpy"].random.seed()  # Forked children would share one RNG state
+            code = self._run(argv[0])
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(code)
+
+    @staticmethod
+    def _run(script):
+        """Run script as __main__ and return its exit code, as the interpreter would."""
+        try:
+            runpy.run_path(script, run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        # Interpreter shutdown: wait for non-daemon threads, then the atexit handlers
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and not thread.daemon:
+                thread.join()
+        atexit._run_exitfuncs()
+        return code
+
+
+# --- Client ---
+class ZygoteProcess:
+    """A script forked by the zygote, with the parts of the Popen interface the supervisor uses."""
+
+    launcher = "zygote"
+
+    def __init__(self, args, reader, pid, stdout, stderr):
+        import psutil
+        self.args = args
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = None
+        self._conn = reader.conn
+        self._reader = reader
+        try:
+            self._create_time = psutil.Process(pid).create_time()
+        except psutil.NoSuchProcess:
+            self._create_time = None
+        self._lock = threading.Lock()
+
+    def _receive(self, timeout):
+        """Wait up to timeout for the zygote's exit report."""
+        with self._lock:
+            if self.returncode is not None:
+                return
+            if self._conn is None:
+                self._check_orphan()
+                return
+            try:
+                self._conn.settimeout(timeout)
+                message = self._reader.read()
+            except (socket.timeout, BlockingIOError):
+                return
+            except (OSError, ValueError):
+                message = None
+            if message is not None and "returncode" in message:
+                self.returncode = message["returncode"]
+                self._close()
+            elif message is None:
+                # The zygote went away; the child (now an orphan) can only be watched by PID
+                self._close()
+                self._check_orphan()
+
+    def _check_orphan(self):
+        import psutil
+        try:
+            proc = psutil.Process(self.pid)
+            if self._create_time is not None and abs(proc.create_time() - self._create_time) < 0.01 \
+                    and proc.status() != psutil.STATUS_ZOMBIE:
+                return
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        self.returncode = -1  # Exit status is lost with the zygote
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def poll(self):
+        if self.returncode is None:
+            self._receive(0.0)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            # Short slices, so poll() from other threads (the reaper) is never held up for long
+            step = 0.05 if remaining is None else min(0.05, remaining)
+            if self._conn is None:
+                time.sleep(step)
+            else:
+                self._receive(step)
+        return self.returncode
+
+    def send_signal(self, signum):
+        if self.poll() is None:
+            try:
+                os.kill(self.pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class ZygoteLauncher:
+    """
+    Popen replacement that forks scripts from the zygote at socket_path.
+
+    Used for commands of the form [sys.executable, <script in scripts>, ...]; anything
+    else, or any failure to reach the zygote, is started with subprocess.Popen instead.
+    Of the Popen arguments only cwd and env are passed on: stdout and stderr are always
+    text pipes (what the supervisor asks for).
+    """
+
+    def __init__(self, socket_path, scripts, timeout=CONNECT_TIMEOUT):
+        self.socket_path = Path(socket_path)
+        self.scripts = set(scripts)
+        self.timeout = timeout
+
+    def available(self):
+        return os.name == "posix" and self.socket_path.exists()
+
+    def __call__(self, command, **popen_kwargs):
+        command = [str(part) for part in command]
+        if len(command) > 1 and command[0] == sys.executable and Path(command[1]).name in self.scripts \
+                and self.available():
+            try:
+                return self.launch(command, cwd=popen_kwargs.get("cwd"), env=popen_kwargs.get("env"))
+            except (OSError, ValueError) as e:
+                log.warning(f"Zygote: could not launch {Path(command[1]).name} ({e}), starting it directly")
+        return subprocess.Popen(command, **popen_kwargs)
+
+    def launch(self, command, cwd=None, env=None):
+        request = {"op": "launch", "argv": command, "cwd": str(cwd or os.getcwd()),
+                   "env": dict(os.environ if env is None else env)}
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        (out_r, out_w), (err_r, err_w) = os.pipe(), os.pipe()
+        try:
+            try:
+                conn.settimeout(self.timeout)
+                conn.connect(str(self.socket_path))
+                socket.send_fds(conn, [json.dumps(request).encode() + b"\n"], [out_w, err_w])
+            finally:
+                os.close(out_w)  # The child holds the only write ends now
+                os.close(err_w)
+            reader = _LineReader(conn)
+            reply = reader.read()
+            if reply is None or "pid" not in reply:
+                raise OSError(reply.get("error") if reply else "zygote closed the connection")
+        except BaseException:
+            conn.close()
+            os.close(out_r)
+            os.close(err_r)
+            raise
+        stdout = io.open(out_r, "r", encoding="utf-8", errors="replace")
+        stderr = io.open(err_r, "r", encoding="utf-8", errors="replace")
+        return ZygoteProcess(command, reader, reply["pid"], stdout, stderr)
+
+    def status(self):
+        """The zygote's status dict, or None if it is not running."""
+        if not self.available():
+            return None
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+                conn.settimeout(self.timeout)
+                conn.connect(str(self.socket_path))
+                _send(conn, {"op": "status"})
+                return _LineReader(conn).read()
+        except (OSError, ValueError):
+            return None
+
+
+# --- Import time breakdown ---
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(modules=PRELOAD, python=sys.executable, cwd=None, timeout=120.0):
+    """
+    What importing modules costs a fresh interpreter, from its -X importtime output.
+
+    Returns {"modules", "wall_ms", "total_ms", "imports"}, where "imports" lists every
+    module loaded (in import order) with its self and cumulative milliseconds and its
+    nesting depth (0 = imported directly by one of modules).
+    """
+    code = (f"for name in {list(modules)!r}:\n"
+            "    try:\n"
+            "        __import__(name)\n"
+            "    except Exception:\n"
+            "        pass\n")
+    start = time.perf_counter()
+    result = subprocess.run([python, "-X", "importtime", "-c", code], cwd=cwd or Path(__file__).parent,
+                            capture_output=True, text=True, timeout=timeout)
+    wall_ms = (time.perf_counter() - start) * 1000
+    imports = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append({"module": name, "self_ms": int(self_us) / 1000,
+                            "cumulative_ms": int(cumulative_us) / 1000, "depth": (len(indent) - 1) // 2})
+    # Interpreter startup is listed first and ends with site; keep what came after it
+    starts = [i for i, entry in enumerate(imports) if entry["module"] == "site" and entry["depth"] == 0]
+    if starts:
+        imports = imports[starts[-1] + 1:]
+    return {"modules": list(modules), "wall_ms": round(wall_ms, 1),
+            "total_ms": round(sum(entry["cumulative_ms"] for entry in imports if entry["depth"] == 0), 1),
+            "imports": imports}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Warm, pre-forking launcher for the tracking scripts.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("serve", help="Preload the heavy modules and fork scripts on request.")
+    p.add_argument("--socket", default=None, help="Unix socket path (default: $CEREBLAID_RUN_DIR/zygote.sock).")
+    p.add_argument("--idle-exit", type=float, default=0.0,
+                   help="Exit after this many seconds without launches or running children (0 = never).")
+    p = sub.add_parser("importtime", help="Print the -X importtime breakdown of the preloaded modules.")
+    p.add_argument("modules", nargs="*", default=list(PRELOAD))
+    p.add_argument("--top", type=int, default=25, help="Show this many modules by self time.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "serve":
+        if os.name != "posix":
+            raise SystemExit("The zygote needs fork() and Unix sockets.")
+        zygote = Zygote(args.socket or default_socket(), idle_exit=args.idle_exit)
+        zygote.preload()
+        raise SystemExit(zygote.serve())
+    profile = import_profile(args.modules)
+    profile["imports"] = sorted(profile["imports"], key=lambda entry: entry["self_ms"], reverse=True)[:args.top]
+    print(json.dumps(profile, indent=2))